@@ -4,44 +4,95 @@ import sys
 import xbmc, xbmcgui
 from resources.lib import addon, addonName
 from resources.lib.player import Player
-from resources.lib.utils import check_config, show_yesno, log, notify
+from resources.lib.profiler import profiler
+from resources.lib.scheduler import Scheduler
+from resources.lib.utils import check_config, show_yesno, log, notify, profile_path
 
 
+profiler.enable(addon.getSettingBool('profiling'))
 log("Slideshow-bgm started.")
 
-# check configuration
-while True:
-    msg = check_config()
-    if msg == '':  # configuration is OK
-        break
-    else:
-        if show_yesno(msg 
-                      + '\nClick OK to proceed to Slideshow-bgm settings'
-                      + '\nCancel will abort Slideshow-bgm'):
-            addon.openSettings()
+
+def configure():
+    """Have the user fix the configuration until it is OK, or exit."""
+    while True:
+        msg = check_config()
+        if msg == '':  # configuration is OK
+            break
         else:
-            log('Aborted by user.')
-            sys.exit(1)
+            if show_yesno(msg 
+                          + '\nClick OK to proceed to Slideshow-bgm settings'
+                          + '\nCancel will abort Slideshow-bgm'):
+                addon.openSettings()
+            else:
+                log('Aborted by user.')
+                sys.exit(1)
+
+
+# In fast start mode, the configuration is checked once the bgm has started,
+# unless starting it fails.
+fast_start = addon.getSettingBool('fast_start')
+if not fast_start:
+    configure()
+
+scheduler = Scheduler()
+
+
+def start_player():
+    """Start the :class:`Player`, or exit.
+
+    Returns:
+        :class:`Player`: the player, ``None`` if a fast start failed for the configuration.
 
-try:
-    player = Player()
-except ValueError as E:
-    notify(E.__str__(), heading=addonName+" Error", icon=xbmcgui.NOTIFICATION_ERROR)
-    sys.exit(1)
+    """
+    try:
+        with profiler.span('Player'):
+            return Player(scheduler)
+    except ValueError as E:
+        if fast_start and check_config():
+            return None
+        notify(E.__str__(), heading=addonName+" Error", icon=xbmcgui.NOTIFICATION_ERROR)
+        sys.exit(1)
+
+
+player = start_player()
+if player is None:
+    fast_start = False
+    configure()
+    player = start_player()
+elif fast_start:
+    def check_later():
+        """Check the configuration, which the running bgm was started without."""
+        msg = check_config()
+        if msg:
+            log('Configuration check, Failed: %s' % msg)
+            notify(msg, heading=addonName+" Error", icon=xbmcgui.NOTIFICATION_ERROR)
+            scheduler.stop()
+
+    scheduler.call_later(0, check_later)
 
 #player.play_bgm()
 
-# Ugly! but Blocking methods such as Tread.join or Lock.acquire does not work.
+
+def check_slideshow(method=None, data=None):
+    """Stop the scheduler when the slideshow is over."""
+    if not scheduler.state.get('Slideshow.IsActive'):
+        scheduler.stop()
+
+
+# Blocking methods such as Tread.join or Lock.acquire does not work.
 # They block all processes following and even callback functions of Player.
-# There seems to be no other way as of May 2023.
 # https://kodi.wiki/view/Service_add-ons
-monitor = xbmc.Monitor()
-while True:
-    if not xbmc.getCondVisibility('Slideshow.IsActive') or monitor.abortRequested():
-        break
-    else:
-        xbmc.sleep(500)
+# So the scheduler sleeps in Monitor.waitForAbort() instead. Kodi does not
+# notify the end of slideshow; we check it on each player notification and,
+# as a fallback, by polling every 500ms, backing off to 1s while nothing happens.
+scheduler.listen(check_slideshow)
+scheduler.every(0.5, check_slideshow, max_interval=1)
+scheduler.run()
 
 player.stop()
 
-log('Slideshow-bgm ended.')
+log('Slideshow-bgm ended. %s' % scheduler.stats())
+if profiler.enabled:
+    if profiler.dump(profile_path('profile.json'), scheduler.api_calls):
+        log('Timing report written to %s' % profile_path('profile.json'))
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Files/sec and bytes read per file of finding duplicate music files.
+
+A tree of ``--files`` music files of 150-400KB is written, then a fifth of
+them is copied to another album. A few files share the size of another
+one, and a few more its first and last 64KB, so each stage of
+:class:`dedup.Deduplicator` has work to do. The files are filtered in
+batches of 1000 as :func:`utils.create_playlist` does: a first pass, and a
+pass with the cache written by the first one. Hashing every file whole is
+shown for comparison.
+
+Usage: python benchmarks/bench_dedup.py [--files N] [--latency-ms MS]
+
+``--latency-ms`` adds a delay to every ``open`` of a file to hash, to stand
+in for a spinning disk or a network mount.
+
+"""
+
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'resources', 'lib'))
+import dedup  # noqa: E402
+from dedup import Deduplicator  # noqa: E402
+from scanner import ScanIndex  # noqa: E402
+
+
+def make_library(top, n_files, copy_rate=0.2):
+    """Write ``n_files`` music files and copies of ``copy_rate`` of them.
+
+    Returns:
+        int: number of copies.
+
+    """
+    rng = random.Random(0)
+    originals = []
+    for i in range(n_files):
+        album = os.path.join(top, 'artist %02d' % (i // 200), 'album %02d' % (i // 20 % 10))
+        os.makedirs(album, exist_ok=True)
+        path = os.path.join(album, 'track %04d.mp3' % i)
+        if i % 50 == 1:
+            # The same size as the last file, another content.
+            data = os.urandom(len(data))
+        elif i % 50 == 2:
+            # The same head and tail as the last file, another middle.
+            data = bytearray(data)
+            data[len(data) // 2] ^= 0xff
+            data = bytes(data)
+        else:
+            data = os.urandom(rng.randrange(150 << 10, 400 << 10))
+        with open(path, 'wb') as f:
+            f.write(data)
+        originals.append(path)
+
+    copies = rng.sample(originals, int(n_files * copy_rate))
+    best_of = os.path.join(top, 'best of')
+    os.makedirs(best_of)
+    for i, path in enumerate(copies):
+        shutil.copy(path, os.path.join(best_of, 'track %04d.mp3' % i))
+    return len(copies)
+
+
+def run(paths, cache_file, workers, batch_size=1000):
+    dedup = Deduplicator(cache_file, workers=workers)
+    start = time.perf_counter()
+    kept = 0
+    for i in range(0, len(paths), batch_size):
+        kept += len(dedup.filter(paths[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+    dedup.save()
+    return elapsed, dedup.dropped, dedup.bytes_read
+
+
+def full_hashes(paths, opener=open):
+    """Hash every file whole, the naive way."""
+    start = time.perf_counter()
+    seen, read = set(), 0
+    for path in paths:
+        with opener(path, 'rb') as f:
+            data = f.read()
+        read += len(data)
+        seen.add(hashlib.blake2b(data, digest_size=16).digest())
+    return time.perf_counter() - start, len(paths) - len(seen), read
+
+
+def inject_latency(latency):
+    """Delay the ``open`` of :mod:`dedup` by ``latency`` seconds.
+
+    Returns:
+        callable: the delayed ``open``.
+
+    """
+    def delayed(*args, **kwargs):
+        time.sleep(latency)
+        return open(*args, **kwargs)
+    dedup.open = delayed
+    return delayed
+
+
+def main(args):
+    n_files = 1000
+    latency = 0
+    while args:
+        if args[0] == '--files':
+            n_files, args = int(args[1]), args[2:]
+        elif args[0] == '--latency-ms':
+            latency, args = float(args[1]) / 1000, args[2:]
+        else:
+            sys.exit(__doc__)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        top = os.path.join(tmp, 'music')
+        copies = make_library(top, n_files)
+        paths = [path for batch in ScanIndex(os.path.join(tmp, 'index')).scan(os.fsencode(top))
+                 for path in batch]
+        opener = inject_latency(latency) if latency else open
+
+        print('%-12s %8s %10s %12s %8s %14s' % ('pass', 'workers', 'time(s)', 'files/sec',
+                                              'dropped', 'KB read/file'))
+        elapsed, dropped, read = full_hashes(paths, opener)
+        print('%-12s %8d %10.2f %12.0f %8d %14.1f' % ('full hash', 1, elapsed,
+                                                      len(paths) / elapsed, dropped,
+                                                      read / len(paths) / 1024))
+        for workers in (1, 8):
+            cache_file = os.path.join(tmp, 'dedup_cache_%d.json' % workers)
+            for name in ('first', 'cached'):
+                elapsed, dropped, read = run(paths, cache_file, workers)
+                assert dropped == copies, (dropped, copies)
+                print('%-12s %8d %10.2f %12.0f %8d %14.1f' % (name, workers, elapsed,
+                                                              len(paths) / elapsed, dropped,
+                                                              read / len(paths) / 1024))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
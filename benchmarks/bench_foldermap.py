@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Lookup cost of the folder map, and the bgm switching with the folders of a slideshow.
+
+The lookup of a picture path in a :class:`foldermap.PrefixTrie` of
+``--rules`` folders is compared with a linear scan of the same rules for
+the longest prefix.
+
+Then a slideshow goes through the pictures of three folders, two of them
+mapped to music directories of their own, and back to the first one.
+
+Reports:
+    - ns per lookup, trie and linear scan.
+    - seconds(simulated) from the first picture of a folder to its music
+      playing.
+    - times the bgm was switched, and playlists made, which should be once
+      per directory, none on coming back to a folder.
+    - the longest wall time of a folder check, which holds up the scheduler
+      of the slideshow. The playlist of a directory is made in the
+      background, so its scan must not show here. As the fake kodi's clock
+      does not wait for it, the first switch to a directory waits for the
+      scan in simulated time instead.
+
+Usage: python benchmarks/bench_foldermap.py [--rules N] [--files N]
+
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import harness
+from harness import kodi
+from synth import make_tree
+from resources.lib.foldermap import PrefixTrie, split_path
+
+
+def linear_lookup(rules, path):
+    parts = split_path(path)
+    best, value = -1, None
+    for prefix, target in rules:
+        if len(prefix) > best and parts[:len(prefix)] == prefix:
+            best, value = len(prefix), target
+    return value
+
+
+def bench_lookup(n_rules, n_paths=2000):
+    rng = random.Random(0)
+    rules = [('/pictures/%d/%d/%d' % (i // 100, i // 10 % 10, i % 10), 'bgm %d.m3u' % i)
+             for i in range(n_rules)]
+    paths = ['/pictures/%d/%d/%d/img_%04d.jpg' % (rng.randrange(n_rules // 100 + 1),
+                                                   rng.randrange(10), rng.randrange(12), i)
+             for i in range(n_paths)]
+    trie = PrefixTrie(rules)
+    split_rules = [(split_path(prefix), target) for prefix, target in rules]
+    assert all(trie.lookup(p) == linear_lookup(split_rules, p) for p in paths[:200])
+
+    results = {}
+    for name, lookup in (('trie', trie.lookup),
+                         ('linear', lambda p: linear_lookup(split_rules, p))):
+        started = time.perf_counter()
+        for path in paths:
+            lookup(path)
+        results['lookup_%s_ns' % name] = (time.perf_counter() - started) / n_paths * 1e9
+    return results
+
+
+def sample_music(folders, heard):
+    """Note when the track playing comes from the music of each folder, every half second."""
+    if kodi.playing == 'audio' and 0 <= kodi.position < len(kodi.playlist):
+        track = kodi.playlist[kodi.position]
+        folder = os.path.dirname(kodi.slide)
+        if folder in folders and track.startswith(folders[folder]) and folder not in heard:
+            heard[folder] = kodi.now
+    kodi.after(0.5, sample_music, folders, heard)
+
+
+def bench_slideshow(root, music, interval=5.0, per_folder=12):
+    pictures = {name: os.path.join(root, 'pictures', name) for name in ('travel', 'kids', 'other')}
+    map_file = os.path.join(root, 'folders.txt')
+    with open(map_file, 'w', encoding='utf-8') as f:
+        f.write('# picture folder = music\n')
+        f.write('%s = %s\n' % (pictures['travel'], music['travel']))
+        f.write('%s = %s\n' % (pictures['kids'], music['kids']))
+    kodi.settings['folder_map'] = map_file
+    kodi.save_settings()
+
+    order = ('travel', 'kids', 'other', 'travel', 'kids')
+    slides = [os.path.join(pictures[name], '%03d.jpg' % i) for name in order for i in range(per_folder)]
+    folders = {pictures[name]: music.get(name, '/music') for name in pictures}
+
+    results = {}
+    for run in ('first', 'again'):
+        kodi.reset()
+        kodi.debug_log = True
+        heard = {}
+        entered = {}
+        for i, name in enumerate(order):
+            entered.setdefault(pictures[name], []).append(i * per_folder * interval)
+        kodi.start_slideshow(slides, interval)
+        for i, name in enumerate(order[1:], 1):
+            # Samples are restarted on entering a folder, to time coming back to it.
+            kodi.at(i * per_folder * interval, heard.pop, pictures[name], None)
+        kodi.at(0.25, sample_music, folders, heard)
+        kodi.at(len(slides) * interval, kodi.end_slideshow)
+        latencies = []
+
+        def note(folder):
+            if folder in heard:
+                latencies.append(heard[folder] - max(t for t in entered[folder] if t <= heard[folder]))
+
+        for i, name in enumerate(order):
+            kodi.at((i + 1) * per_folder * interval - 0.1, note, pictures[name])
+        checks = []
+
+        def setup():
+            from resources.lib.player import Player
+            check_folder = Player.check_folder
+
+            def timed(self):
+                started = time.perf_counter()
+                try:
+                    return check_folder(self)
+                finally:
+                    checks.append(time.perf_counter() - started)
+            Player.check_folder = timed
+
+        harness.run_script('addon.py', setup)
+        kodi.debug_log = False
+
+        results['%s_switch_median_s' % run] = statistics.median(latencies) if latencies else float('nan')
+        results['%s_switch_max_s' % run] = max(latencies) if latencies else float('nan')
+        results['%s_folders_heard' % run] = len(latencies)
+        results['%s_switches' % run] = sum(1 for m in kodi.messages if 'Switching the bgm' in m[1])
+        results['%s_playlists_made' % run] = sum(1 for m in kodi.messages
+                                                 if 'Created a playlist' in m[1])
+        results['%s_check_max_wall_ms' % run] = max(checks, default=0) * 1000
+    return results
+
+
+def main(args):
+    n_rules = 5000
+    n_files = 500
+    while args:
+        if args[0] == '--rules':
+            n_rules, args = int(args[1]), args[2:]
+        elif args[0] == '--files':
+            n_files, args = int(args[1]), args[2:]
+        else:
+            sys.exit(__doc__)
+
+    results = bench_lookup(n_rules)
+    with tempfile.TemporaryDirectory() as root:
+        music = {}
+        for name in ('travel', 'kids'):
+            music[name] = os.path.join(root, 'music', name) + os.sep
+            make_tree(music[name], n_files)
+        playlist = harness.make_m3u(os.path.join(root, 'bgm.m3u'), 200)
+        harness.setup(root, {'type': 'Playlist', 'playlist': playlist})
+        results.update(bench_slideshow(root, music))
+
+    for key, value in results.items():
+        print('%-33s %12.1f' % (key, value))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Freshness of ``bgm.m3u`` kept by the indexer of ``service.py``, and its cost.
+
+``service.py`` runs with ``watch_directory`` on for ``--minutes`` of
+simulated time, with inotify and with polling only. Meanwhile, an album is
+added to the bgm directory while kodi is idle, another one during a
+slideshow, and the settings are changed without changing the directory.
+
+Reports:
+    - seconds(simulated) from adding an album to ``bgm.m3u`` listing it.
+    - times ``bgm.m3u`` was replaced, which should be once per album.
+    - wakeups and kodi API calls of the service per hour.
+    - wall time to the first ``PlayMedia`` of a slideshow started after the
+      settings have changed, with the indexer running and without.
+
+Usage: python benchmarks/bench_indexer.py [--files N] [--minutes N]
+
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import harness
+from harness import kodi
+from bench_lifecycle import bench_slideshow
+from synth import make_tree
+
+indexer_key = (10000, 'slideshow-bgm.indexer')
+
+
+def add_album(music, name, added):
+    album = os.path.join(music, name)
+    os.makedirs(album)
+    for i in range(10):
+        with open(os.path.join(album, 'track %02d.mp3' % i), 'wb'):
+            pass
+    added[name] = kodi.now
+
+
+def watch_playlist(added, found):
+    """Check ``bgm.m3u`` every second for the albums added."""
+    try:
+        with open(os.path.join(kodi.profile_dir(), 'bgm.m3u'), encoding='utf-8') as f:
+            text = f.read()
+    except IOError:
+        text = ''
+    for name in added:
+        if name not in found and name in text:
+            found[name] = kodi.now
+    kodi.after(1, watch_playlist, added, found)
+
+
+def slideshow_flag(active):
+    kodi.slideshow_active = active
+
+
+def run_service(music, minutes, inotify=True):
+    added, found = {}, {}
+    kodi.reset()
+    kodi.deadline = minutes * 60
+    kodi.at(1, watch_playlist, added, found)
+    kodi.at(60, add_album, music, 'idle album %d' % inotify, added)
+    kodi.at(120, slideshow_flag, True)
+    kodi.at(130, add_album, music, 'slideshow album %d' % inotify, added)
+    kodi.at(300, slideshow_flag, False)
+    kodi.at(400, kodi.change_settings, {'random': 'false'})
+
+    platform = sys.platform
+    if not inotify:
+        sys.platform = 'polling'  # makes inotify unavailable
+    try:
+        harness.run_script('service.py')
+    finally:
+        sys.platform = platform
+
+    mode = 'inotify' if inotify else 'polling'
+    results = {}
+    for name, at in added.items():
+        results['%s_%s_s' % (mode, name.rsplit(' ', 2)[0].replace(' ', '_'))] = \
+            found.get(name, float('nan')) - at
+    results['%s_replaced' % mode] = sum(1 for m in kodi.messages if 'bgm.m3u rebuilt' in m[1])
+    hours = kodi.now / 3600
+    wakeups = kodi.api_calls['sleep'] + kodi.api_calls['waitForAbort']
+    results['%s_wakeups_per_hour' % mode] = wakeups / hours
+    results['%s_kodi_api_calls_per_hour' % mode] = (sum(kodi.api_calls.values()) - wakeups) / hours
+    return results
+
+
+def main(args):
+    n_files = 10000
+    minutes = 30
+    while args:
+        if args[0] == '--files':
+            n_files, args = int(args[1]), args[2:]
+        elif args[0] == '--minutes':
+            minutes, args = float(args[1]), args[2:]
+        else:
+            sys.exit(__doc__)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        music = os.path.join(root, 'music')
+        make_tree(music, n_files)
+        harness.setup(root, {'type': 'Directory', 'directory': music + os.sep,
+                             'watch_directory': 'true'})
+        bench_slideshow(100)  # creates bgm.m3u and the scan index
+        for inotify in (True, False):
+            results.update(run_service(music, minutes, inotify))
+
+        for running in (False, True):
+            time.sleep(0.01)
+            kodi.save_settings()  # bgm.m3u is older than the settings
+            if running:
+                kodi.properties[indexer_key] = 'running'
+            result = bench_slideshow(100)
+            kodi.properties.pop(indexer_key, None)
+            results['first_playmedia_wall_ms_indexer_%s' % ('on' if running else 'off')] = \
+                result['first_playmedia_wall_ms']
+
+    for key, value in results.items():
+        print('%-42s %10.1f' % (key, value))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
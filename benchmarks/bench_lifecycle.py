@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""End-to-end latency of the addon against the fake kodi.
+
+Reports:
+    - service startup: wall time of ``service.py``, the first boot(hooking
+      the skin) and the following ones.
+    - slideshow start to the first ``PlayMedia`` and to the first audible
+      bgm, in simulated and wall time, for a cold start and for a warm start
+      right after another slideshow.
+    - gap from the end of a video clip to the resume of bgm.
+    - kodi API calls made and wakeups(``sleep``/``waitForAbort``) while the
+      slideshow runs.
+
+Simulated time stands for the latency heard by the user; wall time is the
+CPU time the addon spends, as the fake kodi does not really sleep.
+
+Usage: python benchmarks/bench_lifecycle.py [--json FILE] [--tracks N]
+
+"""
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+
+import harness
+from harness import kodi
+from synth import make_tree
+
+
+def bench_service(root, runs=5, skin_files=3000):
+    harness.setup(root)
+    # Skins ship a lot of media which find_SlideShow_xml() may walk through.
+    make_tree(os.path.join(kodi.translate_path('special://skin'), 'media'), skin_files)
+    times = []
+    for i in range(runs):
+        kodi.reset()
+        elapsed, code = harness.run_script('service.py')
+        times.append(elapsed)
+    return {'service_first_boot_ms': times[0] * 1000,
+            'service_boot_ms': statistics.median(times[1:]) * 1000}
+
+
+def bench_slideshow(n_tracks, warm=False, video_at=20.0, video_length=8.0, length=60.0):
+    """Run a slideshow of ``length`` seconds with a video clip in the middle.
+
+    Args:
+        warm (bool): kodi still holds the music playlist of the last slideshow.
+
+    """
+    kodi.reset(keep_player=warm)
+    kodi.start_slideshow(['/pictures/%03d.jpg' % i for i in range(100)])
+    kodi.at(video_at, kodi.play_video, video_length)
+    kodi.at(length, kodi.end_slideshow)
+    elapsed, code = harness.run_script('addon.py')
+
+    result = {'run_wall_ms': elapsed * 1000}
+    play_media = min(filter(None, [kodi.first('builtin', detail='PlayMedia'),
+                                   kodi.first('jsonrpc', detail='Player.Open')]), default=None)
+    if play_media:
+        result['first_playmedia_sim_ms'] = play_media[0] * 1000
+        result['first_playmedia_wall_ms'] = play_media[1] * 1000
+    audible = [e for e in kodi.events if e[2] == 'av_started' and e[3] == 'audio']
+    if audible:
+        result['first_audio_sim_ms'] = audible[0][0] * 1000
+        result['first_audio_wall_ms'] = audible[0][1] * 1000
+    video_end = kodi.first('video_end')
+    resume = video_end and kodi.first('audio_start', since=video_end[0])
+    if resume:
+        result['resume_gap_sim_ms'] = (resume[0] - video_end[0]) * 1000
+        result['resume_gap_wall_ms'] = (resume[1] - video_end[1]) * 1000
+    wakeups = kodi.api_calls['sleep'] + kodi.api_calls['waitForAbort']
+    minutes = kodi.now / 60
+    result['wakeups_per_min'] = wakeups / minutes
+    result['kodi_api_calls_per_min'] = (sum(kodi.api_calls.values()) - wakeups) / minutes
+    return result
+
+
+def main(args):
+    out = None
+    n_tracks = 1000
+    while args:
+        if args[0] == '--json':
+            out, args = args[1], args[2:]
+        elif args[0] == '--tracks':
+            n_tracks, args = int(args[1]), args[2:]
+        else:
+            sys.exit(__doc__)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        results.update(bench_service(os.path.join(root, 'service')))
+    with tempfile.TemporaryDirectory() as root:
+        playlist = harness.make_m3u(os.path.join(root, 'bgm.m3u'), n_tracks)
+        harness.setup(root, {'type': 'Playlist', 'playlist': playlist})
+        for start in ('cold', 'warm'):
+            result = bench_slideshow(n_tracks, warm=start == 'warm')
+            results.update(('%s_%s' % (start, key), value) for key, value in result.items())
+
+    for key, value in results.items():
+        print('%-33s %12.1f' % (key, value))
+    if out:
+        with open(out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Cost of logging, with kodi's debug log off and on.
+
+Reports:
+    - the cost of a debug message formatting two infolabels, given as a
+      string as it used to be and as a lambda, while debug messages are not
+      written, and of one written.
+    - kodi API calls and log lines of a slideshow with a video clip,
+      with kodi's debug log off and on.
+    - the messages written and dropped by the rate limit when a line logs
+      in a tight loop.
+
+Usage: python benchmarks/bench_log.py [--calls N]
+
+"""
+
+import sys
+import tempfile
+import timeit
+
+import harness
+from harness import kodi
+from bench_lifecycle import bench_slideshow
+import xbmc
+from resources.lib.logger import Logger
+
+
+def per_call(calls):
+    results = {}
+    written = []
+    for name, min_level in (('off', xbmc.LOGINFO), ('on', xbmc.LOGDEBUG)):
+        logger = Logger(lambda msg, level: written.append(msg), min_level)
+        logger.burst = calls * 10
+
+        def eager():
+            logger.log('play started. title: %s slide: %s' %
+                       (xbmc.getInfoLabel('Player.Title'), xbmc.getInfoLabel('Slideshow.Filename')))
+
+        def lazy():
+            logger.log(lambda: 'play started. title: %s slide: %s' %
+                       (xbmc.getInfoLabel('Player.Title'), xbmc.getInfoLabel('Slideshow.Filename')))
+
+        for style, func in (('string', eager), ('lambda', lazy)):
+            elapsed = min(timeit.repeat(func, number=calls, repeat=5)) / calls
+            results['debug_%s_%s_ns' % (name, style)] = elapsed * 1e9
+        written.clear()
+    return results
+
+
+def slideshow():
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        playlist = harness.make_m3u(root + '/bgm.m3u', 1000)
+        harness.setup(root, {'type': 'Playlist', 'playlist': playlist})
+        for debug in (False, True):
+            kodi.debug_log = debug
+            bench_slideshow(1000, video_at=20, length=600)
+            name = 'on' if debug else 'off'
+            results['debug_log_%s_getInfoLabel_calls' % name] = kodi.api_calls['getInfoLabel']
+            results['debug_log_%s_log_lines' % name] = len(kodi.messages)
+    kodi.debug_log = False
+    return results
+
+
+def flood(n=10000):
+    written = []
+    logger = Logger(lambda msg, level: written.append(msg))
+    for i in range(n):
+        logger.log('retrying %d' % i)
+    return {'flood_logged': n, 'flood_written': len(written), 'flood_dropped': logger.dropped}
+
+
+def main(args):
+    calls = 100000
+    while args:
+        if args[0] == '--calls':
+            calls, args = int(args[1]), args[2:]
+        else:
+            sys.exit(__doc__)
+
+    results = per_call(calls)
+    results.update(slideshow())
+    results.update(flood())
+    for key, value in results.items():
+        print('%-40s %10.1f' % (key, value))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
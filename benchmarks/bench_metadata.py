@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Files/sec of the metadata stage: a first pass and a fully cached pass.
+
+Music files of the synthetic tree carry real headers(see
+:func:`synth.audio_header`). Each run looks up all the music files, in
+batches of 1000 as :func:`utils.create_playlist` does, and the first pass
+writes the cache that the cached pass reads.
+
+Usage: python benchmarks/bench_metadata.py [--latency-ms MS] [n_files ...]
+
+``--latency-ms`` adds a delay to every ``os.stat`` and ``open`` call to
+stand in for a network mount.
+
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'resources', 'lib'))
+import metadata  # noqa: E402
+from metadata import MetadataCache  # noqa: E402
+from scanner import ScanIndex  # noqa: E402
+from synth import make_tree  # noqa: E402
+
+
+def run(paths, cache_file, workers, batch_size=1000):
+    cache = MetadataCache(cache_file, workers=workers)
+    start = time.perf_counter()
+    known = 0
+    for i in range(0, len(paths), batch_size):
+        known += sum(1 for duration, kbps in cache.lookup(paths[i:i + batch_size])
+                     if duration is not None)
+    cache.save()
+    return time.perf_counter() - start, known, cache.read
+
+
+def inject_latency(latency):
+    """Delay ``os.stat`` and the ``open`` of :mod:`metadata` by ``latency`` seconds."""
+    def delayed(func):
+        def wrapper(*args, **kwargs):
+            time.sleep(latency)
+            return func(*args, **kwargs)
+        return wrapper
+    os.stat = delayed(os.stat)
+    metadata.open = delayed(open)
+
+
+def main(sizes, latency=0):
+    print('%8s %-10s %-8s %10s %12s %8s' % ('files', 'workers', 'pass', 'time(s)', 'files/sec',
+                                          'read'))
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            top = os.path.join(tmp, 'music')
+            make_tree(top, n, audio=True)
+            paths = [path for batch in ScanIndex(os.path.join(tmp, 'index')).scan(os.fsencode(top))
+                     for path in batch]
+            saved = os.stat
+            if latency:
+                inject_latency(latency)
+            for workers in (1, 8):
+                cache_file = os.path.join(tmp, 'cache%d.json' % workers)
+                for name in ('first', 'cached'):
+                    elapsed, known, read = run(paths, cache_file, workers)
+                    assert known == len(paths), (known, len(paths))
+                    print('%8d %-10d %-8s %10.3f %12.0f %8d' %
+                          (len(paths), workers, name, elapsed, len(paths) / elapsed, read))
+            os.stat = saved
+            metadata.__dict__.pop('open', None)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    latency = 0
+    if args[:1] == ['--latency-ms']:
+        latency = float(args[1]) / 1000
+        args = args[2:]
+    main([int(a) for a in args] or [50000], latency)
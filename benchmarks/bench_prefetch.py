@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Track-switch latency with and without reading ahead of the next track.
+
+The fake kodi takes ``--latency-ms`` more to start a track which has not
+been read ahead, standing in for a spinning disk or a NAS. The tracks are
+real files, so the :class:`prefetch.Prefetcher` of the addon opens them;
+``posix_fadvise`` and ``os.read`` on them are wrapped to tell the fake kodi
+which track is being read ahead.
+
+Reports, for a sequential and a shuffled playlist loaded whole, and for a
+windowed one, the median and the maximum time from the end of a track to
+the start of the next one, and how many of the switches were read ahead.
+
+Usage: python benchmarks/bench_prefetch.py [--latency-ms MS] [--minutes N]
+
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+
+import harness
+from harness import kodi
+from bench_lifecycle import bench_slideshow
+
+
+def track_files(music_dir, n_tracks):
+    """Write ``n_tracks`` tracks of 64KB under ``music_dir``."""
+    paths = []
+    for i in range(n_tracks):
+        path = os.path.join(music_dir, 'album %02d' % (i // 20), 'track %04d.mp3' % i)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 65536)
+        paths.append(path)
+    return paths
+
+
+def watch_reads(tracks):
+    """Have ``os.posix_fadvise`` and ``os.read`` on ``tracks`` fetch them in the fake kodi."""
+    fds = {}
+    os_open, os_close, os_read = os.open, os.close, os.read
+    os_fadvise = getattr(os, 'posix_fadvise', None)
+
+    def open_(path, flags, *args, **kwargs):
+        fd = os_open(path, flags, *args, **kwargs)
+        if path in tracks:
+            fds[fd] = path
+        return fd
+
+    def close(fd):
+        fds.pop(fd, None)
+        os_close(fd)
+
+    def read(fd, n):
+        if fd in fds:
+            kodi.fetch(fds[fd])
+        return os_read(fd, n)
+
+    def fadvise(fd, offset, length, advice):
+        if fd in fds:
+            kodi.fetch(fds[fd])
+        return os_fadvise(fd, offset, length, advice)
+
+    os.open, os.close, os.read = open_, close, read
+    if os_fadvise:
+        os.posix_fadvise = fadvise
+
+
+def switches():
+    """Latencies(ms) of the track switches after the first track, and how many were read ahead."""
+    fetches = {e[3] for e in kodi.events if e[2] == 'fetch'}
+    found = []
+    start = None
+    for sim, wall, kind, detail in kodi.events:
+        if kind == 'audio_start':
+            start = (sim, detail)
+        elif kind == 'av_started' and detail == 'audio' and start:
+            found.append(((sim - start[0]) * 1000, start[1] in fetches))
+            start = None
+    return [latency for latency, fetched in found[1:]], sum(fetched for _, fetched in found[1:])
+
+
+def main(args):
+    latency = 0.4
+    minutes = 60
+    while args:
+        if args[0] == '--latency-ms':
+            latency, args = float(args[1]) / 1000, args[2:]
+        elif args[0] == '--minutes':
+            minutes, args = float(args[1]), args[2:]
+        else:
+            sys.exit(__doc__)
+
+    kodi.storage_latency = latency
+    print('%-12s %-9s %9s %12s %10s %8s' % ('playlist', 'prefetch', 'switches', 'median_ms',
+                                            'max_ms', 'fetched'))
+    with tempfile.TemporaryDirectory() as root:
+        tracks = track_files(os.path.join(root, 'music'), 200)
+        playlist = os.path.join(root, 'bgm.m3u')
+        with open(playlist, 'w', encoding='utf-8') as f:
+            f.write('#EXTM3U\n\n' + '\n'.join(tracks) + '\n')
+        watch_reads(set(tracks))
+
+        for name, settings in (('sequential', {'random': 'false'}),
+                               ('shuffled', {'random': 'true'}),
+                               ('windowed', {'random': 'true', 'window_size': '20'})):
+            for prefetch in ('0', '16'):
+                harness.setup(os.path.join(root, 'kodi'),
+                              dict(settings, type='Playlist', playlist=playlist,
+                                   prefetch_mb=prefetch))
+                bench_slideshow(len(tracks), video_at=minutes * 30, length=minutes * 60)
+                latencies, fetched = switches()
+                print('%-12s %-9s %9d %12.1f %10.1f %8d' %
+                      (name, 'on' if prefetch != '0' else 'off', len(latencies),
+                       statistics.median(latencies), max(latencies), fetched))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Overhead of the profiler, and the timing report of a slideshow.
+
+Reports the cost of a call through :func:`profiler.profiled` and of
+:meth:`Profiler.span` while profiling is off and on, against a bare call.
+Then, runs a slideshow against the fake kodi with the ``profiling`` setting
+on and prints the spans of ``profile.json``.
+
+Usage: python benchmarks/bench_profiler.py [--calls N] [--tracks N]
+
+"""
+
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+import harness
+from harness import kodi
+from bench_lifecycle import bench_slideshow
+from resources.lib.profiler import profiled, profiler
+
+
+def bare():
+    pass
+
+
+@profiled()
+def decorated():
+    pass
+
+
+def spanned():
+    with profiler.span('spanned'):
+        pass
+
+
+def overhead(calls):
+    results = {}
+    base = min(timeit.repeat(bare, number=calls, repeat=5)) / calls
+    for enabled in (False, True):
+        profiler.enable(enabled)
+        for name, func in (('profiled', decorated), ('span', spanned)):
+            elapsed = min(timeit.repeat(func, number=calls, repeat=5)) / calls
+            results['%s_%s_ns' % (name, 'on' if enabled else 'off')] = (elapsed - base) * 1e9
+        profiler.spans.clear()
+    profiler.enable(False)
+    return results
+
+
+def main(args):
+    calls = 100000
+    n_tracks = 1000
+    while args:
+        if args[0] == '--calls':
+            calls, args = int(args[1]), args[2:]
+        elif args[0] == '--tracks':
+            n_tracks, args = int(args[1]), args[2:]
+        else:
+            sys.exit(__doc__)
+
+    for key, value in overhead(calls).items():
+        print('%-24s %10.1f' % (key, value))
+
+    with tempfile.TemporaryDirectory() as root:
+        playlist = harness.make_m3u(os.path.join(root, 'bgm.m3u'), n_tracks)
+        for enabled in ('false', 'true'):
+            harness.setup(root, {'type': 'Playlist', 'playlist': playlist, 'profiling': enabled})
+            result = bench_slideshow(n_tracks)
+            print('%-24s %10.1f' % ('run_wall_ms_profiling_' + ('on' if enabled == 'true' else 'off'),
+                                    result['run_wall_ms']))
+        with open(os.path.join(kodi.profile_dir(), 'profile.json')) as f:
+            report = json.load(f)
+
+    print('\n%-24s %6s %10s %10s %10s' % ('span', 'count', 'p50_ms', 'p95_ms', 'max_ms'))
+    for name, span in report['spans'].items():
+        print('%-24s %6d %10.3f %10.3f %10.3f' % (name, span['count'], span['p50_ms'],
+                                                   span['p95_ms'], span['max_ms']))
+    print('\ncounters: %s' % report['counters'])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
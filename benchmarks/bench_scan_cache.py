@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Cold vs. warm rebuild of the scan index on a synthetic tree.
+
+Usage: python benchmarks/bench_scan_cache.py [n_files ...]
+
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'resources', 'lib'))
+from scanner import ScanIndex  # noqa: E402
+from synth import make_tree  # noqa: E402
+
+
+def rebuild(index_file, top):
+    start = time.perf_counter()
+    index = ScanIndex(index_file)
+    count = sum(len(files) for root, files in index.walk(top))
+    index.save()
+    return time.perf_counter() - start, count, index.listed
+
+
+def main(sizes):
+    print('%8s %8s %12s %12s %8s' % ('files', 'dirs', 'cold(s)', 'warm(s)', 'listed'))
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            top = os.path.join(tmp, 'music')
+            n_dirs = make_tree(top, n)
+            index_file = os.path.join(tmp, 'scan_index.json')
+            # Let the tree get older than ScanIndex.racy_ns, or nothing is cached.
+            past = time.time() - 60
+            for root, dirs, files in os.walk(top):
+                os.utime(root, (past, past))
+            cold, count, _ = rebuild(index_file, os.fsencode(top))
+            warm, count_w, listed = rebuild(index_file, os.fsencode(top))
+            assert count == count_w
+            print('%8d %8d %12.3f %12.3f %8d' % (n, n_dirs, cold, warm, listed))
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10000, 80000])
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Files/sec of the scanner engine against the legacy ``os.walk`` loop.
+
+Every run is a cold scan, i.e., without a scan index, and writes an m3u file
+the same way :func:`utils.create_playlist` does.
+
+Usage: python benchmarks/bench_scanner.py [--latency-ms MS] [n_files ...]
+
+``--latency-ms`` adds a delay to every ``os.scandir`` and ``os.stat`` call to
+stand in for a network mount. Without it, the engine should not move to its
+thread pool, so ``x4`` and ``x8`` should run as ``x1`` does.
+
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'resources', 'lib'))
+from scanner import ScanIndex, music_file_exts  # noqa: E402
+from synth import make_tree  # noqa: E402
+
+
+def legacy(top, playlist_file):
+    """``create_playlist`` before the scanner engine."""
+    count = 0
+    with open(playlist_file, mode='w', encoding='utf-8') as f:
+        f.write('#EXTM3U' + os.linesep * 2)
+        for root, dirs, files in os.walk(top, followlinks=True):
+            root_str = root.decode('utf-8')
+            for file in files:
+                file_str = file.decode('utf-8')
+                if file_str.lower().endswith(music_file_exts):
+                    f.write(os.path.join(root_str, file_str) + os.linesep)
+                    count += 1
+    return count
+
+
+def engine(top, playlist_file, workers):
+    count = 0
+    index = ScanIndex(playlist_file + '.index', workers=workers)
+    with open(playlist_file, mode='w', encoding='utf-8', errors='surrogateescape') as f:
+        f.write('#EXTM3U' + os.linesep * 2)
+        for batch in index.scan(top):
+            f.write(os.linesep.join(batch) + os.linesep)
+            count += len(batch)
+    return count
+
+
+def measure(func, *args, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        count = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def inject_latency(latency):
+    """Delay ``os.scandir`` and ``os.stat`` by ``latency`` seconds."""
+    def delayed(func):
+        def wrapper(*args, **kwargs):
+            time.sleep(latency)
+            return func(*args, **kwargs)
+        return wrapper
+    os.scandir = delayed(os.scandir)
+    os.stat = delayed(os.stat)
+
+
+def main(sizes, latency=0):
+    print('%8s %-12s %10s %12s' % ('files', 'scanner', 'time(s)', 'files/sec'))
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            top = os.fsencode(os.path.join(tmp, 'music'))
+            make_tree(os.fsdecode(top), n)
+            playlist_file = os.path.join(tmp, 'bgm.m3u')
+            runs = [('legacy', legacy, (top, playlist_file))]
+            runs += [('engine x%d' % w, engine, (top, playlist_file, w)) for w in (1, 4, 8)]
+            saved = os.scandir, os.stat
+            if latency:
+                inject_latency(latency)
+            expected = None
+            for name, func, args in runs:
+                elapsed, count = measure(func, *args, repeat=1 if latency else 3)
+                if expected is None:
+                    expected = count
+                assert count == expected, (name, count, expected)
+                print('%8d %-12s %10.3f %12.0f' % (n, name, elapsed, n / elapsed))
+            os.scandir, os.stat = saved
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    latency = 0
+    if args[:1] == ['--latency-ms']:
+        latency = float(args[1]) / 1000
+        args = args[2:]
+    main([int(a) for a in args] or [10000, 100000], latency)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""The addon's shuffle engine vs a kodi-side shuffle of the whole playlist.
+
+The kodi side is modelled as kodi does it with 'PlayerControl(RandomOn)':
+the playlist is parsed into a list of paths which is shuffled in one go.
+Kodi actually holds a ``CFileItem`` a track, much bigger than a str, so its
+memory is a lower bound.
+
+For each playlist length, reports:
+    - memory held, traced with ``tracemalloc``.
+    - time to the first track, i.e., to load(index) and shuffle.
+    - mean latency of the next track, including reading its path.
+    - time to save and to load the state of the shuffle engine.
+
+Usage: python benchmarks/bench_shuffle.py [--json FILE] [--tracks N[,N...]]
+
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import harness  # noqa: F401, puts the addon in sys.path
+from resources.lib.shuffle import Shuffle
+from resources.lib.trackindex import TrackIndex
+
+
+def kodi_side(playlist, draws):
+    start = time.perf_counter()
+    with open(playlist, encoding='utf-8', errors='surrogateescape') as f:
+        items = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    random.shuffle(items)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(draws):
+        items[i % len(items)]
+    return items, first, (time.perf_counter() - start) / draws
+
+
+def engine(playlist, draws):
+    start = time.perf_counter()
+    index = TrackIndex(playlist)
+    order = Shuffle(len(index))
+    index.paths([order.next()])
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(draws):
+        index.paths([order.next()])
+    return (index, order), first, (time.perf_counter() - start) / draws
+
+
+def measure(func, playlist, draws=10000):
+    tracemalloc.start()
+    held, first, next_track = func(playlist, draws)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    # Timed again without tracing.
+    held, first, next_track = func(playlist, draws)
+    return {'memory_mb': memory / 2 ** 20, 'first_track_ms': first * 1000,
+            'next_track_us': next_track * 1e6}, held
+
+
+def main(args):
+    out = None
+    lengths = [10000, 100000]
+    while args:
+        if args[0] == '--json':
+            out, args = args[1], args[2:]
+        elif args[0] == '--tracks':
+            lengths, args = [int(n) for n in args[1].split(',')], args[2:]
+        else:
+            sys.exit(__doc__)
+
+    results = {}
+    keys = ('memory_mb', 'first_track_ms', 'next_track_us', 'save_ms', 'load_ms')
+    print('%-8s %-8s' % ('tracks', 'shuffle') + ''.join(' %15s' % key for key in keys))
+    with tempfile.TemporaryDirectory() as root:
+        for n_tracks in lengths:
+            playlist = harness.make_m3u(os.path.join(root, 'bgm.m3u'), n_tracks)
+            kodi_result, held = measure(kodi_side, playlist)
+            engine_result, (index, order) = measure(engine, playlist)
+
+            state = os.path.join(root, 'shuffle.bin')
+            start = time.perf_counter()
+            order.save(state)
+            engine_result['save_ms'] = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            Shuffle.load(state, n_tracks)
+            engine_result['load_ms'] = (time.perf_counter() - start) * 1000
+
+            for name, result in (('kodi', kodi_result), ('engine', engine_result)):
+                results['%d_%s' % (n_tracks, name)] = result
+                print('%-8d %-8s' % (n_tracks, name) +
+                      ''.join(' %15.2f' % result.get(key, float('nan')) for key in keys))
+
+    if out:
+        with open(out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Cold start of the scripts: import time and time to the first ``PlayMedia``.
+
+Reports:
+    - import time of the modules ``addon.py`` and ``service.py`` import, by
+      ``python -X importtime`` against the stub kodi modules of
+      ``stubkodi``, the median of ``--runs`` fresh interpreters. The
+      interpreter's own startup is not counted.
+    - the modules costing the most to import, for the addon.
+    - time to the first ``PlayMedia`` of a slideshow against the fake kodi,
+      with ``fast_start`` off and on, when the bgm is a directory and the
+      settings are newer than ``bgm.m3u``, i.e., a cold start which has to
+      scan the directory again without ``fast_start``.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--files N] [--budget-ms MS]
+
+With ``--budget-ms``, exits with 1 if the import time of ``addon.py`` or
+the wall time to the first ``PlayMedia`` with ``fast_start`` exceeds ``MS``.
+
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+from harness import kodi
+from bench_lifecycle import bench_slideshow
+from synth import make_tree
+
+stub_dir = os.path.join(harness.bench_dir, 'stubkodi')
+stubs = 'import xbmc, xbmcaddon, xbmcgui, xbmcvfs'
+imports = {
+    'addon.py': 'from resources.lib import addon, addonName; '
+                'import resources.lib.player, resources.lib.profiler, '
+                'resources.lib.scheduler, resources.lib.utils',
+    'service.py': 'import xbmcgui; from resources.lib import addon, addonName; '
+                  'import resources.lib.profiler, resources.lib.skinconnector, '
+                  'resources.lib.utils',
+}
+
+
+def importtime(code):
+    """Import ``code`` in a fresh interpreter.
+
+    Returns:
+        dict: module name to the time(ms) spent importing it alone.
+
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([stub_dir, harness.addon_dir]),
+               PYTHONDONTWRITEBYTECODE='')
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env,
+                            cwd=harness.addon_dir, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True).stderr
+    modules = {}
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            self_us, cumulative, name = line[len('import time:'):].split('|')
+            if self_us.strip().isdigit():
+                modules[name.strip()] = int(self_us) / 1000
+    return modules
+
+
+def bench_imports(runs):
+    results = {}
+    top = {}
+    baseline = set(importtime(stubs))
+    for script, code in imports.items():
+        totals = []
+        for i in range(runs):
+            modules = {name: ms for name, ms in importtime(stubs + '; ' + code).items()
+                       if name not in baseline}
+            totals.append(sum(modules.values()))
+            if script == 'addon.py':
+                for name, ms in modules.items():
+                    top.setdefault(name, []).append(ms)
+        results['import_%s_ms' % script[:-3]] = statistics.median(totals)
+    top = sorted(((statistics.median(values), name) for name, values in top.items()),
+                 reverse=True)
+    return results, top[:8]
+
+
+def bench_first_playmedia(root, n_files, runs=3):
+    music = os.path.join(root, 'music')
+    make_tree(music, n_files)
+    results = {}
+    for fast_start in ('false', 'true'):
+        harness.setup(os.path.join(root, 'kodi_' + fast_start),
+                      {'type': 'Directory', 'directory': music + os.sep,
+                       'fast_start': fast_start})
+        bench_slideshow(100)  # creates bgm.m3u and the scan index
+        times = []
+        for i in range(runs):
+            # Changed settings make bgm.m3u out of date.
+            time.sleep(0.01)
+            kodi.save_settings()
+            times.append(bench_slideshow(100)['first_playmedia_wall_ms'])
+        results['first_playmedia_wall_ms_fast_start_%s' %
+                ('on' if fast_start == 'true' else 'off')] = statistics.median(times)
+    return results
+
+
+def main(args):
+    runs = 5
+    n_files = 20000
+    budget = None
+    while args:
+        if args[0] == '--runs':
+            runs, args = int(args[1]), args[2:]
+        elif args[0] == '--files':
+            n_files, args = int(args[1]), args[2:]
+        elif args[0] == '--budget-ms':
+            budget, args = float(args[1]), args[2:]
+        else:
+            sys.exit(__doc__)
+
+    results, top = bench_imports(runs)
+    with tempfile.TemporaryDirectory() as root:
+        results.update(bench_first_playmedia(root, n_files))
+
+    for key, value in results.items():
+        print('%-42s %10.1f' % (key, value))
+    print('\nslowest imports of addon.py(ms):')
+    for ms, name in top:
+        print('  %-40s %8.2f' % (name, ms))
+
+    if budget is not None:
+        over = [key for key in ('import_addon_ms', 'first_playmedia_wall_ms_fast_start_on')
+                if results[key] > budget]
+        if over:
+            print('\nover the budget of %.1f ms: %s' % (budget, ', '.join(over)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
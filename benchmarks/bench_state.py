@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Kodi API calls of the state snapshot read once per tick, against a read per call.
+
+A slideshow of ``--minutes`` with a video clip every two minutes and track
+changes every 30 seconds runs twice against the fake kodi: with the values
+read by :class:`state.State` in one JSON-RPC batch per tick, and with each
+value read by its own call as before.
+
+Reports, for each:
+    - kodi API calls per minute, but the wakeups.
+    - values read per minute, and the calls into kodi made for them.
+    - ticks whose values came from more than one call into kodi, i.e., which
+      could see the player change state between two of their reads.
+    - gap from the end of a video clip to the resume of bgm, which must not
+      change.
+
+Usage: python benchmarks/bench_state.py [--minutes N]
+
+"""
+
+import collections
+import os
+import sys
+import tempfile
+
+import harness
+from harness import kodi
+
+
+def run(minutes, batched):
+    ticks = collections.Counter()
+    stats = {}
+
+    def setup():
+        from resources.lib.state import State
+        get = State.get
+
+        def counted(self, name):
+            before = self.fetches
+            value = get(self, name)
+            ticks[self.scheduler.tick] += self.fetches - before
+            stats['state'] = self
+            return value
+
+        State.batched = batched
+        State.get = counted
+
+    kodi.reset()
+    kodi.track_duration = 30.0
+    kodi.start_slideshow(['/pictures/%03d.jpg' % i for i in range(100)])
+    for t in range(60, int(minutes * 60), 120):
+        kodi.at(t, kodi.play_video, 8.0)
+    kodi.at(minutes * 60, kodi.end_slideshow)
+    harness.run_script('addon.py', setup)
+
+    state = stats['state']
+    wakeups = kodi.api_calls['sleep'] + kodi.api_calls['waitForAbort']
+    gaps = []
+    for event in kodi.events:
+        if event[2] == 'video_end':
+            resume = kodi.first('audio_start', since=event[0])
+            if resume:
+                gaps.append(resume[0] - event[0])
+    mode = 'batched' if batched else 'per_call'
+    per_minute = kodi.now / 60
+    return {'%s_kodi_api_calls_per_min' % mode: (sum(kodi.api_calls.values()) - wakeups) / per_minute,
+            '%s_state_reads_per_min' % mode: state.reads / per_minute,
+            '%s_state_fetches_per_min' % mode: state.fetches / per_minute,
+            '%s_ticks_read_from_several_calls' % mode: sum(1 for n in ticks.values() if n > 1),
+            '%s_resume_gap_max_ms' % mode: max(gaps, default=float('nan')) * 1000}
+
+
+def main(args):
+    minutes = 10.0
+    while args:
+        if args[0] == '--minutes':
+            minutes, args = float(args[1]), args[2:]
+        else:
+            sys.exit(__doc__)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        playlist = harness.make_m3u(os.path.join(root, 'bgm.m3u'), 300)
+        harness.setup(root, {'type': 'Playlist', 'playlist': playlist})
+        for batched in (False, True):
+            results.update(run(minutes, batched))
+
+    for key, value in results.items():
+        print('%-40s %10.1f' % (key, value))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Entries/sec of checking an m3u playlist for dead entries, and of the cached check.
+
+A playlist of ``--entries`` tracks is written, ``--dead-rate`` of them
+missing, half of them relative to the playlist. It's checked as local
+files and as smb:// entries checked by a made-up ``exists`` taking
+``--latency-ms``, with one worker and with the default pool.
+
+Reports, for each: seconds, entries/sec, and dead entries found. Then the
+time to tell that the cached result of the unchanged playlist holds.
+
+Usage: python benchmarks/bench_validator.py [--entries N] [--dead-rate R] [--latency-ms MS]
+
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'resources', 'lib'))
+from validator import PlaylistValidator  # noqa: E402
+
+
+def make_playlist(root, n_entries, dead_rate, remote=False):
+    """Write a playlist of ``n_entries`` tracks of which ``dead_rate`` are missing.
+
+    Returns:
+        tuple: (path of the playlist, set of the live tracks, number of dead entries)
+
+    """
+    rng = random.Random(0)
+    music = os.path.join(root, 'music')
+    live, dead, lines = set(), 0, ['#EXTM3U', '']
+    for i in range(n_entries):
+        rel = os.path.join('album %03d' % (i // 50), 'track %05d.mp3' % i)
+        path = os.path.join(music, rel)
+        if rng.random() < dead_rate:
+            dead += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'wb').close()
+            live.add(path)
+        lines.append('#EXTINF:%d,Track %d' % (120 + i % 200, i))
+        if remote:
+            lines.append('smb://nas' + path)
+        else:
+            lines.append(os.path.join('music', rel) if i % 2 else path)
+    playlist = os.path.join(root, 'remote.m3u' if remote else 'local.m3u')
+    with open(playlist, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return playlist, live, dead
+
+
+def main(args):
+    n_entries = 20000
+    dead_rate = 0.1
+    latency = 0.002
+    while args:
+        if args[0] == '--entries':
+            n_entries, args = int(args[1]), args[2:]
+        elif args[0] == '--dead-rate':
+            dead_rate, args = float(args[1]), args[2:]
+        elif args[0] == '--latency-ms':
+            latency, args = float(args[1]) / 1000, args[2:]
+        else:
+            sys.exit(__doc__)
+
+    with tempfile.TemporaryDirectory() as root:
+        print('%-8s %8s %10s %12s %8s' % ('entries', 'workers', 'time(s)', 'entries/sec', 'dead'))
+        for remote in (False, True):
+            playlist, live, dead = make_playlist(root, n_entries, dead_rate, remote)
+
+            def exists(path):
+                time.sleep(latency)
+                return path[len('smb://nas'):] in live
+
+            for workers in (1, 8, 32) if remote else (1, 8):
+                cache_file = os.path.join(root, 'validated.json')
+                if os.path.exists(cache_file):
+                    os.remove(cache_file)
+                validator = PlaylistValidator(cache_file, exists, workers=workers)
+                started = time.perf_counter()
+                total, found = validator.validate(playlist, os.path.join(root, 'valid.m3u'))
+                elapsed = time.perf_counter() - started
+                validator.save()
+                assert (total, found) == (n_entries, dead), (total, found, dead)
+                print('%-8s %8d %10.2f %12.0f %8d' % ('smb' if remote else 'local', workers,
+                                                      elapsed, total / elapsed, found))
+
+            started = time.perf_counter()
+            state = PlaylistValidator(cache_file).state(playlist)
+            print('%-8s cached check: %s in %.2f ms' % ('smb' if remote else 'local', state,
+                                                      (time.perf_counter() - started) * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Windowed playlist feeding vs loading the whole playlist into kodi.
+
+For each playlist length, a slideshow is run against the fake kodi with the
+``window_size`` setting off(the whole playlist) and on. Reports:
+    - time from the slideshow start to the first audible bgm, in simulated
+      time(kodi parsing the playlist) and in wall time(the addon's CPU time).
+    - peak memory traced while the slideshow runs, which includes the music
+      playlist held by the fake kodi, and the entries it holds at the end.
+    - the tracks played, to check that the window keeps up.
+
+Usage: python benchmarks/bench_window.py [--json FILE] [--tracks N[,N...]] [--window N]
+
+"""
+
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import harness
+from harness import kodi
+from bench_lifecycle import bench_slideshow
+
+
+def bench_mode(root, n_tracks, window_size, length=1200.0, track_duration=10.0):
+    playlist = harness.make_m3u(os.path.join(root, 'bgm.m3u'), n_tracks)
+    harness.setup(root, {'type': 'Playlist', 'playlist': playlist,
+                         'window_size': str(window_size)})
+    kodi.track_duration = track_duration
+    try:
+        result = bench_slideshow(n_tracks, length=length)
+        result['tracks_played'] = sum(1 for e in kodi.events
+                                      if e[2] == 'audio_start' and e[3] != 'muted')
+        result['kodi_entries'] = len(kodi.playlist)
+
+        # Memory is traced in another run, as tracing slows everything down.
+        tracemalloc.start()
+        bench_slideshow(n_tracks, length=length)
+        result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    finally:
+        del kodi.track_duration
+    return result
+
+
+def main(args):
+    out = None
+    lengths = [10000, 100000]
+    window_size = 100
+    while args:
+        if args[0] == '--json':
+            out, args = args[1], args[2:]
+        elif args[0] == '--tracks':
+            lengths, args = [int(n) for n in args[1].split(',')], args[2:]
+        elif args[0] == '--window':
+            window_size, args = int(args[1]), args[2:]
+        else:
+            sys.exit(__doc__)
+
+    results = {}
+    keys = ('first_audio_sim_ms', 'first_audio_wall_ms', 'peak_mb', 'kodi_entries',
+            'tracks_played')
+    print('%-8s %-8s' % ('tracks', 'mode') + ''.join(' %19s' % key for key in keys))
+    for n_tracks in lengths:
+        for mode, size in (('full', 0), ('window', window_size)):
+            with tempfile.TemporaryDirectory() as root:
+                result = bench_mode(root, n_tracks, size)
+            results['%d_%s' % (n_tracks, mode)] = result
+            print('%-8d %-8s' % (n_tracks, mode) +
+                  ''.join(' %19.1f' % result.get(key, float('nan')) for key in keys))
+
+    if out:
+        with open(out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,516 @@
+# -*- coding: utf-8 -*-
+"""State of the fake kodi shared by the stand-in ``xbmc*`` modules.
+
+Time is simulated: ``xbmc.sleep()`` and ``Monitor.waitForAbort()`` advance
+:attr:`Kodi.now` and run the events due in between, e.g., the end of a track
+or of a video clip. Player callbacks and monitor notifications are queued
+and delivered while the script sleeps, as kodi does.
+
+Every event of interest is recorded in :attr:`Kodi.events` with both the
+simulated and the wall clock time, so that benchmarks can measure the
+latency seen by the user as well as the CPU time spent by the addon.
+
+"""
+
+import collections
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import weakref
+import xml.etree.ElementTree as ET
+
+
+class Kodi():
+    """The fake kodi. Use the module level :data:`kodi` instance."""
+
+    #: Seconds to open a file and start playing it.
+    load_latency = 0.05
+    #: Seconds to parse each entry of a playlist.
+    item_cost = 1e-5
+    #: Seconds ``Slideshow.IsVideo`` stays set after a video clip ends.
+    label_lag = 0.15
+    #: Length of every track in seconds.
+    track_duration = 180.0
+    #: Seconds to fetch a track which is not in the page cache, e.g., from a NAS.
+    storage_latency = 0.0
+    #: Whether debug logging is on in kodi's settings.
+    debug_log = False
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, keep_player=False):
+        """Forget everything but the paths and the settings.
+
+        Args:
+            keep_player (bool): keep the music playlist and its shuffle and
+                repeat state, as kodi does between two slideshows.
+
+        """
+        self.now = 0.0
+        self.deadline = 24 * 3600.0
+        self.abort = False
+        self.wall_start = time.perf_counter()
+        self._queue = []
+        self._seq = itertools.count()
+        self._callbacks = collections.deque()
+        self._players = []
+        self._monitors = []
+        self._generation = 0
+        self._busy_until = 0.0
+        self._track_started = 0.0
+        self._resume_at = 0.0
+        #: list: (sim, wall, kind, detail) of the recorded events.
+        self.events = []
+        #: list: (level, message) logged through ``xbmc.log``.
+        self.messages = []
+        #: collections.Counter: calls of the kodi API by name.
+        self.api_calls = collections.Counter()
+        self.notifications = []
+        #: dict: path to the time a read ahead of the track is done.
+        self.cached = {}
+        self.playing = None  # None, 'audio' or 'video'
+        self.paused = False
+        self.muted = False
+        if not keep_player:
+            self.random = random.Random(0)
+            self.playlist = []
+            self.position = -1
+            self.shuffled = False
+            self.repeat = 'off'
+        # slideshow
+        self.slideshow_active = False
+        self.slideshow_video = False
+        self.slideshow_paused = False
+        self.slide = ''
+        if not hasattr(self, 'paths'):
+            #: dict: (window id, key) to the value of a window property.
+            self.properties = {}
+            self.paths = {}
+            self.settings = {}
+            self.addon_id = ''
+            self.addon_path = ''
+
+    # ------------------------------------------------------------------ setup
+    def setup(self, root, addon_path, addon_id, settings=None):
+        """Lay out kodi's directories under ``root`` and load the addon settings.
+
+        Default values are read from ``resources/settings.xml`` of the addon
+        and overridden by ``settings``.
+
+        Args:
+            root (str): directory to hold kodi's home.
+            addon_path (str): directory of the addon under test.
+            addon_id (str): id of the addon.
+            settings (dict): setting id to value(str).
+
+        """
+        home = os.path.join(root, 'home')
+        self.addon_id = addon_id
+        self.addon_path = addon_path
+        self.paths = {
+            'special://home/': home,
+            'special://xbmc/': os.path.join(root, 'xbmc'),
+            'special://profile/': os.path.join(home, 'userdata'),
+            'special://masterprofile/': os.path.join(home, 'userdata'),
+            'special://userdata/': os.path.join(home, 'userdata'),
+            'special://temp/': os.path.join(home, 'temp'),
+            'special://skin/': os.path.join(home, 'addons', 'skin.estuary'),
+        }
+        for path in self.paths.values():
+            os.makedirs(path, exist_ok=True)
+        os.makedirs(self.profile_dir(), exist_ok=True)
+
+        self.settings = {}
+        tree = ET.parse(os.path.join(addon_path, 'resources', 'settings.xml'))
+        for setting in tree.iter('setting'):
+            default = setting.find('default')
+            self.settings[setting.get('id')] = (default.text or '') if default is not None else ''
+        self.settings.update(settings or {})
+        self.save_settings()
+
+    def profile_dir(self):
+        return os.path.join(self.paths['special://profile/'], 'addon_data', self.addon_id)
+
+    def save_settings(self):
+        """Write ``settings.xml`` in the addon profile directory, as kodi does."""
+        root = ET.Element('settings', version='2')
+        for key, value in self.settings.items():
+            ET.SubElement(root, 'setting', id=key).text = value
+        ET.ElementTree(root).write(os.path.join(self.profile_dir(), 'settings.xml'),
+                                   encoding='utf-8', xml_declaration=True)
+
+    def change_settings(self, settings):
+        """The user changes ``settings``(dict), which calls ``onSettingsChanged`` of monitors."""
+        self.settings.update(settings)
+        self.save_settings()
+        self._callbacks.append((self._monitors, 'onSettingsChanged', ()))
+
+    def translate_path(self, path):
+        for prefix, real in sorted(self.paths.items(), key=lambda item: -len(item[0])):
+            if path.startswith(prefix) or path + '/' == prefix:
+                rest = path[len(prefix):]
+                return os.path.join(real, *rest.split('/')) if rest else real + os.sep
+        return path
+
+    # ------------------------------------------------------------------ clock
+    def at(self, t, func, *args):
+        """Run ``func(*args)`` at the simulated time ``t``."""
+        heapq.heappush(self._queue, (t, next(self._seq), func, args))
+
+    def after(self, delay, func, *args):
+        self.at(self.now + delay, func, *args)
+
+    def sleep(self, seconds):
+        """Advance the clock by ``seconds``, running due events and callbacks.
+
+        Kodi really sleeps, so other threads of the script, if any, are given
+        a moment to run before the clock moves on.
+
+        """
+        if threading.active_count() > 1:
+            time.sleep(0.0005)
+        target = self.now + seconds
+        self.dispatch()
+        while self._queue and self._queue[0][0] <= target and not self.abort:
+            t, _, func, args = heapq.heappop(self._queue)
+            self.now = max(self.now, t)
+            func(*args)
+            self.dispatch()
+        self.now = max(self.now, target)
+        if self.now >= self.deadline:
+            self.abort = True
+        self.dispatch()
+
+    def record(self, kind, detail=''):
+        self.events.append((self.now, time.perf_counter() - self.wall_start, kind, detail))
+
+    def first(self, kind, since=0.0, detail=None):
+        """The first recorded event of ``kind`` at or after ``since``(simulated)
+        whose detail contains ``detail``.
+
+        Returns:
+            tuple: (sim, wall, kind, detail) or None.
+
+        """
+        for event in self.events:
+            if event[2] == kind and event[0] >= since and \
+                    (detail is None or detail in event[3]):
+                return event
+        return None
+
+    # -------------------------------------------------------------- callbacks
+    def register_player(self, player):
+        self._players.append(weakref.ref(player))
+
+    def register_monitor(self, monitor):
+        self._monitors.append(weakref.ref(monitor))
+
+    def callback(self, name, *args):
+        self._callbacks.append((self._players, name, args))
+
+    def notify(self, method, data=None):
+        self.notifications.append(method)
+        self._callbacks.append((self._monitors, 'onNotification',
+                                ('xbmc', method, json.dumps(data or {}))))
+
+    def dispatch(self):
+        while self._callbacks:
+            targets, name, args = self._callbacks.popleft()
+            for ref in list(targets):
+                obj = ref()
+                if obj is not None:
+                    getattr(obj, name)(*args)
+
+    # ----------------------------------------------------------------- player
+    def parse_playlist(self, path):
+        """Entries of a playlist file; a smart playlist gives 20 made-up tracks."""
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.xsp':
+            return ['xsp-track-%02d.mp3' % i for i in range(20)]
+        if ext not in ('.m3u', '.pls'):
+            return [path]
+        items = []
+        if not os.path.exists(path):
+            raise ValueError('Invalid params.')
+        with open(path, encoding='utf-8', errors='surrogateescape') as f:
+            for line in f:
+                line = line.strip()
+                if ext == '.pls':
+                    key, _, value = line.partition('=')
+                    if key.lower().startswith('file'):
+                        items.append(value)
+                elif line and not line.startswith('#'):
+                    items.append(line)
+        return items
+
+    def play_playlist(self, items, offset=0):
+        self.record('play_playlist', '%d items' % len(items))
+        self.playlist = list(items)
+        if self.shuffled:
+            self.random.shuffle(self.playlist)
+        if not self.playlist:
+            return
+        offset = offset if 0 <= offset < len(self.playlist) else 0
+        self.parse(len(self.playlist))
+        self.start_audio(offset)
+
+    def parse(self, n_items):
+        """Keep kodi busy parsing ``n_items`` playlist entries."""
+        self._busy_until = max(self._busy_until, self.now) + n_items * self.item_cost
+
+    def fetch(self, path):
+        """Read ahead of ``path``, which takes :attr:`storage_latency`."""
+        self.record('fetch', path)
+        self.cached.setdefault(path, self.now + self.storage_latency)
+
+    def start_audio(self, index):
+        """Play the ``index``th entry of the music playlist.
+
+        It takes :attr:`load_latency` after kodi is done with parsing, and
+        :attr:`storage_latency` more unless the track has been read ahead.
+
+        """
+        latency = max(self._busy_until - self.now, 0) + self.load_latency
+        cached = self.cached.get(self.playlist[index], self.now + self.storage_latency)
+        latency += min(max(cached - self.now, 0), self.storage_latency)
+        self._generation += 1
+        self.playing = 'audio'
+        self.paused = False
+        self.position = index
+        self.record('audio_start', 'muted' if self.muted else self.playlist[index])
+        self.notify('Player.OnPlay', {'item': {'type': 'song'}})
+        self.after(latency, self._av_started, self._generation)
+
+    def play_video(self, duration):
+        """The slideshow shows a video clip of ``duration`` seconds."""
+        self.slideshow_video = True
+        if self.playing:
+            self.stop()
+        self._generation += 1
+        self.playing = 'video'
+        self.paused = False
+        self.record('video_start')
+        self.after(self.load_latency, self._av_started, self._generation)
+        self.after(duration, self._video_ended, self._generation)
+
+    def _av_started(self, generation):
+        if generation != self._generation:
+            return
+        self.record('av_started', self.playing + (' muted' if self.muted else ''))
+        self._track_started = self.now - self._resume_at
+        self._resume_at = 0.0
+        self.callback('onAVStarted')
+        self.notify('Player.OnAVStart')
+        if self.playing == 'audio':
+            self.after(self.track_duration, self._track_ended, generation)
+
+    def _track_ended(self, generation):
+        if generation != self._generation:
+            return
+        next_position = self.position + 1
+        if next_position < len(self.playlist):
+            self.start_audio(next_position)
+        elif self.repeat == 'all':
+            self.start_audio(0)
+        else:
+            self._generation += 1
+            self.playing = None
+            self.callback('onPlayBackEnded')
+            self.notify('Player.OnStop', {'end': True})
+
+    def _video_ended(self, generation):
+        if generation != self._generation:
+            return
+        self._generation += 1
+        self.playing = None
+        self.record('video_end')
+        self.callback('onPlayBackEnded')
+        self.notify('Player.OnStop', {'end': True})
+        self.after(self.label_lag, setattr, self, 'slideshow_video', False)
+
+    def stop(self):
+        if not self.playing:
+            return
+        self._generation += 1
+        self.record('stop', self.playing)
+        self.playing = None
+        self.callback('onPlayBackStopped')
+        self.notify('Player.OnStop', {'end': False})
+
+    def builtin(self, command):
+        """Run a built-in function such as ``PlayMedia(path, playoffset=3)``."""
+        self.record('builtin', command)
+        name, _, args = command.partition('(')
+        args = [arg.strip() for arg in args.rstrip(')').split(',')] if args else []
+        name = name.strip().lower()
+        if name == 'playmedia':
+            offset = 0
+            for arg in args[1:]:
+                if arg.startswith('playoffset='):
+                    # 1-based, as kodi takes it.
+                    offset = int(arg.split('=')[1]) - 1
+            self.play_playlist(self.parse_playlist(args[0]), offset)
+        elif name == 'playercontrol':
+            control = args[0].lower()
+            if control == 'play' and self.playing:
+                self.paused = not self.paused
+            elif control == 'stop':
+                self.stop()
+            elif control in ('randomon', 'randomoff'):
+                self.shuffled = control == 'randomon'
+                if self.shuffled and self.playlist:
+                    current = self.playlist[self.position] if self.position >= 0 else None
+                    self.random.shuffle(self.playlist)
+                    if current is not None:
+                        self.position = self.playlist.index(current)
+            elif control.startswith('repeat'):
+                self.repeat = {'repeatall': 'all', 'repeatone': 'one'}.get(control, 'off')
+        elif name == 'mute':
+            self.muted = not self.muted
+        elif name == 'action' and args and args[0].lower() == 'playpause':
+            self.slideshow_paused = False
+
+    def jsonrpc(self, request):
+        """Answer a JSON-RPC request(str), a batch or a single call."""
+        request = json.loads(request)
+        batch = isinstance(request, list)
+        self.record('jsonrpc', ','.join(call['method'] for call in (request if batch else [request])))
+        responses = []
+        for call in request if batch else [request]:
+            response = {'jsonrpc': '2.0', 'id': call.get('id')}
+            handler = getattr(self, 'rpc_' + call['method'].replace('.', '_'), None)
+            try:
+                if handler is None:
+                    raise LookupError('Method not found.')
+                response['result'] = handler(**call.get('params', {}))
+            except (LookupError, TypeError, ValueError) as e:
+                response['error'] = {'code': -32602, 'message': str(e)}
+            responses.append(response)
+        return json.dumps(responses if batch else responses[0])
+
+    def rpc_Playlist_Clear(self, playlistid):
+        if playlistid == 0:
+            self.playlist = []
+            self.position = -1
+        return 'OK'
+
+    def rpc_Playlist_Add(self, playlistid, item):
+        items = item if isinstance(item, list) else [item]
+        added = []
+        for i in items:
+            added.extend(self.parse_playlist(i['file']))
+        self.playlist.extend(added)
+        self.parse(len(added))
+        return 'OK'
+
+    def rpc_Playlist_Remove(self, playlistid, position):
+        if position == self.position and self.playing == 'audio':
+            raise ValueError('Cannot remove the playing item.')
+        del self.playlist[position]
+        if position < self.position:
+            self.position -= 1
+        return 'OK'
+
+    def rpc_Playlist_GetItems(self, playlistid, properties=None, limits=None):
+        items = self.playlist if playlistid == 0 else []
+        start = (limits or {}).get('start', 0)
+        end = min((limits or {}).get('end', len(items)), len(items))
+        return {'items': [{'label': os.path.basename(path), 'file': path}
+                          for path in items[start:end]],
+                'limits': {'start': start, 'end': max(end, start), 'total': len(items)}}
+
+    def rpc_XBMC_GetInfoBooleans(self, booleans):
+        return {name: self.condition(name) for name in booleans}
+
+    def rpc_XBMC_GetInfoLabels(self, labels):
+        return {name: self.label(name) for name in labels}
+
+    def rpc_Player_Open(self, item, options=None):
+        options = options or {}
+        if 'repeat' in options:
+            self.repeat = options['repeat']
+        if 'file' in item:
+            self.play_playlist(self.parse_playlist(item['file']))
+            return 'OK'
+        if not self.playlist:
+            raise ValueError('Playlist is empty.')
+        if options.get('shuffled') is not None:
+            self.shuffled = options['shuffled']
+            if self.shuffled:
+                self.random.shuffle(self.playlist)
+        resume = options.get('resume')
+        if isinstance(resume, dict):
+            self._resume_at = resume.get('hours', 0) * 3600 + resume.get('minutes', 0) * 60 + \
+                resume.get('seconds', 0) + resume.get('milliseconds', 0) / 1000
+        self.start_audio(item.get('position', 0))
+        return 'OK'
+
+    def rpc_Player_GetProperties(self, playerid, properties):
+        if playerid != 0 or self.playing != 'audio':
+            raise ValueError('Invalid player.')
+        t = max(self.now - self._track_started, 0)
+        values = {'position': self.position,
+                  'time': {'hours': int(t // 3600), 'minutes': int(t % 3600 // 60),
+                           'seconds': int(t % 60), 'milliseconds': int(t % 1 * 1000)}}
+        return {name: values[name] for name in properties}
+
+    # -------------------------------------------------------------- slideshow
+    def start_slideshow(self, slides, interval=5.0):
+        """Start a slideshow of ``slides``(filenames) changing every ``interval`` seconds."""
+        self.slideshow_active = True
+        self.record('slideshow_start')
+        self._next_slide(list(slides), 0, interval)
+
+    def _next_slide(self, slides, index, interval):
+        if not self.slideshow_active:
+            return
+        self.slide = slides[index % len(slides)]
+        self.after(interval, self._next_slide, slides, index + 1, interval)
+
+    def end_slideshow(self):
+        self.record('slideshow_end')
+        self.slideshow_active = False
+        self.slideshow_video = False
+        self.slide = ''
+
+    # ------------------------------------------------------------- infolabels
+    def condition(self, condition):
+        condition = condition.strip()
+        if condition.startswith('!'):
+            return not self.condition(condition[1:])
+        values = {
+            'slideshow.isactive': self.slideshow_active,
+            'slideshow.isvideo': self.slideshow_video,
+            'slideshow.ispaused': self.slideshow_paused,
+            'player.muted': self.muted,
+            'player.hasmedia': self.playing is not None,
+            'player.hasaudio': self.playing == 'audio',
+            'player.hasvideo': self.playing == 'video',
+            'player.paused': self.paused,
+            'system.getbool(debug.showloginfo)': self.debug_log,
+        }
+        return values.get(condition.lower(), False)
+
+    def label(self, label):
+        label = label.strip().lower()
+        current = self.playlist[self.position] \
+            if self.playing == 'audio' and 0 <= self.position < len(self.playlist) else ''
+        values = {
+            # 1-based, as kodi does.
+            'playlist.position(music)': str(self.position + 1) if self.playlist else '0',
+            'playlist.length(music)': str(len(self.playlist)),
+            'player.title': os.path.splitext(os.path.basename(current))[0],
+            'player.filenameandpath': current,
+            'slideshow.filename': os.path.basename(self.slide),
+            'slideshow.path': self.slide,
+        }
+        return values.get(label, '')
+
+
+#: The fake kodi instance.
+kodi = Kodi()
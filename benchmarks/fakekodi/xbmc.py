@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Stand-in for kodi's ``xbmc`` module. See :mod:`kodi`."""
+
+import os
+from kodi import kodi
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 3
+LOGFATAL = 4
+LOGNONE = 5
+
+PLAYLIST_MUSIC = 0
+PLAYLIST_VIDEO = 1
+
+
+def _api(name):
+    kodi.api_calls[name] += 1
+
+
+def log(msg, level=LOGDEBUG):
+    kodi.messages.append((level, msg))
+    if os.environ.get('FAKEKODI_LOG'):
+        print('%9.3f %s' % (kodi.now, msg))
+
+
+def sleep(time):
+    _api('sleep')
+    kodi.sleep(time / 1000)
+
+
+def executebuiltin(function, wait=False):
+    _api('executebuiltin')
+    kodi.builtin(function)
+
+
+def executeJSONRPC(jsonrpccommand):
+    _api('executeJSONRPC')
+    return kodi.jsonrpc(jsonrpccommand)
+
+
+def getCondVisibility(condition):
+    _api('getCondVisibility')
+    return kodi.condition(condition)
+
+
+def getInfoLabel(cLine):
+    _api('getInfoLabel')
+    return kodi.label(cLine)
+
+
+def getGlobalIdleTime():
+    _api('getGlobalIdleTime')
+    return int(kodi.now)
+
+
+def getSkinDir():
+    return 'skin.estuary'
+
+
+class Monitor():
+
+    def __init__(self):
+        kodi.register_monitor(self)
+
+    def waitForAbort(self, timeout=None):
+        _api('waitForAbort')
+        if timeout is None:
+            while not kodi.abort:
+                kodi.sleep(60)
+        else:
+            kodi.sleep(timeout)
+        return kodi.abort
+
+    def abortRequested(self):
+        return kodi.abort
+
+    def onNotification(self, sender, method, data):
+        pass
+
+    def onSettingsChanged(self):
+        pass
+
+
+class Player():
+
+    def __init__(self):
+        kodi.register_player(self)
+
+    def play(self, item='', listitem=None, windowed=False, startpos=-1):
+        _api('play')
+        if isinstance(item, PlayList):
+            kodi.start_audio(max(startpos, 0))
+        else:
+            kodi.play_playlist(kodi.parse_playlist(item), max(startpos, 0))
+
+    def stop(self):
+        _api('stop')
+        kodi.stop()
+
+    def pause(self):
+        _api('pause')
+        if kodi.playing:
+            kodi.paused = not kodi.paused
+
+    def isPlaying(self):
+        _api('isPlaying')
+        return kodi.playing is not None
+
+    def isPlayingAudio(self):
+        _api('isPlayingAudio')
+        return kodi.playing == 'audio'
+
+    def isPlayingVideo(self):
+        _api('isPlayingVideo')
+        return kodi.playing == 'video'
+
+    def getTime(self):
+        _api('getTime')
+        return 0.0
+
+    def onPlayBackStarted(self):
+        pass
+
+    def onAVStarted(self):
+        pass
+
+    def onPlayBackStopped(self):
+        pass
+
+    def onPlayBackEnded(self):
+        pass
+
+
+class PlayList():
+
+    def __init__(self, playList):
+        self.playlist_id = playList
+
+    def size(self):
+        _api('PlayList.size')
+        return len(kodi.playlist) if self.playlist_id == PLAYLIST_MUSIC else 0
+
+    def __len__(self):
+        return self.size()
+
+    def getposition(self):
+        return kodi.position
+
+    def clear(self):
+        _api('PlayList.clear')
+        if self.playlist_id == PLAYLIST_MUSIC:
+            kodi.playlist = []
+            kodi.position = -1
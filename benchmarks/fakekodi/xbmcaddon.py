@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Stand-in for kodi's ``xbmcaddon`` module. See :mod:`kodi`."""
+
+from kodi import kodi
+
+
+class Addon():
+
+    def __init__(self, id=None):
+        self.id = id or kodi.addon_id
+
+    def getSetting(self, id):
+        return kodi.settings.get(id, '')
+
+    def getSettingBool(self, id):
+        return self.getSetting(id).lower() == 'true'
+
+    def getSettingInt(self, id):
+        return int(self.getSetting(id) or 0)
+
+    def getSettingNumber(self, id):
+        return float(self.getSetting(id) or 0)
+
+    def getSettingString(self, id):
+        return self.getSetting(id)
+
+    def setSetting(self, id, value):
+        kodi.settings[id] = value
+        kodi.save_settings()
+
+    def getAddonInfo(self, id):
+        return {
+            'id': self.id,
+            'name': self.id,
+            'path': kodi.addon_path,
+            'profile': 'special://profile/addon_data/%s/' % self.id,
+            'version': '0.0.0',
+        }.get(id, '')
+
+    def getLocalizedString(self, id):
+        return ''
+
+    def openSettings(self):
+        kodi.record('open_settings')
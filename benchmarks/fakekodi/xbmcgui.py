@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Stand-in for kodi's ``xbmcgui`` module. See :mod:`kodi`."""
+
+from kodi import kodi
+
+NOTIFICATION_INFO = 'info'
+NOTIFICATION_WARNING = 'warning'
+NOTIFICATION_ERROR = 'error'
+
+
+class Dialog():
+    #: Answer of :meth:`yesno`.
+    yes = False
+
+    def notification(self, heading, message, icon=NOTIFICATION_INFO, time=5000, sound=True):
+        kodi.record('notification', '%s: %s: %s' % (icon, heading, message))
+
+    def yesno(self, heading, message, nolabel='', yeslabel='', autoclose=0, defaultbutton=0):
+        kodi.record('yesno', message)
+        return self.yes
+
+    def ok(self, heading, message):
+        kodi.record('ok', message)
+        return True
+
+
+class Window():
+    """Only the window properties, which are shared by all scripts."""
+
+    def __init__(self, existingWindowId=-1):
+        self.window_id = existingWindowId
+
+    def getProperty(self, key):
+        return kodi.properties.get((self.window_id, key.lower()), '')
+
+    def setProperty(self, key, value):
+        kodi.properties[(self.window_id, key.lower())] = value
+
+    def clearProperty(self, key):
+        kodi.properties.pop((self.window_id, key.lower()), None)
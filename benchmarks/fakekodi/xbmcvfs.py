@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Stand-in for kodi's ``xbmcvfs`` module. See :mod:`kodi`."""
+
+import os
+import shutil
+from kodi import kodi
+
+
+def translatePath(path):
+    return kodi.translate_path(path)
+
+
+def exists(path):
+    kodi.api_calls['xbmcvfs.exists'] += 1
+    return os.path.exists(translatePath(path))
+
+
+def listdir(path):
+    kodi.api_calls['xbmcvfs.listdir'] += 1
+    path = translatePath(path)
+    dirs, files = [], []
+    for entry in os.scandir(path):
+        (dirs if entry.is_dir() else files).append(entry.name)
+    return dirs, files
+
+
+def mkdirs(path):
+    os.makedirs(translatePath(path), exist_ok=True)
+    return True
+
+
+def delete(file):
+    try:
+        os.remove(translatePath(file))
+    except OSError:
+        return False
+    return True
+
+
+def copy(strSource, strDestination):
+    shutil.copy(translatePath(strSource), translatePath(strDestination))
+    return True
+
+
+def rename(file, newFile):
+    os.replace(translatePath(file), translatePath(newFile))
+    return True
+
+
+class Stat():
+
+    def __init__(self, path):
+        try:
+            self._st = os.stat(translatePath(path))
+        except OSError:
+            self._st = None
+
+    def _get(self, name):
+        return int(getattr(self._st, name)) if self._st else 0
+
+    def st_mtime(self):
+        return self._get('st_mtime')
+
+    def st_size(self):
+        return self._get('st_size')
+
+    def st_mode(self):
+        return self._get('st_mode')
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Run the addon's scripts against the fake kodi in :mod:`fakekodi`.
+
+``addon.py`` and ``service.py`` are run unchanged with :func:`run_script`,
+each one in a fresh set of modules as kodi runs each script in its own
+interpreter. While a script runs, ``time.monotonic`` follows the simulated
+clock of the fake kodi.
+
+"""
+
+import os
+import runpy
+import sys
+import time
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+addon_dir = os.path.dirname(bench_dir)
+addon_id = 'script.slideshow-bgm'
+
+sys.path.insert(0, os.path.join(bench_dir, 'fakekodi'))
+if addon_dir not in sys.path:
+    sys.path.insert(0, addon_dir)
+
+from kodi import kodi  # noqa: E402
+
+skin_xml = '''<?xml version="1.0" encoding="UTF-8"?>
+<window>
+\t<!-- Slideshow window -->
+\t<defaultcontrol>-</defaultcontrol>
+\t<controls>
+\t\t<control type="image">
+\t\t\t<texture>$INFO[Slideshow.Filename]</texture>
+\t\t</control>
+\t</controls>
+</window>
+'''
+
+
+def setup(root, settings=None, skin=skin_xml):
+    """Lay out a kodi home under ``root`` with a skin and the addon settings.
+
+    Args:
+        root (str): an empty directory.
+        settings (dict): setting id to value(str), overriding the defaults.
+        skin (str): content of the skin's ``SlideShow.xml``.
+
+    """
+    kodi.setup(root, addon_dir, addon_id, settings)
+    xml_dir = os.path.join(kodi.translate_path('special://skin'), 'xml')
+    os.makedirs(xml_dir, exist_ok=True)
+    with open(os.path.join(xml_dir, 'SlideShow.xml'), 'w', encoding='utf-8') as f:
+        f.write(skin)
+
+
+def make_m3u(path, n_tracks, music_dir='/music'):
+    """Write an m3u playlist of ``n_tracks`` made-up tracks."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('#EXTM3U\n\n')
+        for i in range(n_tracks):
+            f.write('%s/album %03d/track %05d.mp3\n' % (music_dir, i // 20, i))
+    return path
+
+
+def run_script(name, setup=None):
+    """Run ``addon.py`` or ``service.py`` of the addon.
+
+    Args:
+        setup (callable): called once the modules of the addon are unloaded,
+            e.g., to import and patch them.
+
+    Returns:
+        tuple: (wall seconds, exit code)
+
+    """
+    for module in [m for m in sys.modules if m == 'resources' or m.startswith('resources.')]:
+        del sys.modules[module]
+    if setup:
+        setup()
+    code = 0
+    monotonic = time.monotonic
+    time.monotonic = lambda: kodi.now
+    start = time.perf_counter()
+    try:
+        runpy.run_path(os.path.join(addon_dir, name), run_name='__main__')
+    except SystemExit as e:
+        code = e.code
+    finally:
+        time.monotonic = monotonic
+    return time.perf_counter() - start, code
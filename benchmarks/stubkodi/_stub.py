@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""Kodi modules which only stand in for imports.
+
+Unlike :mod:`fakekodi`, importing them costs nearly nothing, so that
+``python -X importtime`` reports the imports of the addon alone. Any
+attribute of these modules is :class:`_Stub`, which can be subclassed,
+called and looked into.
+
+"""
+
+
+class _Stub():
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return _Stub()
+
+    def __getattr__(self, name):
+        return _Stub()
+
+
+def module_getattr(name):
+    return _Stub
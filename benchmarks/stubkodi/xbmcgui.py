@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""Stand-in for kodi's ``xbmcgui`` module. See :mod:`_stub`."""
+
+from _stub import module_getattr as __getattr__  # noqa: F401
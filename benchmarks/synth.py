@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Synthetic music trees for the benchmarks."""
+
+import os
+import struct
+
+exts = ('.mp3', '.ogg', '.wav', '.wma', '.jpg', '.nfo')
+
+
+def audio_header(ext, seconds):
+    """Make the headers of a music file of ``seconds`` without the audio data.
+
+    Returns:
+        bytes: a 128kbps Xing mp3, a Vorbis ogg, a 16-bit stereo wav or a wma
+        header, or ``b''`` for other extensions.
+
+    """
+    if ext == '.mp3':
+        frame = b'\xff\xfb\x90\x00' + bytes(32) + b'Xing' + \
+            struct.pack('>II', 1, int(seconds * 44100 / 1152))
+        return frame.ljust(417, b'\0') + b'\xff\xfb\x90\x00' + bytes(413)
+    if ext == '.ogg':
+        vorbis = b'\x01vorbis' + struct.pack('<IBIiiiBB', 0, 2, 44100, 0, 128000, 0, 0xb8, 1)
+        first = b'OggS\x00\x02' + bytes(20) + bytes([1, len(vorbis)]) + vorbis
+        last = b'OggS\x00\x04' + struct.pack('<q', int(seconds * 44100)) + bytes(12) + b'\x00'
+        return first + last
+    if ext == '.wav':
+        fmt = struct.pack('<HHIIHH', 1, 2, 44100, 176400, 4, 16)
+        return b'RIFF' + struct.pack('<I', 36) + b'WAVEfmt ' + struct.pack('<I', 16) + fmt + \
+            b'data' + struct.pack('<I', int(seconds * 176400))
+    if ext == '.wma':
+        props = bytes.fromhex('a1dcab8c47a9cf118ee400c00c205365') + struct.pack('<Q', 104) + \
+            bytes(40) + struct.pack('<QQQIIII', int(seconds * 10 ** 7), 0, 0, 2, 0, 0, 128000)
+        return bytes.fromhex('3026b2758e66cf11a6d900aa0062ce6c') + \
+            struct.pack('<QIBB', 30 + len(props), 1, 1, 2) + props
+    return b''
+
+
+def make_tree(top, n_files, files_per_dir=50, fanout=8, audio=False):
+    """Create a tree of files under ``top``.
+
+    Directories are filled breadth-first, ``fanout`` subdirectories each,
+    until ``n_files`` files are created. A third of the files are not music.
+    Files are empty unless ``audio`` is set; then music files get the
+    headers of :func:`audio_header`.
+
+    Args:
+        top (str): root of the tree, created if it doesn't exist.
+        n_files (int): number of files to create.
+        files_per_dir (int): number of files in each directory.
+        fanout (int): number of subdirectories in each directory.
+        audio (bool): whether to write the headers of music files.
+
+    Returns:
+        int: number of directories created.
+
+    """
+    os.makedirs(top, exist_ok=True)
+    queue = [top]
+    n_dirs = 0
+    created = 0
+    while created < n_files:
+        d = queue.pop(0)
+        for i in range(min(files_per_dir, n_files - created)):
+            ext = exts[i % len(exts)]
+            with open(os.path.join(d, 'track %04d%s' % (i, ext)), 'wb') as f:
+                if audio:
+                    f.write(audio_header(ext, 60 + created % 300))
+            created += 1
+        for i in range(fanout):
+            sub = os.path.join(d, 'album %02d' % i)
+            os.mkdir(sub)
+            queue.append(sub)
+            n_dirs += 1
+
+    return n_dirs
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Find music files with the same content under different paths.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi.
+
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Deduplicator():
+    """Drop the files whose content is the same as a file kept before.
+
+    Files are compared by size first, then by a hash of their first and
+    last :attr:`block_size` bytes, and by a hash of the whole content only
+    if those collide. So, a file of a size no other file has is never read,
+    and most of the others are read 2 blocks each.
+
+    The hashes are cached by path, size and mtime, so a rescan costs a
+    ``stat`` per file. Files are stat'ed and hashed on a bounded thread
+    pool, like :class:`metadata.MetadataCache`.
+
+    Args:
+        cache_file (str): path of the cache file.
+        workers (int): maximum number of files read concurrently.
+
+    """
+
+    version = 1
+    #: Number of files handled by a task of the thread pool.
+    chunk_size = 32
+    #: Bytes of the head and of the tail of a file in the partial hash.
+    block_size = 1 << 16
+
+    def __init__(self, cache_file, workers=8):
+        self.cache_file = cache_file
+        self.workers = workers
+        self.old_files = self.load()
+        #: dict: path to [size, mtime_ns, partial hash, full hash], a hash
+        #: ``None`` if not computed.
+        self.files = {}
+        #: dict: size to the paths of the files kept with the size.
+        self.kept = {}
+        #: int: number of duplicates dropped.
+        self.dropped = 0
+        #: int: bytes read to hash files, not found in the cache.
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the cache file.
+
+        Returns:
+            dict: path to [size, mtime_ns, partial hash, full hash], empty if
+            there's no valid cache file.
+
+        """
+        try:
+            with open(self.cache_file, encoding='utf-8', errors='surrogateescape') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            return {}
+
+        return data.get('files', {})
+
+    def save(self):
+        """Write the cache file atomically, with the files hashed since it was loaded.
+
+        Only the files with a hash are written; the others cost a ``stat`` anyway.
+
+        Returns:
+            bool: True if succeeds, False otherwise.
+
+        """
+        files = {path: entry for path, entry in self.files.items() if entry[2]}
+        # Unique to the thread, as both scripts run in kodi's process.
+        tmp_file = '%s.%d.tmp' % (self.cache_file, threading.get_ident())
+        try:
+            with open(tmp_file, mode='w', encoding='utf-8', errors='surrogateescape') as f:
+                json.dump({'version': self.version, 'files': files}, f,
+                          separators=(',', ':'), ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except (IOError, OSError):
+            return False
+
+        return True
+
+    def _stat(self, path):
+        """Get the entry of ``path``, with the hashes cached if it's unchanged."""
+        try:
+            # By the bytes path, as kodi's filesystem encoding may be ASCII.
+            st = os.stat(path.encode('utf-8', 'surrogateescape'))
+        except OSError:
+            return None
+        entry = self.old_files.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry
+        return [st.st_size, st.st_mtime_ns, None, None]
+
+    def _hash(self, path, full):
+        """Hash the head and the tail of the file ``path``, or all of it if ``full``.
+
+        A file of up to 2 blocks is read whole, so its partial hash is a
+        full one.
+
+        """
+        entry = self.files[path]
+        size = entry[0]
+        h = hashlib.blake2b(digest_size=16)
+        read = 0
+        try:
+            with open(path.encode('utf-8', 'surrogateescape'), 'rb') as f:
+                if full or size <= 2 * self.block_size:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        h.update(block)
+                        read += len(block)
+                else:
+                    head = f.read(self.block_size)
+                    f.seek(-self.block_size, os.SEEK_END)
+                    tail = f.read(self.block_size)
+                    h.update(head)
+                    h.update(tail)
+                    read = len(head) + len(tail)
+        except (IOError, OSError):
+            # Unreadable, so it's unique; kodi will skip it anyway.
+            digest = 'error:' + path
+        else:
+            digest = h.hexdigest()
+        with self._lock:
+            self.bytes_read += read
+        if size <= 2 * self.block_size:
+            entry[2] = entry[3] = digest
+        else:
+            entry[3 if full else 2] = digest
+
+    def _run(self, pool, func, items):
+        """Run ``func`` on each of ``items``, on the thread pool if worth it."""
+        def run_all(chunk):
+            return [func(item) for item in chunk]
+
+        if pool is None or len(items) <= self.chunk_size:
+            return run_all(items)
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        return [result for chunk in pool.map(run_all, chunks) for result in chunk]
+
+    def _collisions(self, paths, key):
+        """Paths of ``paths`` and of the files kept whose ``key`` is shared by another one."""
+        groups = {}
+        for path in paths:
+            entry = self.files[path]
+            for other in [path] + self.kept.get(entry[0], []):
+                groups.setdefault(key(self.files[other]), set()).add(other)
+        return {path for group in groups.values() if len(group) > 1 for path in group}
+
+    def filter(self, paths):
+        """Drop the paths whose content is the same as a path kept before.
+
+        Calls for the batches of a scan drop the duplicates across batches.
+        The first of the same files is kept.
+
+        Args:
+            paths (list): paths(str) of music files.
+
+        Returns:
+            list: the paths kept, in order.
+
+        """
+        pool = ThreadPoolExecutor(max_workers=self.workers) \
+            if self.workers > 1 and len(paths) > self.chunk_size else None
+        try:
+            found = []
+            for path, entry in zip(paths, self._run(pool, self._stat, paths)):
+                if entry is not None and path not in self.files:
+                    self.files[path] = entry
+                    found.append(path)
+
+            # The files of the same size get a partial hash, and the files of
+            # the same partial hash a full one.
+            for full, key in ((False, lambda entry: entry[0]),
+                              (True, lambda entry: (entry[0], entry[2]))):
+                todo = sorted(path for path in self._collisions(found, key)
+                              if self.files[path][3 if full else 2] is None)
+                self._run(pool, lambda path: self._hash(path, full), todo)
+        finally:
+            if pool:
+                pool.shutdown()
+
+        kept = []
+        for path in found:
+            entry = self.files[path]
+            same_size = self.kept.setdefault(entry[0], [])
+            if entry[3] is not None and \
+                    any(self.files[other][3] == entry[3] for other in same_size):
+                self.dropped += 1
+                continue
+            same_size.append(path)
+            kept.append(path)
+
+        return kept
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Map picture folders to the bgm played for them.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi.
+
+A mapping file has a rule per line, a picture folder and a playlist or a
+music directory separated by ' = '::
+
+    # comments and blank lines are ignored
+    /home/me/Pictures/Travel = /home/me/Music/travel.m3u
+    smb://nas/photos/Kids = smb://nas/music/kids/
+
+"""
+
+import re
+
+_separators = re.compile(r'[/\\]+')
+
+
+def split_path(path):
+    """Split ``path`` into its components, whatever its separators are.
+
+    Args:
+        path (str): e.g., '/home/me/Pictures/a.jpg' or 'smb://nas/photos/'
+
+    Returns:
+        list: e.g., ['', 'home', 'me', 'Pictures', 'a.jpg'] or ['smb:', 'nas', 'photos']
+
+    """
+    parts = _separators.split(path)
+    if len(parts) > 1 and parts[-1] == '':
+        parts.pop()
+    return parts
+
+
+class PrefixTrie():
+    """Longest-prefix lookup of paths, component by component.
+
+    A rule for '/pictures/2020' matches '/pictures/2020/a.jpg' but not
+    '/pictures/2020-old/a.jpg'. A lookup walks down the trie once along the
+    path, so it costs O(length of the path) however many rules there are.
+
+    Args:
+        rules (iterable): (prefix, value) pairs. A later rule for the same
+            prefix wins.
+
+    """
+
+    def __init__(self, rules=()):
+        #: dict: component to the child node; the value of a node is at key ``None``.
+        self.root = {}
+        self.size = 0
+        for prefix, value in rules:
+            self.add(prefix, value)
+
+    def add(self, prefix, value):
+        node = self.root
+        for part in split_path(prefix):
+            node = node.setdefault(part, {})
+        self.size += None not in node
+        node[None] = value
+
+    def lookup(self, path):
+        """Find the value of the longest prefix of ``path``.
+
+        Returns:
+            The value, ``None`` if no prefix matches.
+
+        """
+        node = self.root
+        value = node.get(None)
+        for part in split_path(path):
+            node = node.get(part)
+            if node is None:
+                break
+            value = node.get(None, value)
+
+        return value
+
+    def __len__(self):
+        return self.size
+
+
+def load_rules(path):
+    """Read the rules of the mapping file ``path``.
+
+    Returns:
+        list: (picture folder, playlist or directory) pairs.
+
+    Raises:
+        IOError: if the file can't be read.
+
+    """
+    rules = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            prefix, sep, target = line.partition(' = ')
+            if sep and prefix.strip() and target.strip():
+                rules.append((prefix.strip(), target.strip()))
+
+    return rules
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Keep ``bgm.m3u`` of the bgm directory up to date from ``service.py``."""
+
+import os
+import time
+import xbmc, xbmcaddon, xbmcgui
+from . import addonId
+from .inotify import Inotify
+from .scanner import ScanIndex
+from .utils import create_playlist, indexer_property, log, profile_path
+
+
+class Indexer():
+    """Rebuild ``bgm.m3u`` whenever the bgm directory changes, while kodi is idle.
+
+    The indexer runs on the :class:`Scheduler` of ``service.py`` until kodi
+    exits. On Linux, the directories of the scan index are watched with
+    inotify; the watch is polled every :attr:`interval` seconds, backing off
+    to :attr:`max_interval` while nothing happens. Elsewhere, on network
+    directories, or once the inotify watches run out, the directory is
+    rescanned every :attr:`poll_interval` seconds; the scan index makes it a
+    ``stat`` per directory.
+
+    Once changes have settled for :attr:`settle` seconds, ``bgm.m3u`` is
+    rebuilt, but not while a slideshow or a video plays; the slideshow may
+    be reading it. If one starts during the rebuild, ``bgm.m3u`` is left
+    as it is and rebuilt once kodi is idle again. It's replaced only if the list of tracks has changed, so
+    the session and the shuffle of the last slideshow stay valid otherwise.
+    A change of the settings is taken as a change of the directory.
+
+    While the indexer runs, :class:`Player` takes ``bgm.m3u`` as up to date
+    and does not scan the directory.
+
+    Args:
+        scheduler (:class:`Scheduler`): the scheduler of the service.
+
+    """
+
+    #: Seconds between polls of the inotify watch.
+    interval = 2
+    max_interval = 10
+    #: Seconds between rescans without inotify.
+    poll_interval = 300
+    #: Seconds without changes before rebuilding.
+    settle = 5
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.bgm_dir = None
+        self.durations = False
+        self.dedup = False
+        self.inotify = None
+        #: float: time of the first change not in ``bgm.m3u`` yet, ``None`` if none.
+        self.changed = None
+        self.last_event = 0.0
+        self.next_poll = 0.0
+        #: int: number of times ``bgm.m3u`` has been rebuilt and replaced.
+        self.rebuilt = 0
+        self.configure()
+        scheduler.listen(self.on_event)
+        self.task = scheduler.every(self.interval, self.check, max_interval=self.max_interval)
+        xbmcgui.Window(10000).setProperty(indexer_property, 'running')
+
+    def configure(self):
+        """Read the settings, and watch the bgm directory anew if it has changed.
+
+        Returns:
+            bool: False if the indexer is to stop, True otherwise.
+
+        """
+        # A new instance, as the settings of an instance are read once.
+        settings = xbmcaddon.Addon(addonId)
+        if not settings.getSettingBool('watch_directory') or \
+                settings.getSetting('type') != 'Directory':
+            return False
+        bgm_dir = settings.getSetting('directory').encode('utf-8')
+        self.durations = settings.getSettingBool('read_metadata')
+        self.dedup = settings.getSettingBool('dedup')
+        if bgm_dir != self.bgm_dir:
+            self.bgm_dir = bgm_dir
+            self.close()
+            if b'://' not in bgm_dir:
+                try:
+                    self.inotify = Inotify()
+                except OSError as e:
+                    log('Watching %s by polling: %s' % (bgm_dir, e))
+        self.changed = self.changed or time.monotonic()
+        return True
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+    def stop(self):
+        self.close()
+        self.task.cancel()
+        xbmcgui.Window(10000).clearProperty(indexer_property)
+
+    def on_event(self, method, data=None):
+        if method == 'Addon.OnSettingsChanged' and not self.configure():
+            log('Directory indexer stopped by the settings.')
+            self.stop()
+            self.scheduler.stop()
+
+    def watch(self):
+        """Watch the directories in the scan index, which has just been saved."""
+        try:
+            for key in ScanIndex(profile_path('scan_index.json')).dirs:
+                self.inotify.watch(key.encode('utf-8', 'surrogateescape'))
+        except OSError as e:
+            log('Watching %s by polling: %s' % (self.bgm_dir, e), xbmc.LOGWARNING)
+            self.close()
+
+    def check(self):
+        """Poll for changes and rebuild ``bgm.m3u`` once they have settled.
+
+        Returns:
+            bool: True if anything has changed, False otherwise.
+
+        """
+        now = time.monotonic()
+        events = self.inotify.read() if self.inotify else 0
+        if events:
+            self.last_event = now
+            self.changed = self.changed or now
+        elif not self.inotify and now >= self.next_poll:
+            # The scan is the check.
+            self.changed = self.changed or now
+            self.last_event = 0.0
+
+        if self.changed is None or now - self.last_event < self.settle or \
+                self.scheduler.state.get('Slideshow.IsActive') or \
+                self.scheduler.state.get('Player.HasVideo'):
+            return bool(events)
+
+        self.rebuild()
+        return True
+
+    @staticmethod
+    def mtime():
+        try:
+            return os.stat(profile_path('bgm.m3u')).st_mtime_ns
+        except OSError:
+            return None
+
+    def idle(self):
+        """Whether kodi is idle now, not as of the tick the rebuild started in."""
+        self.scheduler.new_tick()
+        return not (self.scheduler.state.get('Slideshow.IsActive') or
+                    self.scheduler.state.get('Player.HasVideo'))
+
+    def rebuild(self):
+        """Rebuild ``bgm.m3u``, and watch the directories found."""
+        started = time.monotonic()
+        mtime = self.mtime()
+        deferred = []
+
+        def may_replace():
+            if self.idle():
+                return True
+            deferred.append(True)
+            return False
+
+        playlist = create_playlist(self.bgm_dir, durations=self.durations, keep_unchanged=True,
+                                   dedup=self.dedup, may_replace=may_replace)
+        if deferred:
+            # ``changed`` is kept, so it's rebuilt once kodi is idle.
+            log('bgm.m3u not replaced, as a slideshow or a video has started')
+            return
+        if playlist and self.mtime() != mtime:
+            self.rebuilt += 1
+            log('bgm.m3u rebuilt in %d ms, %d ms after the change' %
+                ((time.monotonic() - started) * 1000, (started - self.changed) * 1000),
+                xbmc.LOGINFO)
+        self.changed = None
+        self.next_poll = time.monotonic() + self.poll_interval
+        if self.inotify:
+            self.watch()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Watch directories for added, removed or renamed entries with Linux inotify.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi. inotify is called through ``ctypes``, as the standard
+library has no binding for it.
+
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[];}
+_event = struct.Struct('iIII')
+
+
+class Inotify():
+    """An inotify instance watching directories, read without blocking.
+
+    Only the changes to the entries of a directory are watched, i.e., what
+    changes the listing of :class:`scanner.ScanIndex`, not the writes to
+    files.
+
+    Raises:
+        OSError: if inotify is not available, e.g., not on Linux.
+
+    """
+
+    mask = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | \
+        IN_MOVE_SELF | IN_ONLYDIR
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            self.libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        except (OSError, AttributeError) as e:
+            raise OSError('inotify is not available: %s' % e)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1: %s' % os.strerror(ctypes.get_errno()))
+        #: dict: watch descriptor to the path(bytes) of the directory.
+        self.watches = {}
+
+    def watch(self, path):
+        """Watch the directory ``path``(bytes). Watching it again does nothing.
+
+        Raises:
+            OSError: e.g., ENOSPC once the user's limit of watches is reached.
+
+        """
+        wd = self.libc.inotify_add_watch(self.fd, path, self.mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        self.watches[wd] = path
+
+    def read(self):
+        """Read the events queued.
+
+        Returns:
+            int: number of events, -1 if the queue has overflowed, i.e.,
+            events were lost.
+
+        """
+        count = 0
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return count
+            i = 0
+            while i + _event.size <= len(data):
+                wd, mask, cookie, length = _event.unpack_from(data, i)
+                i += _event.size + length
+                if mask & IN_Q_OVERFLOW:
+                    count = -1
+                elif count >= 0:
+                    count += 1
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+            self.watches = {}
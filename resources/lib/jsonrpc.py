@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""A minimal client of kodi's JSON-RPC API over ``xbmc.executeJSONRPC``."""
+
+import json
+import xbmc
+from .profiler import profiler
+from .utils import log
+
+#: playlistid of the music playlist.
+PLAYLIST_MUSIC = 0
+#: playerid of the audio player.
+PLAYER_AUDIO = 0
+
+
+def call(method, params=None):
+    """Call a JSON-RPC method.
+
+    Args:
+        method (str): e.g., 'Player.Open'.
+        params (dict): parameters of the method.
+
+    Returns:
+        The result of the call, ``None`` if it failed.
+
+    """
+    return batch([(method, params)])[0]
+
+
+def batch(calls):
+    """Call JSON-RPC methods in a single batch request.
+
+    Kodi runs the calls in order, so a call can rely on the effect of the
+    previous ones, e.g., 'Player.Open' after 'Playlist.Add'.
+
+    Args:
+        calls (list): (method, params) tuples. ``params`` may be ``None``.
+
+    Returns:
+        list: the result of each call in order, ``None`` for the failed ones.
+
+    """
+    if profiler.enabled:
+        for method, params in calls:
+            profiler.count('jsonrpc ' + method)
+    request = []
+    for i, (method, params) in enumerate(calls):
+        item = {'jsonrpc': '2.0', 'method': method, 'id': i}
+        if params is not None:
+            item['params'] = params
+        request.append(item)
+
+    results = [None] * len(calls)
+    try:
+        response = json.loads(xbmc.executeJSONRPC(json.dumps(request)))
+    except ValueError:
+        log('Invalid JSON-RPC response to %s' % [method for method, params in calls])
+        return results
+
+    # The error of the batch as a whole comes as a single object.
+    for item in response if isinstance(response, list) else [response]:
+        i = item.get('id')
+        if 'error' in item:
+            log('JSON-RPC %s failed: %s' % (calls[i][0] if isinstance(i, int) else 'batch',
+                                            item['error'].get('message')))
+        elif isinstance(i, int) and 0 <= i < len(calls):
+            results[i] = item.get('result')
+
+    return results
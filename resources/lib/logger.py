@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Level-gated, rate-limited logging with a ring buffer of recent messages.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi. :func:`utils.log` logs through the module level
+:data:`logger` of :mod:`utils`, which writes to ``xbmc.log``.
+
+"""
+
+import collections
+import os
+import sys
+import time
+
+#: Names of kodi's log levels, LOGDEBUG(0) to LOGFATAL(4).
+level_names = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'FATAL')
+
+
+class Logger():
+    """Write log messages if their level is enabled, at a limited rate.
+
+    A message can be given as a callable returning the string, e.g., a
+    lambda formatting infolabels. It's called only if the message is to be
+    written, so a disabled debug message costs neither the kodi calls nor the
+    formatting.
+
+    Messages from the same line of code are written at most :attr:`burst`
+    times every :attr:`period` seconds; the number of those dropped is
+    appended to the next one written.
+
+    The latest ``size`` messages are kept in a ring buffer, including the
+    debug messages given as strings while the debug log is off, and
+    :meth:`dump` writes them out, e.g., when an error is notified.
+
+    Args:
+        write (callable): ``write(message, level)``, e.g., ``xbmc.log``.
+        min_level (int or callable): the lowest level written, or a callable
+            returning it, which is called on the first message.
+        prefix (str): prefix of the messages written.
+        size (int): number of messages kept in the ring buffer.
+
+    """
+
+    #: Number of messages from a line of code written in a :attr:`period`.
+    burst = 10
+    #: Seconds of the window of the rate limit.
+    period = 60.0
+
+    def __init__(self, write, min_level=0, prefix='', size=200):
+        self.write = write
+        self.min_level = min_level
+        self.prefix = prefix
+        #: collections.deque: (time, level, message) of the latest messages.
+        self.ring = collections.deque(maxlen=size)
+        #: dict: (code, line) to [start of the window, count, dropped].
+        self.seen = {}
+        #: int: number of messages dropped by the rate limit.
+        self.dropped = 0
+
+    def enabled(self, level):
+        """Whether messages of ``level`` are written."""
+        if callable(self.min_level):
+            self.min_level = self.min_level()
+        return level >= self.min_level
+
+    def log(self, msg, level=0, depth=1):
+        """Log ``msg`` at ``level``.
+
+        Args:
+            msg (str or callable): the message, or a callable returning it.
+            level (int): the log level.
+            depth (int): how many frames up the line logging it is, for the
+                rate limit.
+
+        Returns:
+            bool: True if the message has been written, False otherwise.
+
+        """
+        enabled = self.enabled(level)
+        if callable(msg) and not enabled:
+            return False
+
+        frame = sys._getframe(depth)
+        key = (frame.f_code, frame.f_lineno)
+        now = time.monotonic()
+        state = self.seen.get(key)
+        if state is None or now - state[0] >= self.period:
+            state = self.seen[key] = [now, 0, state[2] if state else 0]
+        if state[1] >= self.burst:
+            state[2] += 1
+            self.dropped += 1
+            return False
+        state[1] += 1
+
+        if callable(msg):
+            msg = msg()
+        if state[2]:
+            msg += ' (%d similar messages dropped)' % state[2]
+            state[2] = 0
+        self.ring.append((time.time(), level, msg))
+        if enabled:
+            self.write(self.prefix + msg, level)
+
+        return enabled
+
+    def dump(self, path):
+        """Write the messages in the ring buffer to ``path`` atomically.
+
+        Returns:
+            bool: True if succeeds, False otherwise.
+
+        """
+        lines = []
+        for t, level, msg in list(self.ring):
+            lines.append('%s.%03d %-7s %s' % (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t)),
+                                               t % 1 * 1000, level_names[min(level, 4)], msg))
+        tmp_file = path + '.tmp'
+        try:
+            with open(tmp_file, mode='w', encoding='utf-8', errors='surrogateescape') as f:
+                f.write('\n'.join(lines) + '\n')
+            os.replace(tmp_file, path)
+        except (IOError, OSError):
+            return False
+
+        return True
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""Duration and bitrate of music files, read from their headers only.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi.
+
+"""
+
+import json
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# kbps by [MPEG-1 or not][layer - 1][bitrate index]
+_mpeg_bitrates = (
+    ((0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+     (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+     (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)),
+    ((0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+     (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+     (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)),
+)
+# Hz by version bits(0: MPEG-2.5, 2: MPEG-2, 3: MPEG-1)
+_mpeg_samplerates = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+
+_asf_header = bytes.fromhex('3026b2758e66cf11a6d900aa0062ce6c')
+_asf_file_properties = bytes.fromhex('a1dcab8c47a9cf118ee400c00c205365')
+
+
+def _mpeg_frame(data, i):
+    """Parse the MPEG audio frame header at ``data[i:]``.
+
+    Returns:
+        tuple: (frame length, samples per frame, sample rate, kbps, side info
+        length) or ``None`` if it is not a valid header.
+
+    """
+    if i + 4 > len(data) or data[i] != 0xff or data[i + 1] & 0xe0 != 0xe0:
+        return None
+    version = (data[i + 1] >> 3) & 3
+    layer = 4 - ((data[i + 1] >> 1) & 3)
+    bitrate_index = data[i + 2] >> 4
+    samplerate_index = (data[i + 2] >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or samplerate_index == 3:
+        return None
+    mpeg1 = version == 3
+    kbps = _mpeg_bitrates[0 if mpeg1 else 1][layer - 1][bitrate_index]
+    rate = _mpeg_samplerates[version][samplerate_index]
+    padding = (data[i + 2] >> 1) & 1
+    mono = data[i + 3] >> 6 == 3
+    if layer == 1:
+        samples = 384
+        length = (12000 * kbps // rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        length = samples // 8 * 1000 * kbps // rate + padding
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+
+    return length, samples, rate, kbps, side_info
+
+
+def read_mpeg(f, size):
+    """Read the duration of an mp3/mp2 file from its first frame.
+
+    The frame count of a Xing/Info or VBRI header gives the duration of a VBR
+    file; otherwise the file is taken as CBR.
+
+    """
+    head = f.read(10)
+    start = 0
+    if head[:3] == b'ID3':
+        # The size of the ID3v2 tag is a 28-bit syncsafe integer.
+        start = 10 + (head[6] << 21 | head[7] << 14 | head[8] << 7 | head[9])
+        if head[5] & 0x10:  # footer
+            start += 10
+    f.seek(start)
+    data = f.read(16384)
+    i = data.find(b'\xff')
+    while i >= 0:
+        frame = _mpeg_frame(data, i)
+        # A frame must be followed by another one, unless it's cut.
+        if frame and (i + frame[0] + 4 > len(data) or _mpeg_frame(data, i + frame[0])):
+            break
+        i = data.find(b'\xff', i + 1)
+    else:
+        return None
+
+    length, samples, rate, kbps, side_info = frame
+    xing = i + 4 + side_info
+    if data[xing:xing + 4] in (b'Xing', b'Info') and data[xing + 7] & 1:
+        frames = struct.unpack('>I', data[xing + 8:xing + 12])[0]
+    elif data[i + 36:i + 40] == b'VBRI':
+        frames = struct.unpack('>I', data[i + 50:i + 54])[0]
+    else:
+        f.seek(-128, os.SEEK_END)
+        tag = 128 if f.read(3) == b'TAG' else 0
+        audio = size - start - i - tag
+        return audio * 8 / (kbps * 1000), kbps
+
+    duration = frames * samples / rate
+    return duration, int((size - start - i) * 8 / duration / 1000) if duration else kbps
+
+
+def read_ogg(f, size):
+    """Read the duration of an Ogg Vorbis/Opus file from its first and last pages."""
+    data = f.read(4096)
+    if data[:4] != b'OggS':
+        return None
+    packet = 27 + data[26]  # after the segment table
+    if data[packet:packet + 7] == b'\x01vorbis':
+        rate, nominal = struct.unpack('<I4xi', data[packet + 12:packet + 24])
+        kbps = nominal // 1000 if nominal > 0 else None
+    elif data[packet:packet + 8] == b'OpusHead':
+        rate, kbps = 48000, None  # granule positions are at 48kHz
+    else:
+        return None
+
+    f.seek(max(size - 65536, 0))
+    tail = f.read()
+    page = tail.rfind(b'OggS')
+    if page < 0 or page + 14 > len(tail) or not rate:
+        return None
+    granule = struct.unpack('<q', tail[page + 6:page + 14])[0]
+    if data[packet:packet + 8] == b'OpusHead':
+        granule -= struct.unpack('<H', data[packet + 10:packet + 12])[0]  # pre-skip
+    duration = max(granule, 0) / rate
+    if kbps is None and duration:
+        kbps = int(size * 8 / duration / 1000)
+
+    return duration, kbps
+
+
+def read_wav(f, size):
+    """Read the duration of a RIFF WAVE file from its 'fmt ' and 'data' chunks."""
+    if f.read(12)[8:] != b'WAVE':
+        return None
+    byte_rate = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        name, length = struct.unpack('<4sI', chunk)
+        if name == b'fmt ':
+            byte_rate = struct.unpack('<8xI', f.read(12))[0]
+            length -= 12
+        elif name == b'data':
+            if not byte_rate:
+                return None
+            if length in (0, 0xffffffff):
+                # The size of a stream being written may be left unset.
+                length = size - f.tell()
+            return length / byte_rate, byte_rate * 8 // 1000
+        f.seek(length + (length & 1), os.SEEK_CUR)  # chunks are word aligned
+
+
+def read_asf(f, size):
+    """Read the duration of a wma(ASF) file from its File Properties Object."""
+    data = f.read(30)
+    if data[:16] != _asf_header:
+        return None
+    header_size = struct.unpack('<Q', data[16:24])[0]
+    data += f.read(min(header_size, 1 << 20) - 30)
+    i = 30
+    while i + 24 <= len(data):
+        guid, length = data[i:i + 16], struct.unpack('<Q', data[i + 16:i + 24])[0]
+        if guid == _asf_file_properties:
+            duration, preroll = struct.unpack('<Q8xQ', data[i + 64:i + 88])
+            max_bitrate = struct.unpack('<I', data[i + 100:i + 104])[0]
+            return max(duration / 10 ** 7 - preroll / 1000, 0), max_bitrate // 1000
+        if length < 24:
+            return None
+        i += length
+
+    return None
+
+
+_readers = {'.mp3': read_mpeg, '.mp2': read_mpeg, '.ogg': read_ogg,
+            '.wav': read_wav, '.wma': read_asf}
+
+
+def read_header(path, size=None):
+    """Read the duration and the bitrate of a music file.
+
+    Only the headers are read, and the last 64KB for Ogg files.
+
+    Args:
+        path (str): path of the file.
+        size (int): size of the file, if already known.
+
+    Returns:
+        tuple: (duration in seconds(float), bitrate in kbps(int or None)) or
+        ``None`` if the file can't be read or parsed.
+
+    """
+    reader = _readers.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        return None
+    try:
+        # By the bytes path, as kodi's filesystem encoding may be ASCII.
+        with open(path.encode('utf-8', 'surrogateescape'), 'rb') as f:
+            if size is None:
+                size = os.fstat(f.fileno()).st_size
+            return reader(f, size)
+    except (IOError, OSError, IndexError, ValueError, struct.error):
+        return None
+
+
+class MetadataCache():
+    """Durations and bitrates of music files, cached by path, size and mtime.
+
+    Files are stat'ed and their headers read on a bounded thread pool; it's
+    I/O that costs, especially on network mounts, and the GIL is released
+    while waiting for it.
+
+    Args:
+        cache_file (str): path of the cache file.
+        workers (int): maximum number of files read concurrently.
+
+    """
+
+    version = 1
+    #: Number of files looked up by a task of the thread pool.
+    chunk_size = 32
+
+    def __init__(self, cache_file, workers=8):
+        self.cache_file = cache_file
+        self.workers = workers
+        self.old_files = self.load()
+        self.files = {}
+        #: int: number of files whose headers were read, not found in the cache.
+        self.read = 0
+
+    def load(self):
+        """Load the cache file.
+
+        Returns:
+            dict: path to [size, mtime_ns, duration, kbps], empty if there's no
+            valid cache file.
+
+        """
+        try:
+            with open(self.cache_file, encoding='utf-8', errors='surrogateescape') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            return {}
+
+        return data.get('files', {})
+
+    def save(self):
+        """Write the cache file atomically, with the files looked up since it was loaded.
+
+        Returns:
+            bool: True if succeeds, False otherwise.
+
+        """
+        # Unique to the thread, as both scripts run in kodi's process.
+        tmp_file = '%s.%d.tmp' % (self.cache_file, threading.get_ident())
+        try:
+            with open(tmp_file, mode='w', encoding='utf-8', errors='surrogateescape') as f:
+                json.dump({'version': self.version, 'files': self.files}, f,
+                          separators=(',', ':'), ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except (IOError, OSError):
+            return False
+
+        return True
+
+    def _lookup(self, path):
+        """Stat ``path`` and read its header unless cached. Run on the thread pool."""
+        try:
+            st = os.stat(path.encode('utf-8', 'surrogateescape'))
+        except OSError:
+            return None, False
+        entry = self.old_files.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry, False
+
+        metadata = read_header(path, st.st_size) or (None, None)
+        return [st.st_size, st.st_mtime_ns, metadata[0], metadata[1]], True
+
+    def _lookup_all(self, paths):
+        return [self._lookup(path) for path in paths]
+
+    def lookup(self, paths):
+        """Get the metadata of ``paths``.
+
+        Args:
+            paths (list): paths(str) of music files.
+
+        Returns:
+            list: (duration, kbps) of each path in order, (None, None) if unknown.
+
+        """
+        if self.workers > 1 and len(paths) > self.chunk_size:
+            # Files are handed to the pool in chunks to keep its overhead low.
+            chunks = [paths[i:i + self.chunk_size] for i in range(0, len(paths), self.chunk_size)]
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = [result for chunk in pool.map(self._lookup_all, chunks)
+                           for result in chunk]
+        else:
+            results = self._lookup_all(paths)
+
+        metadata = []
+        for path, (entry, read) in zip(paths, results):
+            self.read += read
+            if entry is None:
+                metadata.append((None, None))
+            else:
+                self.files[path] = entry
+                metadata.append((entry[2], entry[3]))
+
+        return metadata
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 """A subclass of :class:`xmbc.Player`"""
 
-import _thread as thread
 import os
+import time
 import xbmc, xbmcvfs
-from . import addon
-from .utils import create_playlist, log
+from . import addon, jsonrpc
+from .profiler import profiled
+from .scheduler import Scheduler
+from .session import Session
+from .utils import create_playlist, indexer_running, log, playlist_source, profile_path
 
 
 class Player(xbmc.Player):
@@ -14,66 +17,235 @@ class Player(xbmc.Player):
     The main features of this class are:
         - To override callback functions like :meth:`onPlayBackStopped` and 
         :meth:`onPlayBackEnded`.
-        - To start a thread which keeps track of the position of currently 
-          playing background music.
+        - To keep track of the position of currently playing background music,
+          on :meth:`onAVStarted` and by a fallback task of the scheduler.
+        - To read ahead of the next track by a :class:`prefetch.Prefetcher`,
+          if the ``prefetch_mb`` setting is on.
+        - To switch the bgm as the slideshow moves between picture folders
+          mapped to other music by the ``folder_map`` setting.
+        - To play m3u/pls playlists without their dead entries, if the
+          ``prune_playlist`` setting is on.
     
     .. Note::
 
         :class:`Player` seems to be a Singleton.
 
+    Args:
+        scheduler (:class:`Scheduler`): the scheduler owned by the addon.
+            A new one is created if omitted.
+
     """
-    def __init__(self):
+    def __init__(self, scheduler=None):
         super().__init__()
+        self.scheduler = scheduler if scheduler else Scheduler()
+        self.tracker = None
+        self.folder_task = None
+        #: bool: whether ``bgm.m3u`` is out of date, to be created again on :meth:`stop`.
+        self.stale = False
+        #: list: playlists whose dead entries are to be checked again on :meth:`stop`.
+        self.expired = []
 
         # Check if the playlist is vaild.
-        self.playlist = self.get_playlist_file()
-        if not self.playlist:
+        #: str: the configured playlist, played for the pictures not in the folder map.
+        self.default_playlist = self.get_playlist_file()
+        if not self.default_playlist:
             raise ValueError('Invalid Playlist.')
+        #: :class:`foldermap.PrefixTrie`: picture folder to bgm, ``None`` if not set.
+        self.folder_map = self.get_folder_map()
+        #: dict: picture folder to its playlist.
+        self.folders = {}
+        #: dict: bgm in the folder map to its playlist, ``None`` if invalid.
+        self.resolved = {}
+        #: dict: music directory in the folder map to the thread making its playlist.
+        self.building = {}
+        #: str: playlist of another folder seen once, to switch to if seen again.
+        self.pending = None
+        self.bgm_position = -1
+        #: int: counts the transitions of the player state seen by callbacks.
+        self.transitions = 0
+        self.options_set = False
+        #: :class:`prefetch.Prefetcher`: ``None`` if prefetching is off.
+        self.prefetcher = None
+        if addon.getSettingInt('prefetch_mb') > 0:
+            # Imported here, as prefetching is off by default.
+            from .prefetch import Prefetcher
+            self.prefetcher = Prefetcher(budget=addon.getSettingInt('prefetch_mb') << 20)
+
+        # Skip loading the playlist if kodi still holds it from the last session.
+        started = time.monotonic()
+        self.session = Session(profile_path('session.json'))
+        playlist = self.default_playlist
+        if self.folder_map:
+            playlist = self.folder_playlist(self.scheduler.state.get('Slideshow.Path')) or playlist
+        self.use_playlist(playlist)
+        size = self.scheduler.api(xbmc.PlayList(xbmc.PLAYLIST_MUSIC).size)
+        if self.session.matches(self.playlist, self.random, size, self.window is not None) and \
+                (not self.window or self.window.size == size):
+            if self.window:
+                self.window.entries.extend(self.session.window)
+            self.restore_player()
+            start = 'warm'
+        else:
+            self.set_player()
+            start = 'cold'
+        log('Player set up, %s start: %d ms' % (start, (time.monotonic() - started) * 1000))
+
+        # Track changes are caught by onAVStarted. Polling is only a fallback.
+        self.tracker = self.scheduler.every(5, self.track_bgm, max_interval=30)
+        self.folder_task = self.scheduler.every(1, self.check_folder, max_interval=2) \
+            if self.folder_map else None
+
+    def use_playlist(self, playlist):
+        """Make ``playlist`` the bgm, without loading it into kodi.
+
+        Args:
+            playlist (str): path of the playlist.
+
+        """
+        self.playlist = playlist
         self.playlist_type = os.path.splitext(self.playlist)[1:][0][1:]
         # For playlist of which length is 0 like .xsp or pls with audio stream,
         # playoffset is pointless and ignored(no error).
         self.random = addon.getSettingBool('random') if self.playlist_type == 'm3u' else True
-        # After Mute() is called, The value of ``Player.Muted`` does not change
-        # immediatly. So we manage the mute state ourselves via ``is_muted``.
-        self.is_muted = xbmc.getCondVisibility('Player.Muted')
-        self.bgm_position = -1
-        self.set_player()
+        #: :class:`Window`: the window fed to kodi in windowed mode, ``None`` otherwise.
+        self.window = self.get_window()
+        if self.window:
+            self.random = self.window.random
 
-    def set_player(self):
-        """Set the properties of randomness and repeat.
+    @profiled()
+    def set_player(self, replace=False):
+        """Load the playlist into kodi's music playlist and start playing it.
+
+        Clearing and filling the music playlist and opening it with the
+        randomness and repeat options go in a single JSON-RPC batch request,
+        so kodi does not have to start and stop the player just to set them.
+        If the slideshow is on a video clip, the playlist is only loaded and
+        :meth:`play_bgm` starts it when the clip ends.
+
+        In windowed mode, only the first tracks of the window are loaded.
+
+        Args:
+            replace (bool): whether to replace the bgm playing, if any.
 
-        A monkey patch for PlayerControl() that works only after the Player starts.
-        
         """
-        self.mute(True)
-        xbmc.executebuiltin('PlayMedia(%s)' % self.playlist)
-        xbmc.executebuiltin('PlayerControl(Play)')  # Actually, Pause.
-        if self.random:
-            xbmc.executebuiltin('PlayerControl(RandomOn)')
+        api = self.scheduler.api
+        state = self.scheduler.state
+        if self.window:
+            calls = self.window.load_calls()
         else:
-            xbmc.executebuiltin('PlayerControl(RandomOff)')
-        # Set repeat. by default, RepeatAll
-        xbmc.executebuiltin('PlayerControl(RepeatAll)')
-        xbmc.executebuiltin('PlayerControl(Stop)')
-        self.mute(False)
+            calls = [('Playlist.Clear', {'playlistid': jsonrpc.PLAYLIST_MUSIC}),
+                     ('Playlist.Add', {'playlistid': jsonrpc.PLAYLIST_MUSIC,
+                                       'item': {'file': self.playlist}})]
+        busy = (not replace and state.get('Player.HasMedia')) or state.get('Slideshow.IsVideo')
+        if not busy:
+            calls.append(self.open_call(0))
+        results = api(jsonrpc.batch, calls)
+        self.scheduler.new_tick()
+        if not busy:
+            if results[-1] == 'OK':
+                self.options_set = True
+                log(lambda: 'play started. title: %s slide: %s' % \
+                    (xbmc.getInfoLabel('Player.Title'), xbmc.getInfoLabel('Slideshow.Filename')))
+            else:
+                self.resume()
 
-        # Thread will automatically end when main thread does.
-        thread.start_new_thread(self.track_bgm, ())
+    @profiled()
+    def restore_player(self):
+        """Play the music playlist kodi still holds from the last session.
 
-    def mute(self, switch=None):
-        """Toggle or set the mute state of the Player
-        
-        Args:
-            switch (None or bool): 
-                If ``switch`` is None, toggle the mute state.
-                elif ``switch`` is True, mute on.
-                else ``switch`` is False, mute off.
+        The randomness and repeat options are already applied, so the bgm
+        picks up where the last slideshow left it.
+
+        """
+        self.options_set = True
+        # ``bgm_position`` is 1-based, as ``Playlist.Position(music)``.
+        self.bgm_position = self.session.position + 1
+        api = self.scheduler.api
+        state = self.scheduler.state
+        if state.get('Player.HasMedia') or state.get('Slideshow.IsVideo'):
+            return
+
+        offset = self.session.offset
+        params = {'item': {'playlistid': jsonrpc.PLAYLIST_MUSIC, 'position': self.session.position},
+                  'options': {'resume': {'hours': int(offset // 3600),
+                                         'minutes': int(offset % 3600 // 60),
+                                         'seconds': int(offset % 60),
+                                         'milliseconds': int(offset % 1 * 1000)}}}
+        result = api(jsonrpc.call, 'Player.Open', params)
+        self.scheduler.new_tick()
+        if result != 'OK':
+            self.resume()
+
+    def open_call(self, position):
+        """Make the JSON-RPC call to play the music playlist from ``position``.
+
+        The randomness and repeat options are set on the first call only;
+        kodi keeps them for the playlist afterwards. In windowed mode, the
+        window is shuffled already, so kodi must not shuffle it.
+
+        Returns:
+            tuple: (method, params) for :func:`jsonrpc.batch`.
+
+        """
+        params = {'item': {'playlistid': jsonrpc.PLAYLIST_MUSIC, 'position': position}}
+        if not self.options_set:
+            params['options'] = {'shuffled': self.random and not self.window, 'repeat': 'all'}
+
+        return 'Player.Open', params
+
+    @profiled()
+    def get_window(self):
+        """Set up windowed mode if it is enabled and the playlist is long enough.
+
+        Only m3u and pls playlists in the local filesystem can be indexed.
+        The tracks are shuffled by the addon, continuing the shuffle of the
+        last session if the playlist is the same.
+
+        Returns:
+            :class:`Window`: the window, ``None`` to load the whole playlist.
 
         """
-        if switch is None or (switch ^ self.is_muted):  # XOR
-            xbmc.executebuiltin('Mute')  # 'Mute()' also works
-            self.is_muted = not self.is_muted
+        size = addon.getSettingInt('window_size')
+        if size <= 0 or self.playlist_type not in ('m3u', 'pls'):
+            return None
+
+        # Imported here, as windowed mode is off by default.
+        from .shuffle import Shuffle
+        from .trackindex import TrackIndex
+        from .window import Window
+
+        try:
+            index = TrackIndex(xbmcvfs.translatePath(self.playlist))
+        except (IOError, OSError):
+            log('Failed to index the playlist, %s. Windowed mode is off.' % self.playlist)
+            return None
+
+        if len(index) <= size:
+            return None
+
+        random = addon.getSettingBool('random')
+        order = Shuffle.load(self.shuffle_file(), len(index), self.shuffle_key(), random)
+        if not order:
+            order = Shuffle(len(index), random=random)
+        return Window(index, size, order, self.scheduler.api)
+
+    def shuffle_file(self):
+        """Path of the file the shuffle of the playlist is saved in."""
+        if self.playlist == self.default_playlist:
+            return profile_path('shuffle.bin')
+        return profile_path('shuffle-%s.bin' % self.digest(self.playlist))
+
+    @staticmethod
+    def digest(path):
+        # Imported here, as it's needed only for the playlists other than bgm.m3u.
+        import hashlib
+        return hashlib.sha1(path.encode('utf-8', 'surrogateescape')).hexdigest()[:12]
 
+    def shuffle_key(self):
+        """Identify the playlist the saved shuffle is for."""
+        return [self.playlist, Session.fingerprint(self.playlist)]
+
+    @profiled()
     def get_playlist_file(self):
         """Get the filepath of the background music playlist.
 
@@ -89,13 +261,17 @@ class Player(xbmc.Player):
         ``settings.xml``'s in the same directory, return the path of ``bgm.m3u``; 
         otherwise, it creates ``bgm.m3u`` in the ``addon profile directory`` 
         and returns the path of it.
+        In fast start mode, an out of date ``bgm.m3u`` of the same directory
+        is played as it is, and created again on :meth:`stop` for the next
+        slideshow. While the indexer of ``service.py`` runs, ``bgm.m3u`` of
+        the same directory is up to date whatever its mtime.
 
         Returns:
             str: the path of the playlist if successful, ``None``  otherwise.
 
         """
         if addon.getSetting('type') == 'Playlist':
-            playlist_file = addon.getSetting('playlist')
+            playlist_file = self.valid_playlist(addon.getSetting('playlist'))
         else:  # 'Directory'
             profile_dir = xbmcvfs.translatePath(addon.getAddonInfo('profile'))
             playlist_file = os.path.join(profile_dir, 'bgm.m3u')
@@ -103,15 +279,238 @@ class Player(xbmc.Player):
             playlist_st = xbmcvfs.Stat(playlist_file)
             settings_st = xbmcvfs.Stat(settings_file)
             # We don't use os.path.exists() here due to 'filesystemencoding'
+            bgm_dir = addon.getSetting('directory').encode('utf-8')
             if xbmcvfs.exists(playlist_file) and \
                     playlist_st.st_mtime() > settings_st.st_mtime():
                 pass
+            elif (indexer_running() or addon.getSettingBool('fast_start')) and \
+                    xbmcvfs.exists(playlist_file) and playlist_source(playlist_file) == bgm_dir:
+                if indexer_running():
+                    log('Playing the playlist kept by the indexer, %s' % playlist_file)
+                else:
+                    log('Playing the last playlist of %s, to be created again' % bgm_dir)
+                    self.stale = True
             else:
-                bgm_dir = addon.getSetting('directory').encode('utf-8')
-                playlist_file = create_playlist(bgm_dir)
+                playlist_file = create_playlist(bgm_dir,
+                                                durations=addon.getSettingBool('read_metadata'),
+                                                dedup=addon.getSettingBool('dedup'))
 
         return playlist_file
 
+    @profiled()
+    def valid_playlist(self, playlist):
+        """Get ``playlist`` without its dead entries, if the ``prune_playlist`` setting is on.
+
+        The live entries of an m3u or pls playlist in the local filesystem
+        are written to ``valid-<hash>.m3u`` in the addon profile directory,
+        which is reused while the playlist is unchanged. One checked a while
+        ago is played as it is and checked again on :meth:`stop`.
+
+        Args:
+            playlist (str): path of the playlist.
+
+        Returns:
+            str: path of the playlist to play, ``None`` if all the entries are dead.
+
+        """
+        path = xbmcvfs.translatePath(playlist)
+        if not addon.getSettingBool('prune_playlist') or '://' in path or \
+                os.path.splitext(path)[1].lower() not in ('.m3u', '.m3u8', '.pls'):
+            return playlist
+
+        # Imported here, as pruning is off by default.
+        from .validator import PlaylistValidator
+        validator = PlaylistValidator(profile_path('validated.json'), xbmcvfs.exists)
+        pruned = profile_path('valid-%s.m3u' % self.digest(path))
+        state = validator.state(path)
+        if state and xbmcvfs.exists(pruned):
+            if state == 'expired':
+                self.expired.append(path)
+            total, dead = validator.playlists[path][3:5]
+            return pruned if dead < total else None
+
+        started = time.monotonic()
+        result = validator.validate(path, pruned)
+        if result is None:
+            log('Failed to check the entries of the playlist, %s' % playlist, xbmc.LOGWARNING)
+            return playlist
+        if not validator.save():
+            log('Failed to save the checked playlists, %s' % validator.cache_file)
+        total, dead = result
+        log('%d of %d entries are dead in %s, checked in %d ms' %
+            (dead, total, playlist, (time.monotonic() - started) * 1000))
+
+        return pruned if dead < total else None
+
+    def check_expired(self):
+        """Check the dead entries of the playlists checked a while ago, again."""
+        # Imported here, as pruning is off by default.
+        from .validator import PlaylistValidator
+        validator = PlaylistValidator(profile_path('validated.json'), xbmcvfs.exists)
+        for path in self.expired:
+            if not validator.validate(path, profile_path('valid-%s.m3u' % self.digest(path))):
+                log('Failed to check the entries of the playlist, %s' % path)
+        self.expired = []
+        if not validator.save():
+            log('Failed to save the checked playlists, %s' % validator.cache_file)
+
+    @profiled()
+    def get_folder_map(self):
+        """Load the folder map of the ``folder_map`` setting.
+
+        Returns:
+            :class:`foldermap.PrefixTrie`: picture folder to a playlist or a
+            directory, ``None`` if not set or invalid.
+
+        """
+        path = addon.getSetting('folder_map')
+        if not path:
+            return None
+
+        # Imported here, as the folder map is off by default.
+        from .foldermap import PrefixTrie, load_rules
+        try:
+            folder_map = PrefixTrie(load_rules(xbmcvfs.translatePath(path)))
+        except (IOError, OSError, UnicodeError):
+            log('Failed to read the folder map, %s' % path, xbmc.LOGWARNING)
+            return None
+
+        log('%d picture folders mapped by %s' % (len(folder_map), path))
+        return folder_map if len(folder_map) else None
+
+    def folder_playlist(self, path):
+        """Get the playlist for the picture ``path``.
+
+        Lookups are cached by picture folder, as slides of a folder come in a row.
+
+        Args:
+            path (str): path of a picture, i.e., ``Slideshow.Path``.
+
+        Returns:
+            str: the playlist of the longest folder mapped, the default one if
+            none. ``None`` while the playlist of the folder is being made.
+
+        """
+        if not path:
+            return self.default_playlist
+        folder = path[:max(path.rfind('/'), path.rfind('\\')) + 1]
+        playlist = self.folders.get(folder)
+        if playlist is None:
+            target = self.folder_map.lookup(folder)
+            playlist = self.resolve(target) if target else None
+            if target and target not in self.resolved:
+                return None
+            playlist = playlist or self.default_playlist
+            self.folders[folder] = playlist
+
+        return playlist
+
+    def resolve(self, target):
+        """Get the playlist of a bgm in the folder map, once.
+
+        A directory gets its own playlist in the addon profile directory,
+        which is made again only if the folder map or the settings are newer.
+        It's made by :meth:`build` in the background.
+
+        Args:
+            target (str): a playlist or a music directory.
+
+        Returns:
+            str: path of the playlist, ``None`` if invalid or being made.
+
+        """
+        if target in self.resolved:
+            return self.resolved[target]
+        if target in self.building:
+            return None
+
+        if os.path.splitext(target)[1].lower() in ('.m3u', '.m3u8', '.pls', '.xsp'):
+            playlist = self.valid_playlist(target) if xbmcvfs.exists(target) else None
+        else:
+            name = 'bgm-%s.m3u' % self.digest(target)
+            playlist = profile_path(name)
+            try:
+                fresh = os.stat(playlist).st_mtime > max(
+                    os.stat(xbmcvfs.translatePath(addon.getSetting('folder_map'))).st_mtime,
+                    os.stat(profile_path('settings.xml')).st_mtime)
+            except OSError:
+                fresh = False
+            if not fresh:
+                self.build(target, name)
+                return None
+        if not playlist:
+            log('Invalid bgm in the folder map, %s' % target, xbmc.LOGWARNING)
+        self.resolved[target] = playlist
+        return playlist
+
+    def build(self, target, name):
+        """Make the playlist of the music directory ``target`` on a background thread.
+
+        A full scan of the directory may take long, so the scheduler goes on
+        and the current bgm plays on meanwhile. :meth:`resolve` gets the
+        playlist once it's made. The thread must not be joined in kodi; see
+        :class:`scheduler.Scheduler`.
+
+        """
+        # Imported here, as the folder map is off by default.
+        import threading
+        durations = addon.getSettingBool('read_metadata')
+        dedup = addon.getSettingBool('dedup')
+
+        def run():
+            playlist = None
+            try:
+                playlist = create_playlist(target.encode('utf-8'), file_name=name,
+                                           durations=durations, dedup=dedup)
+            finally:
+                if not playlist:
+                    log('Invalid bgm in the folder map, %s' % target, xbmc.LOGWARNING)
+                # Resolved before it's no longer being built.
+                self.resolved[target] = playlist
+                del self.building[target]
+
+        thread = threading.Thread(target=run, name='slideshow-bgm folder', daemon=True)
+        self.building[target] = thread
+        thread.start()
+
+    def check_folder(self):
+        """Switch the bgm if the slideshow has moved to a folder mapped to another one.
+
+        The new folder must be seen on two checks in a row, and the switch
+        waits for a video clip to end.
+
+        Returns:
+            bool: True if the bgm has been switched, False otherwise.
+
+        """
+        state = self.scheduler.state
+        if state.get('Slideshow.IsVideo') or state.get('Player.HasVideo'):
+            return False
+        playlist = self.folder_playlist(state.get('Slideshow.Path'))
+        if playlist is None:
+            # Checked again once it's made.
+            self.pending = None
+            return False
+        if playlist == self.playlist or playlist != self.pending:
+            self.pending = None if playlist == self.playlist else playlist
+            return False
+
+        self.pending = None
+        self.switch_playlist(playlist)
+        return True
+
+    @profiled()
+    def switch_playlist(self, playlist):
+        """Play ``playlist`` instead of the current bgm."""
+        log('Switching the bgm to %s' % playlist)
+        if self.window and not self.window.order.save(self.shuffle_file(), self.shuffle_key()):
+            log('Failed to save the shuffle of the playlist')
+        self.use_playlist(playlist)
+        self.bgm_position = -1
+        self.options_set = False
+        self.set_player(replace=True)
+
+    @profiled()
     def play_bgm(self):
         """Play background music if currently not playing video/audio.
 
@@ -125,44 +524,177 @@ class Player(xbmc.Player):
             to play something before this function actually starts to play BGM.
 
         """
-        # ``xbmc.getCondVisibility('Slideshow.IsVideo')`` is necessary because
+        state = self.scheduler.state
+        self.scheduler.new_tick()
+        stopped_at = time.monotonic()
+        self.transitions += 1
+        transition = self.transitions
+
+        # ``Slideshow.IsVideo`` is necessary because
         # when the next slideshow item is a video clip and it is on the process
         # of loading--i.e., it's not playing yet--we don't need to play bgm.
-        if self.isPlaying() or xbmc.getCondVisibility('Slideshow.IsVideo'):
-            # Wait for upto 500ms considering the asynchronousness of infolabels.
-            for i in range(5):
-                xbmc.sleep(100)
-                if not (self.isPlaying() or xbmc.getCondVisibility('Slideshow.IsVideo')):
-                    break
-                elif i == 4:
-                    log('play rejected. title: %s slide: %s' % \
-                        (xbmc.getInfoLabel('Player.Title'), xbmc.getInfoLabel('Slideshow.Filename')))
-                    return
-
-        log('play started. title: %s slide: %s' % \
+        def settled():
+            return self.transitions != transition or \
+                not (state.get('Player.HasMedia') or state.get('Slideshow.IsVideo'))
+
+        # Wait for upto 500ms considering the asynchronousness of infolabels,
+        # but only until the state settles or the player moves on.
+        if not self.scheduler.wait_until(settled, 0.5):
+            log(lambda: 'play rejected. title: %s slide: %s' % \
+                (xbmc.getInfoLabel('Player.Title'), xbmc.getInfoLabel('Slideshow.Filename')))
+            return
+        if self.transitions != transition:
+            # Something else, e.g., the next video clip, has started meanwhile.
+            return
+
+        log(lambda: 'play started. title: %s slide: %s' % \
             (xbmc.getInfoLabel('Player.Title'), xbmc.getInfoLabel('Slideshow.Filename')))
-        
+        self.resume()
+        log('bgm resumed after %d ms of silence.' % ((time.monotonic() - stopped_at) * 1000))
+
+    @profiled()
+    def resume(self):
+        """Play the bgm from the track after ``bgm_position``.
+
+        If the music playlist is still loaded, i.e., :meth:`set_player` has
+        loaded it and nothing has replaced it, we open it at the position
+        rather than having kodi load the whole playlist again. In windowed
+        mode, the window is loaded again if it is gone.
+
+        """
+        api = self.scheduler.api
+        # ``bgm_position`` is 1-based, i.e., the 0-based position of the next
+        # track, and -1 if nothing has played yet.
+        position = max(self.bgm_position, 0)
+        size = api(xbmc.PlayList(xbmc.PLAYLIST_MUSIC).size)
+        if size:
+            if api(jsonrpc.call, *self.open_call(position % size)) == 'OK':
+                self.options_set = True
+                return
+        elif self.window:
+            # The window is loaded as it was, so the position holds.
+            calls = self.window.load_calls()
+            calls.append(self.open_call(position % len(self.window.entries)))
+            if api(jsonrpc.batch, calls)[-1] == 'OK':
+                self.options_set = True
+                return
+
         # We use executebuiltin() because xbmc.Player.play() does not play
-        # the smart playlist(.xsp).
+        # the smart playlist(.xsp). ``playoffset`` is 1-based.
         if self.random:
-            #self.play(item=self.playlist, startpos=self.bgm_position+1)
             xbmc.executebuiltin('PlayMedia(%s)' % self.playlist)
         else:
-            #self.play(item=self.playlist, startpos=self.bgm_position+1)
             xbmc.executebuiltin('PlayMedia(%s, playoffset=%d)' % \
                                 (self.playlist, self.bgm_position+1))
-            
+
     def track_bgm(self):
         """Keep track of bgm playing.
 
+        Returns:
+            bool: True if the position has changed, False otherwise.
+
         """
-        while xbmc.getCondVisibility('Slideshow.IsActive'):
-            if self.isPlayingAudio():
-                position = int(xbmc.getInfoLabel('Playlist.Position(music)'))
-                # Guard condition from kodi's thread intervention.
-                if position >= 0:
-                    self.bgm_position = position
-            xbmc.sleep(1000)
+        if self.scheduler.state.get('Player.HasAudio'):
+            return self.update_position()
+
+        return False
+
+    def update_position(self):
+        """Update ``bgm_position`` with the position in the music playlist.
+
+        In windowed mode, the window is moved on as the position advances.
+        Then, the next track is read ahead if prefetching is on.
+
+        Returns:
+            bool: True if the position has changed, False otherwise.
+
+        """
+        position = int(self.scheduler.state.get('Playlist.Position(music)') or -1)
+        # Guard condition from kodi's thread intervention.
+        if position >= 0 and position != self.bgm_position:
+            self.bgm_position = position
+            # ``position`` is 1-based. Once the window has moved, the playing
+            # track is the first entry of the music playlist.
+            if self.window and self.window.advance(position - 1):
+                self.bgm_position = 1
+            if self.prefetcher:
+                path = self.next_track()
+                if path:
+                    self.prefetcher.prefetch(path)
+            return True
+
+        return False
+
+    def next_track(self):
+        """Get the local path of the track after the playing one.
+
+        In windowed mode, it's known from the window. Otherwise, kodi is
+        asked for the next entry of its music playlist, which is in the
+        shuffled order if kodi shuffled it.
+
+        Returns:
+            str: the path, ``None`` if unknown or not in the local filesystem.
+
+        """
+        # ``bgm_position`` is 1-based, i.e., the 0-based position of the next track.
+        if self.window:
+            if self.bgm_position >= len(self.window.entries):
+                return None
+            path = self.window.index.paths([self.window.entries[self.bgm_position]])[0]
+        else:
+            result = self.scheduler.api(jsonrpc.call, 'Playlist.GetItems',
+                                        {'playlistid': jsonrpc.PLAYLIST_MUSIC,
+                                         'properties': ['file'],
+                                         'limits': {'start': self.bgm_position,
+                                                    'end': self.bgm_position + 1}})
+            items = result.get('items') if isinstance(result, dict) else None
+            if not items or 'file' not in items[0]:
+                return None
+            path = items[0]['file']
+
+        path = xbmcvfs.translatePath(path)
+        return None if '://' in path else path
+
+    def stop(self):
+        """Stop playing, save the session and cancel the tasks of this player."""
+        if self.tracker:
+            self.tracker.cancel()
+            self.tracker = None
+        if self.folder_task:
+            self.folder_task.cancel()
+            self.folder_task = None
+        if self.prefetcher:
+            self.prefetcher.stop()
+        self.save_session()
+        super().stop()
+        if self.stale:
+            self.stale = False
+            create_playlist(addon.getSetting('directory').encode('utf-8'),
+                            durations=addon.getSettingBool('read_metadata'),
+                            dedup=addon.getSettingBool('dedup'))
+        if self.expired:
+            self.check_expired()
+
+    @profiled()
+    def save_session(self):
+        """Save where the bgm is for the next :class:`Player`."""
+        if self.window and \
+                not self.window.order.save(self.shuffle_file(), self.shuffle_key()):
+            log('Failed to save the shuffle of the playlist')
+
+        api = self.scheduler.api
+        if not self.scheduler.state.get('Player.HasAudio'):
+            return
+
+        props = api(jsonrpc.call, 'Player.GetProperties',
+                    {'playerid': jsonrpc.PLAYER_AUDIO, 'properties': ['position', 'time']})
+        if not props:
+            return
+        t = props['time']
+        offset = t['hours'] * 3600 + t['minutes'] * 60 + t['seconds'] + t['milliseconds'] / 1000
+        size = api(xbmc.PlayList(xbmc.PLAYLIST_MUSIC).size)
+        window = self.window.entries.tolist() if self.window else None
+        self.session.save(self.playlist, self.random, size, props['position'], offset, window)
 
     def onPlayBackStopped(self):
         """Callback function called when audio/video play stops by user.
@@ -185,9 +717,17 @@ class Player(xbmc.Player):
         """Callback function called when audio/video has actually started.
 
         Sometimes, e.g., after slideshowing a video clip, slideshow pauses.(issue #7) 
+        This is also where the position of bgm is updated on each track change.
 
         """       
-        if self.isPlayingAudio() and xbmc.getCondVisibility('Slideshow.IsPaused'):
+        self.transitions += 1
+        state = self.scheduler.state
+        self.scheduler.new_tick()
+        if not state.get('Player.HasAudio'):
+            return
+
+        self.update_position()
+        if state.get('Slideshow.IsPaused'):
             #json = '{"jsonrpc":"2.0", "method":"%s", "params":%s, "id":1}' \
             #    % ('Input.ButtonEvent', '{"button":"space", "keymap":"KB"}')
             #xbmc.executeJSONRPC(json)
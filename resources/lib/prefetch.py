@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Read ahead of the next track of the bgm, on a background thread.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi.
+
+"""
+
+import os
+import threading
+
+
+class Prefetcher():
+    """Warm the next track into the page cache before kodi opens it.
+
+    On spinning disks and network mounts, opening a track that is not
+    cached can take long enough to be heard. :meth:`prefetch` hands the
+    path of the next track to a daemon thread, which asks the kernel to read
+    it ahead with ``posix_fadvise(POSIX_FADV_WILLNEED)`` or, where that is
+    not available, reads it sequentially and throws the data away.
+
+    At most ``budget`` bytes of a track are read ahead; it's the start of
+    the track that kodi needs at once. Only the latest request is kept, and
+    a read in progress gives up at the next chunk once another track is
+    requested or :meth:`stop` is called.
+
+    Args:
+        budget (int): maximum number of bytes read ahead of a track.
+        chunk_size (int): bytes read at a time, when reading sequentially.
+
+    """
+
+    def __init__(self, budget=16 << 20, chunk_size=1 << 20):
+        self.budget = budget
+        self.chunk_size = chunk_size
+        self.advise = hasattr(os, 'posix_fadvise')
+        #: str: path of the track to read ahead, ``None`` if none.
+        self.pending = None
+        self.stopped = False
+        #: str: path of the last track read ahead.
+        self.last = None
+        #: int: number of bytes read ahead, or advised.
+        self.fetched = 0
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def prefetch(self, path):
+        """Read ahead of ``path`` on the background thread. Does not block.
+
+        Args:
+            path (str): local path of the track.
+
+        """
+        with self.condition:
+            if self.stopped or path == self.last:
+                return
+            self.pending = path
+            self.condition.notify()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='slideshow-bgm prefetch',
+                                           daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Cancel the read in progress and end the thread. Does not wait for it.
+
+        The thread must not be joined in kodi; see :class:`scheduler.Scheduler`.
+
+        """
+        with self.condition:
+            self.stopped = True
+            self.pending = None
+            self.condition.notify()
+
+    def cancelled(self, path):
+        return self.stopped or self.pending not in (None, path)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                path, self.pending = self.pending, None
+            self.last = path
+            self.fetched += self.warm(path)
+
+    def warm(self, path):
+        """Read ahead of up to :attr:`budget` bytes of ``path``.
+
+        Returns:
+            int: number of bytes read ahead.
+
+        """
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        except OSError:
+            return 0
+        try:
+            length = min(os.fstat(fd).st_size, self.budget)
+            if self.advise:
+                try:
+                    os.posix_fadvise(fd, 0, length, os.POSIX_FADV_WILLNEED)
+                    return length
+                except OSError:
+                    # Not supported by the filesystem, so read it.
+                    self.advise = False
+            done = 0
+            while done < length and not self.cancelled(path):
+                data = os.read(fd, min(self.chunk_size, length - done))
+                if not data:
+                    break
+                done += len(data)
+            return done
+        except OSError:
+            return 0
+        finally:
+            os.close(fd)
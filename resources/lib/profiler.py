@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Timing spans and counters of the bgm lifecycle.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi. The scripts enable the module level :data:`profiler`
+from the ``profiling`` setting.
+
+"""
+
+import collections
+import functools
+import json
+import math
+import os
+import time
+
+
+class _NullSpan():
+    """The span given while profiling is off, which does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Span():
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+_null_span = _NullSpan()
+
+
+class Profiler():
+    """Collect the durations of spans and counters in memory.
+
+    While disabled, a span costs an attribute lookup and a branch. So,
+    spans can be left around hot paths.
+
+    Durations are reported in ms by :meth:`summary` and :meth:`dump`.
+
+    """
+
+    version = 1
+    #: Number of the latest samples of a span kept in the summary file.
+    max_samples = 200
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        #: dict: span name to the list of its durations in seconds.
+        self.spans = collections.defaultdict(list)
+        #: collections.Counter: counters by name.
+        self.counters = collections.Counter()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def span(self, name):
+        """Time a block, e.g., ``with profiler.span('check_config'):``."""
+        return _Span(self, name) if self.enabled else _null_span
+
+    def add(self, name, seconds):
+        """Add a duration to the span ``name``."""
+        self.spans[name].append(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    @staticmethod
+    def percentile(samples, p):
+        """The ``p``th percentile of ``samples`` by the nearest rank."""
+        ordered = sorted(samples)
+        return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)] if ordered else 0
+
+    def summary(self, samples=None):
+        """Summarize the spans and counters.
+
+        Args:
+            samples (dict): span name to durations in ms, e.g., from the
+                previous sessions, to summarize together.
+
+        Returns:
+            dict: {'spans': {name: {'count', 'p50_ms', 'p95_ms', 'max_ms',
+            'total_ms', 'samples_ms'}}, 'counters': {name: count}}
+
+        """
+        merged = {name: list(values) for name, values in (samples or {}).items()}
+        for name, values in self.spans.items():
+            merged.setdefault(name, []).extend(value * 1000 for value in values)
+
+        spans = {}
+        for name, values in sorted(merged.items()):
+            values = values[-self.max_samples:]
+            spans[name] = {'count': len(values),
+                           'p50_ms': self.percentile(values, 50),
+                           'p95_ms': self.percentile(values, 95),
+                           'max_ms': max(values),
+                           'total_ms': sum(values),
+                           'samples_ms': [round(value, 3) for value in values]}
+
+        return {'version': self.version, 'spans': spans, 'counters': dict(self.counters)}
+
+    def dump(self, path, counters=None):
+        """Write the summary to ``path`` atomically, along with the samples already in it.
+
+        So, the percentiles of spans run once a session, e.g., starting the
+        player, come from the latest :attr:`max_samples` sessions.
+
+        Args:
+            path (str): path of the JSON file.
+            counters (dict): more counters to report, e.g., the kodi API calls
+                counted by :class:`Scheduler`.
+
+        Returns:
+            bool: True if succeeds, False otherwise.
+
+        """
+        samples = {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.version:
+                samples = {name: span['samples_ms'] for name, span in data['spans'].items()}
+        except (IOError, ValueError, AttributeError, KeyError, TypeError):
+            pass
+
+        self.counters.update(counters or {})
+        summary = self.summary(samples)
+        summary['written'] = time.time()
+        tmp_file = path + '.tmp'
+        try:
+            with open(tmp_file, mode='w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=1)
+            os.replace(tmp_file, path)
+        except (IOError, OSError):
+            return False
+
+        return True
+
+
+#: The profiler of the script.
+profiler = Profiler()
+
+
+def profiled(name=None):
+    """Decorator timing each call of a function as the span ``name``.
+
+    Args:
+        name (str): name of the span, the qualified name of the function if omitted.
+
+    """
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.add(label, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""Incremental, parallel scanner for the bgm directory.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi. Remote directories are listed through functions
+passed in, i.e., ``xbmcvfs.listdir`` in kodi.
+
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+music_file_exts = ('.mp2', '.mp3', '.wav', '.ogg', '.wma')
+# Filenames are filtered before they are decoded.
+_music_file_exts_b = tuple(ext.encode('ascii') for ext in music_file_exts)
+
+
+class ScanIndex():
+    """On-disk index of a music directory tree.
+
+    For each directory visited, the index keeps the directory's modification
+    time, its subdirectories and the music files in it. The mtime of a
+    directory changes whenever an entry is added to, removed from or renamed in
+    it. So, on the next scan, a directory whose mtime has not changed is not
+    listed again; only a ``stat`` is needed.
+
+    Directories are stat'ed and listed on a bounded thread pool ahead of the
+    consumer, which matters on network mounts where every call waits for a
+    round trip. On a local disk, a directory is visited in microseconds and
+    the pool would only slow the scan down, so a scan starts serially and
+    moves to the pool once the directories turn out slow to visit.
+
+    .. Note: Paths are walked as bytes(see :func:`utils.create_playlist`) and
+            stored in the index file as str decoded with 'surrogateescape',
+            so that any filename round-trips regardless of kodi's
+            ``filesystemencoding``.
+
+    Args:
+        index_file (str): path of the index file.
+        workers (int): maximum number of directories listed concurrently,
+            once they are slow to visit.
+        timeout (float): time budget of a scan in seconds, ``None`` for no limit.
+            When it runs out, the directories not listed yet are taken from
+            the index as they were, or skipped if they are not in it.
+
+    """
+
+    version = 1
+    #: Separator of the paths yielded.
+    sep = os.sep
+    #: Directories modified less than this(in ns) before they were listed
+    #: are listed again on the next scan. mtime resolution of some
+    #: filesystems, e.g., FAT and SMB, is 2 seconds.
+    racy_ns = 2 * 10 ** 9
+    #: Seconds a directory takes to visit on average, over the first
+    #: :attr:`probe_visits` at least, beyond which the scan moves to the
+    #: thread pool. 0 to start on it.
+    slow_visit = 0.001
+    probe_visits = 8
+
+    def __init__(self, index_file, workers=8, timeout=None):
+        self.index_file = index_file
+        self.workers = workers
+        self.timeout = timeout
+        self.dirs = self.load()
+        #: int: number of directories actually listed by the last :meth:`walk`.
+        self.listed = 0
+        #: int: number of directories not listed in time by the last :meth:`walk`.
+        self.missed = 0
+
+    def load(self):
+        """Load the index file.
+
+        Returns:
+            dict: the cached directories, empty if there's no valid index file.
+
+        """
+        try:
+            with open(self.index_file, encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            return {}
+
+        return data.get('dirs', {})
+
+    def save(self):
+        """Write the index file atomically.
+
+        Returns:
+            bool: True if succeeds, False otherwise.
+
+        """
+        # Unique to the thread, as both scripts of the addon may save it at once.
+        tmp_file = '%s.%d.tmp' % (self.index_file, threading.get_ident())
+        try:
+            with open(tmp_file, mode='w', encoding='utf-8') as f:
+                json.dump({'version': self.version, 'dirs': self.dirs}, f,
+                          separators=(',', ':'))
+            os.replace(tmp_file, self.index_file)
+        except (IOError, OSError):
+            return False
+
+        return True
+
+    @staticmethod
+    def _decode(name):
+        return name.decode('utf-8', 'surrogateescape')
+
+    def _list(self, path, st_mtime_ns, now_ns):
+        """List ``path`` and return a new index entry for it."""
+        dirs, files = [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                name = entry.name
+                try:
+                    # Follows symlinks, like os.walk(followlinks=True)
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    dirs.append(self._decode(name))
+                elif name.lower().endswith(_music_file_exts_b):
+                    files.append(self._decode(name))
+        mtime = -1 if now_ns - st_mtime_ns < self.racy_ns else st_mtime_ns
+
+        return [mtime, dirs, files]
+
+    def _visit(self, path, old_dirs, now_ns):
+        """Stat ``path`` and list it if it has changed. Run on the thread pool.
+
+        Returns:
+            tuple: ((st_dev, st_ino), key, entry, listed)
+
+        """
+        st = os.stat(path)
+        key = self._decode(path)
+        entry = old_dirs.get(key)
+        if entry is None or entry[0] != st.st_mtime_ns:
+            return (st.st_dev, st.st_ino), key, self._list(path, st.st_mtime_ns, now_ns), True
+
+        return (st.st_dev, st.st_ino), key, entry, False
+
+    def _key(self, path):
+        return self._decode(path)
+
+    def _children(self, key, entry):
+        """Paths of the subdirectories of the directory ``key``."""
+        root = key.encode('utf-8', 'surrogateescape')
+        return [os.path.join(root, name.encode('utf-8', 'surrogateescape')) for name in entry[1]]
+
+    def walk(self, top):
+        """Walk the tree under ``top`` top-down, like ``os.walk(top, followlinks=True)``.
+
+        Only the directories whose mtime has changed since the last scan are
+        listed. Directories which are no longer reachable from ``top`` are
+        dropped from the index. The order of the directories is the same as
+        a single threaded walk would give.
+
+        Args:
+            top (bytes): Directory where to look for music files.
+                str for :class:`RemoteScanIndex`.
+
+        Yields:
+            tuple: (root, files) where ``root`` is the directory path as str
+            and ``files`` is the list of names of the music files in it.
+
+        """
+        old_dirs, self.dirs = self.dirs, {}
+        self.listed = 0
+        self.missed = 0
+        visited = set()  # guard against symlink loops
+        now_ns = time.time_ns()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        # With a single worker, the pool would only add overhead.
+        pool = ThreadPoolExecutor(max_workers=self.workers) \
+            if self.workers > 1 and self.slow_visit <= 0 else None
+        serial = [0, 0.0]  # directories visited serially, and the seconds it took
+        futures = {}  # path to the future of its visit
+        crawled = set()
+        lock = threading.Lock()
+        closed = []
+
+        def remaining():
+            return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+        def submit(path):
+            if pool and not closed and remaining() != 0:
+                try:
+                    futures[path] = pool.submit(crawl, path)
+                except RuntimeError:  # shut down
+                    pass
+
+        def crawl(path):
+            # The subdirectories are submitted as soon as a directory is
+            # listed, so the pool is not held back by the consumer.
+            item = self._visit(path, old_dirs, now_ns)
+            with lock:
+                expand = item[0] not in crawled
+                crawled.add(item[0])
+            if expand:
+                for child in self._children(item[1], item[2]):
+                    submit(child)
+            return item
+
+        def result(path):
+            future = futures.pop(path, None)
+            try:
+                if future:
+                    return future.result(remaining())
+                if remaining() != 0:
+                    started = time.monotonic()
+                    item = self._visit(path, old_dirs, now_ns)
+                    serial[0] += 1
+                    serial[1] += time.monotonic() - started
+                    return item
+            except TimeoutError:
+                pass
+            # Out of time. Take the directory as it was in the index.
+            self.missed += 1
+            key = self._key(path)
+            entry = old_dirs.get(key)
+            if entry is None:
+                raise OSError('%s not listed in time' % key)
+            return key, key, entry, False
+
+        # Directories are consumed depth-first while the pool works ahead.
+        submit(top)
+        stack = [top]
+        try:
+            while stack:
+                try:
+                    ident, key, entry, listed = result(stack.pop())
+                except OSError:
+                    continue
+                if ident in visited:
+                    continue
+                visited.add(ident)
+                self.listed += listed
+                self.dirs[key] = entry
+
+                yield key, entry[2]
+
+                stack.extend(reversed(self._children(key, entry)))
+                if pool is None and self.workers > 1 and serial[0] >= self.probe_visits and \
+                        serial[1] > self.slow_visit * serial[0]:
+                    pool = ThreadPoolExecutor(max_workers=self.workers)
+                    # The directories to visit next go first.
+                    for path in reversed(stack):
+                        submit(path)
+        finally:
+            if pool:
+                closed.append(True)
+                for future in list(futures.values()):
+                    future.cancel()
+                # Don't wait for the requests still running after a timeout.
+                pool.shutdown(wait=remaining() != 0)
+
+    def scan(self, top, batch_size=1000):
+        """Stream the paths of the music files under ``top`` in batches.
+
+        Args:
+            top (bytes): Directory where to look for music files.
+            batch_size (int): Number of paths in a batch, except the last one.
+
+        Yields:
+            list: paths(str) of music files.
+
+        """
+        batch = []
+        for root, files in self.walk(top):
+            if not files:
+                continue
+            prefix = root if root.endswith(self.sep) else root + self.sep
+            batch.extend(prefix + file for file in files)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+class RemoteScanIndex(ScanIndex):
+    """On-disk index of a remote music directory tree, e.g., on smb, nfs or webdav.
+
+    Directories are listed through kodi's virtual filesystem, i.e.,
+    ``xbmcvfs.listdir``, and requests are made concurrently on the bounded
+    thread pool as each one waits for a round trip to the server.
+
+    A directory is not listed again if its mtime, where the protocol gives
+    one, has not changed since the last scan. Otherwise, the listing is
+    reused for ``max_age`` seconds.
+
+    Args:
+        index_file (str): path of the index file.
+        listdir (callable): ``listdir(path)`` returning (dirs, files) like
+            ``xbmcvfs.listdir``.
+        mtime (callable): ``mtime(path)`` returning the mtime of a directory
+            in seconds, 0 if unknown. ``None`` if the protocol has none.
+        workers (int): maximum number of concurrent requests.
+        timeout (float): time budget of a scan in seconds, ``None`` for no limit.
+        max_age (float): seconds a listing is reused for without an mtime.
+
+    """
+
+    sep = '/'
+    # Every request waits for a round trip.
+    slow_visit = 0
+
+    def __init__(self, index_file, listdir, mtime=None, workers=8, timeout=60, max_age=3600):
+        super().__init__(index_file, workers, timeout)
+        self.listdir = listdir
+        self.mtime = mtime
+        self.max_age = max_age
+
+    def _key(self, path):
+        # kodi wants a trailing slash on directories.
+        return path if path.endswith('/') else path + '/'
+
+    def _children(self, key, entry):
+        return [key + name + '/' for name in entry[1]]
+
+    def _visit(self, path, old_dirs, now_ns):
+        """List the directory ``path`` unless it is known to be unchanged. Run on the thread pool.
+
+        Returns:
+            tuple: (key, key, entry, listed) where ``entry`` is
+            [mtime or -1, dirs, files, time listed]
+
+        """
+        key = self._key(path)
+        mtime = self.mtime(key) if self.mtime else 0
+        now = now_ns / 10 ** 9
+        entry = old_dirs.get(key)
+        if entry is not None and len(entry) == 4 and \
+                (entry[0] == mtime > 0 or (mtime <= 0 and now - entry[3] < self.max_age)):
+            return key, key, entry, False
+
+        dirs, files = self.listdir(key)
+        files = [name for name in files if name.lower().endswith(music_file_exts)]
+        if mtime <= 0 or now - mtime < self.racy_ns / 10 ** 9:
+            mtime = -1
+        return key, key, [mtime, list(dirs), files, now], True
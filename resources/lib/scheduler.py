@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""A scheduler driven by kodi notifications and :class:`Player` callbacks."""
+
+import collections
+import time
+import xbmc
+from .state import State
+from .utils import log
+
+
+class Monitor(xbmc.Monitor):
+    """A subclass of :class:`xbmc.Monitor` which forwards player notifications
+    and changes of the addon settings, as 'Addon.OnSettingsChanged', to the
+    :class:`Scheduler`.
+
+    """
+
+    def __init__(self, scheduler):
+        super().__init__()
+        self.scheduler = scheduler
+
+    def onNotification(self, sender, method, data):
+        """Callback function called when kodi sends a JSON-RPC notification."""
+        if method.startswith('Player.'):
+            self.scheduler.notify(method, data)
+
+    def onSettingsChanged(self):
+        """Callback function called when the settings of the addon are changed."""
+        self.scheduler.notify('Addon.OnSettingsChanged')
+
+
+class Task():
+    """A task run by :class:`Scheduler`.
+
+    If ``max_interval`` is greater than ``interval``, the task is polled
+    adaptively: each time ``func`` returns a falsy value, i.e., nothing
+    has changed, the interval doubles up to ``max_interval``. It goes back to
+    ``interval`` when ``func`` returns True or an event arrives.
+
+    """
+
+    def __init__(self, func, interval, max_interval=None, repeat=True):
+        self.func = func
+        self.min_interval = interval
+        self.max_interval = max(interval, max_interval or interval)
+        self.interval = interval
+        self.repeat = repeat
+        self.due = time.monotonic() + interval
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def reset(self, now):
+        self.interval = self.min_interval
+        self.due = min(self.due, now + self.interval)
+
+
+class Scheduler():
+    """Run tasks on the main thread of the script.
+
+    Kodi runs the callbacks of :class:`xbmc.Player` and :class:`xbmc.Monitor`
+    while the script is sleeping in ``xbmc.sleep()`` or
+    ``Monitor.waitForAbort()``, and blocking methods such as ``Thread.join`` or
+    ``Lock.acquire`` block the callbacks too. So, instead of each component
+    polling on its own thread, one loop sleeps in ``waitForAbort`` until the
+    next task is due.
+
+    The scheduler also counts its wakeups and the kodi API calls made through
+    :meth:`api`, so that the cost of polling can be measured.
+
+    Each wakeup and each notification starts a new tick, and :attr:`state`
+    reads the state of kodi once per tick for all the tasks and callbacks.
+
+    """
+
+    def __init__(self):
+        self.monitor = Monitor(self)
+        self.tasks = []
+        self.listeners = []
+        self.running = False
+        self.started = time.monotonic()
+        #: int: number of times the loop woke up.
+        self.wakeups = 0
+        #: collections.Counter: kodi API calls by function name.
+        self.api_calls = collections.Counter()
+        #: int: counts the wakeups and notifications.
+        self.tick = 0
+        #: :class:`state.State`: the state of kodi in this tick.
+        self.state = State(self)
+
+    def every(self, interval, func, max_interval=None):
+        """Run ``func`` every ``interval`` seconds, adaptively up to ``max_interval``.
+
+        Returns:
+            :class:`Task`: the task, which can be cancelled.
+
+        """
+        task = Task(func, interval, max_interval)
+        self.tasks.append(task)
+        return task
+
+    def call_later(self, delay, func):
+        """Run ``func`` once after ``delay`` seconds.
+
+        Returns:
+            :class:`Task`: the task, which can be cancelled.
+
+        """
+        task = Task(func, delay, repeat=False)
+        self.tasks.append(task)
+        return task
+
+    def listen(self, func):
+        """Call ``func(method, data)`` on each player notification."""
+        self.listeners.append(func)
+
+    def notify(self, method, data=None):
+        """Handle an event: adaptive tasks are polled at their shortest interval again."""
+        now = time.monotonic()
+        self.tick += 1
+        for task in self.tasks:
+            task.reset(now)
+        for func in self.listeners:
+            func(method, data)
+
+    def new_tick(self):
+        """Start a new tick, so that :attr:`state` is read again, e.g., on a player callback."""
+        self.tick += 1
+
+    def api(self, func, *args):
+        """Call a kodi API function and count the call.
+
+        Args:
+            func (callable): e.g., ``xbmc.getCondVisibility``.
+            args: arguments to ``func``.
+
+        """
+        self.api_calls[func.__name__] += 1
+        return func(*args)
+
+    def wait_until(self, predicate, timeout, step=0.025):
+        """Wait in a callback until ``predicate()`` is true, for up to ``timeout`` seconds.
+
+        A callback runs in the middle of the wait of :meth:`run`, so it can't
+        leave the work to a task without waiting for that wait to end.
+        Callbacks arriving meanwhile are run, so ``predicate`` can test the
+        state changes they make.
+
+        Returns:
+            bool: True if ``predicate()`` became true, False on timeout or abort.
+
+        """
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.monitor.waitForAbort(min(step, remaining)):
+                return False
+            self.wakeups += 1
+            self.tick += 1
+
+        return True
+
+    def run(self):
+        """Run tasks until :meth:`stop` is called or kodi requests abort."""
+        self.running = True
+        while self.running:
+            now = time.monotonic()
+            due = min((task.due for task in self.tasks), default=now + 1)
+            if self.monitor.waitForAbort(max(due - now, 0.01)):
+                break
+            self.wakeups += 1
+            self.tick += 1
+            self.run_due()
+        self.running = False
+
+    def run_due(self):
+        """Run the tasks that are due."""
+        now = time.monotonic()
+        for task in list(self.tasks):
+            if task.cancelled or task.due > now:
+                continue
+            changed = task.func()
+            if task.repeat and not task.cancelled:
+                if changed:
+                    task.interval = task.min_interval
+                else:
+                    task.interval = min(task.interval * 2, task.max_interval)
+                task.due = now + task.interval
+            else:
+                task.cancel()
+        self.tasks = [task for task in self.tasks if not task.cancelled]
+
+    def stop(self):
+        """Stop the loop and cancel all tasks."""
+        self.running = False
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    def stats(self):
+        """Summarize wakeups and kodi API calls.
+
+        Returns:
+            str: e.g., 'wakeups: 40 (20.0/min), kodi api calls: 45 (22.5/min),
+            state reads: 60 from 30 fetches ...'
+
+        """
+        minutes = max(time.monotonic() - self.started, 1e-6) / 60
+        calls = sum(self.api_calls.values())
+        return 'wakeups: %d (%.1f/min), kodi api calls: %d (%.1f/min), ' \
+            'state reads: %d from %d fetches %s' % \
+            (self.wakeups, self.wakeups / minutes, calls, calls / minutes,
+             self.state.reads, self.state.fetches, dict(self.api_calls))
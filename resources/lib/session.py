@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""State of the last bgm session, for warm starts of :class:`Player`."""
+
+import json
+import xbmcvfs
+
+
+class Session():
+    """The bgm session saved in ``session.json`` in the addon profile directory.
+
+    It records the playlist loaded into kodi's music playlist, the
+    fingerprint(size and mtime) of the playlist file, the randomness
+    applied, the number of entries kodi loaded, and where the bgm was,
+    i.e., the 0-based position in the music playlist and the offset in
+    seconds within the track, when the last slideshow ended. In windowed
+    mode, it also records the tracks in the window of :class:`window.Window`.
+
+    If the next :class:`Player` finds the same playlist with the same
+    settings and kodi still holds as many entries in its music playlist, it
+    can skip loading the playlist. Checking it costs a ``stat`` and a dict
+    lookup.
+
+    Args:
+        path (str): path of the session file.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = self.load()
+
+    def load(self):
+        """Load the session file.
+
+        Returns:
+            dict: the saved state, empty if there's no valid session file.
+
+        """
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+        return state if isinstance(state, dict) else {}
+
+    def save(self, playlist, random, size, position, offset, window=None):
+        """Save the state of the session.
+
+        Args:
+            playlist (str): path of the playlist.
+            random (bool): whether the music playlist was shuffled.
+            size (int): number of entries in kodi's music playlist.
+            position (int): 0-based position in the music playlist.
+            offset (float): seconds played in the track at ``position``.
+            window (list): tracks in the window in windowed mode, ``None`` otherwise.
+
+        Returns:
+            bool: True if succeeds, False otherwise.
+
+        """
+        self.state = {'playlist': playlist, 'fingerprint': self.fingerprint(playlist),
+                      'random': random, 'size': size,
+                      'position': position, 'offset': offset, 'window': window}
+        try:
+            with open(self.path, mode='w', encoding='utf-8') as f:
+                json.dump(self.state, f)
+        except (IOError,):
+            return False
+
+        return True
+
+    @staticmethod
+    def fingerprint(playlist):
+        """Size and mtime of the playlist file.
+
+        We don't use os.stat() due to kodi's 'filesystemencoding'.
+
+        """
+        st = xbmcvfs.Stat(playlist)
+        return [st.st_size(), st.st_mtime()]
+
+    def matches(self, playlist, random, size, windowed=False):
+        """Check kodi still holds the playlist of the last session.
+
+        Args:
+            playlist (str): path of the playlist.
+            random (bool): randomness wanted.
+            size (int): current number of entries in kodi's music playlist.
+            windowed (bool): whether the playlist is fed through a window.
+
+        Returns:
+            bool: True if the music playlist can be used as it is.
+
+        """
+        state = self.state
+        return bool(size) and state.get('size') == size and \
+            state.get('playlist') == playlist and state.get('random') == random and \
+            (state.get('window') is not None) == windowed and \
+            state.get('fingerprint') == self.fingerprint(playlist)
+
+    @property
+    def position(self):
+        return self.state.get('position', 0)
+
+    @property
+    def offset(self):
+        return self.state.get('offset', 0.0)
+
+    @property
+    def window(self):
+        return self.state.get('window')
+
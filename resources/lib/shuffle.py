@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Incremental shuffle of the tracks of a playlist.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi.
+
+"""
+
+import json
+import os
+import random as _random
+from array import array
+
+
+class Shuffle():
+    """The order in which the tracks of a playlist are played.
+
+    Tracks are drawn one at a time by an incremental Fisher-Yates shuffle
+    over an array of track indices, 4 bytes a track, so the next track costs
+    O(1) whatever the length of the playlist and nothing is shuffled ahead.
+    Tracks before ``cursor`` in the array have been played in the current
+    round and each track is played once a round.
+
+    When a round is over, the next one starts over the same array. The last
+    ``history`` tracks played are kept out of the first draws of the new
+    round, so no track is played twice within ``history`` tracks, even across
+    rounds. As the state is saved with :meth:`save`, this holds across
+    sessions as well.
+
+    Args:
+        size (int): number of tracks.
+        history (int): number of recently played tracks not to repeat.
+        random (bool): whether to shuffle. If False, tracks are played in order.
+
+    """
+
+    version = 1
+
+    def __init__(self, size, history=50, random=True):
+        self.tracks = array('i', range(size))
+        self.history = min(history, size // 2)
+        self.random = random
+        #: int: number of tracks played in the current round.
+        self.cursor = 0
+        #: int: number of rounds started.
+        self.rounds = 1
+        self._rng = _random.Random()
+        #: list: (i, j) of the swaps made by :meth:`next`, while :meth:`peek` draws.
+        self._swaps = None
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def next(self):
+        """Draw the next track.
+
+        Returns:
+            int: index of the track.
+
+        """
+        n = len(self.tracks)
+        if self.cursor == n:
+            self.cursor = 0
+            self.rounds += 1
+
+        i = self.cursor
+        if self.random:
+            # The tracks played in the last round but not within the last
+            # ``history`` draws are still in place at the end of the array.
+            recent = self.history - i if self.rounds > 1 else 0
+            j = self._rng.randint(i, n - 1 - max(recent, 0))
+            self.tracks[i], self.tracks[j] = self.tracks[j], self.tracks[i]
+            if self._swaps is not None:
+                self._swaps.append((i, j))
+        self.cursor += 1
+
+        return self.tracks[i]
+
+    def take(self, count):
+        """Draw the next ``count`` tracks.
+
+        Returns:
+            list: indices of the tracks.
+
+        """
+        return [self.next() for _ in range(count)]
+
+    def peek(self, count):
+        """Get the next ``count`` tracks without drawing them.
+
+        The draws are undone, so :meth:`take` draws the same tracks after.
+
+        Returns:
+            list: indices of the tracks.
+
+        """
+        cursor, rounds, state = self.cursor, self.rounds, self._rng.getstate()
+        self._swaps = []
+        try:
+            tracks = self.take(count)
+        finally:
+            for i, j in reversed(self._swaps):
+                self.tracks[i], self.tracks[j] = self.tracks[j], self.tracks[i]
+            self._swaps = None
+            self.cursor, self.rounds = cursor, rounds
+            self._rng.setstate(state)
+
+        return tracks
+
+    def save(self, path, key=None):
+        """Write the state atomically: a JSON header line and the array.
+
+        Args:
+            path (str): path of the state file.
+            key: JSON serializable value identifying the playlist, e.g., its
+                path and fingerprint, which :meth:`load` checks.
+
+        Returns:
+            bool: True if succeeds, False otherwise.
+
+        """
+        header = {'version': self.version, 'size': len(self.tracks), 'key': key,
+                  'history': self.history, 'random': self.random,
+                  'cursor': self.cursor, 'rounds': self.rounds,
+                  'itemsize': self.tracks.itemsize}
+        tmp_file = path + '.tmp'
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(json.dumps(header).encode('utf-8') + b'\n')
+                self.tracks.tofile(f)
+            os.replace(tmp_file, path)
+        except (IOError, OSError):
+            return False
+
+        return True
+
+    @classmethod
+    def load(cls, path, size, key=None, random=True):
+        """Read the state written by :meth:`save`.
+
+        Returns:
+            :class:`Shuffle`: the saved shuffle, ``None`` if there's no valid
+            state file for ``size`` tracks of ``key`` in ``random`` mode.
+
+        """
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline().decode('utf-8'))
+                if not isinstance(header, dict) or header.get('version') != cls.version or \
+                        header.get('size') != size or header.get('key') != key or \
+                        header.get('random') != random:
+                    return None
+                shuffle = cls(0, random=random)
+                if shuffle.tracks.itemsize != header.get('itemsize'):
+                    return None
+                shuffle.tracks.fromfile(f, size)
+        except (IOError, OSError, EOFError, ValueError):
+            return None
+
+        shuffle.history = header['history']
+        shuffle.cursor = header['cursor']
+        shuffle.rounds = header['rounds']
+        return shuffle
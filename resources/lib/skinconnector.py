@@ -1,56 +1,95 @@
 # -*- coding: utf-8 -*-
 
+import json
 import os
-import xml.etree.ElementTree as ET
+import re
+import time
 import xbmcvfs
 from . import addonId
+from .profiler import profiled
+from .utils import profile_path
 
 
 class SkinConnector():
     """Helper class for integrating slideshow-bgm with the current skin.
 
+    The location of ``SlideShow.xml`` and whether it is hooked are cached in
+    ``skin_cache.json`` in the addon profile directory, keyed by the skin
+    path and the size and mtime of the file. So, once the hook has been
+    confirmed, checking it again takes only a ``stat``.
+
+    The file is never re-serialized. The interlocking tag is spliced into or
+    out of its bytes, and the result replaces the file atomically, so the
+    rest of the file is preserved byte for byte and a crash can't leave a
+    half-written skin behind.
+
+    Args:
+        target (str): path of a ``SlideShow.xml``. (default, the current skin's)
+
     """
 
+    #: Size of the chunks :meth:`scan_hooked` reads.
+    chunk_size = 64 * 1024
+    _comment = re.compile(rb'<!--.*?-->', re.S)
+    # Whitespace, xml declaration, comments and doctype before the root element.
+    _prolog = re.compile(rb'(?:\s+|<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>]*>)*', re.S)
+    _start_tag = re.compile(rb'<[A-Za-z_][^>]*(?<!/)>')
+
     def __init__(self, target=None):
-        self.target = target if target else self.find_SlideShow_xml()
-        # preserve comments
-        self.parser = ET.XMLParser(target=ET.TreeBuilder(insert_comments=True))
-        self.tree = ET.parse(self.target, self.parser)
-        self.root = self.tree.getroot()
-        self.element = ET.Element('onload')
-        self.element.attrib = {'condition': 'System.HasAddon(%s)' % addonId +
-                                            ' + ' +
-                                            'System.AddonIsEnabled(%s)' % addonId}
-        self.element.text = ('RunAddon(%s)' % addonId).strip()
-
-    def indent(self, elem, level=0):
-        """Arrange indentations of a xml tree.
-
-        Copied from <http://effbot.org/zone/element-lib.htm#prettyprint>_
+        self.skin_dir = xbmcvfs.translatePath('special://skin')
+        self.cache_file = profile_path('skin_cache.json')
+        self.cache = self.load_cache()
+        if target:
+            self.target = target
+        elif self.cache.get('skin_dir') == self.skin_dir and \
+                os.path.isfile(self.cache.get('target', '')):
+            self.target = self.cache['target']
+        else:
+            self.target = self.find_SlideShow_xml()
+        command = ('RunAddon(%s)' % addonId).encode('utf-8')
+        self.tag = b'<onload condition="System.HasAddon(%s) + System.AddonIsEnabled(%s)">%s</onload>' % \
+            (addonId.encode('utf-8'), addonId.encode('utf-8'), command)
+        self.pattern = re.compile(rb'<onload\b[^>]*>\s*' + re.escape(command) + rb'\s*</onload>')
 
-        Args:
-            elem (:obj:`xml.etree.ElementTree.Element`): top element to indent
-            level (int): indentation level(default 0)
+    def load_cache(self):
+        """Load the cache file.
+
+        Returns:
+            dict: the cached state, empty if there's no valid cache file.
 
         """
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            return {}
 
-        i = os.linesep + level * "  "
-        if len(elem):
-            if not elem.text or not elem.text.strip():
-                elem.text = i + "  "
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-            for elem in elem:
-                self.indent(elem, level + 1)
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-        else:
-            if level and (not elem.tail or not elem.tail.strip()):
-                elem.tail = i
+        return cache if isinstance(cache, dict) else {}
+
+    def save_cache(self, hooked):
+        """Record ``SlideShow.xml`` as it is now and whether it is ``hooked``.
+
+        Only the current skin is cached.
+
+        """
+        if not self.target.startswith(self.skin_dir):
+            return
+        try:
+            st = os.stat(self.target)
+            self.cache = {'skin_dir': self.skin_dir, 'target': self.target,
+                          'size': st.st_size, 'mtime': st.st_mtime_ns, 'hooked': hooked}
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with open(self.cache_file, mode='w', encoding='utf-8') as f:
+                json.dump(self.cache, f)
+        except (IOError, OSError):
+            pass
 
     @staticmethod
-    def find_SlideShow_xml():
-        """Locate ``SlideShow.xml`` file of the current skin.
+    def find_SlideShow_xml(skin_dir=None):
+        """Locate ``SlideShow.xml`` file of a skin.
+
+        Args:
+            skin_dir (str): directory of the skin. (default, the current skin's)
 
         Returns:
             str: The path of ``SlideShow.xml`` file.
@@ -59,7 +98,7 @@ class SkinConnector():
 
         fname = 'SlideShow.xml'
         path = ''
-        skin_dir = xbmcvfs.translatePath('special://skin')
+        skin_dir = skin_dir if skin_dir else xbmcvfs.translatePath('special://skin')
         for root, dirs, files in os.walk(skin_dir):
             if fname in files:
                 path = os.path.join(root, fname)
@@ -67,6 +106,7 @@ class SkinConnector():
 
         return path
 
+    @profiled()
     def check_permission(self):
         """Check the write permission for ``SlideShow.xml`` and the enclosing directory
 
@@ -78,6 +118,7 @@ class SkinConnector():
         return os.access(self.target, os.W_OK) and \
                os.access(os.path.dirname(self.target), os.W_OK)
 
+    @profiled()
     def check_hooked(self):
         """Check current skin's SlideShow.xml is tied to ``slideshow-bgm`` of the current
         skin.
@@ -86,54 +127,236 @@ class SkinConnector():
         System.AddonIsEnabled(script.service.slideshow-bgm)">RunAddon(script.service.slideshow-bgm)</onload>``
         exists in the `SlideShow.xml` file of the current skin.
 
+        If the file has the same size and mtime as cached, the cached answer
+        is returned. Otherwise, the file is scanned by :meth:`scan_hooked`.
+
         Returns:
             bool:  True if it's hooked, False otherwise.
 
         """
+        try:
+            st = os.stat(self.target)
+        except OSError:
+            return False
+        cache = self.cache
+        if cache.get('target') == self.target and cache.get('size') == st.st_size and \
+                cache.get('mtime') == st.st_mtime_ns:
+            return cache.get('hooked', False)
 
-        ret = None
-        #: xml.etree.ElementTree.Element: Elements with no subelements will test as ``False``.
-        for element in self.root.findall('onload'):
-            if element.text.strip() == self.element.text:
-                ret = element
-                break
-            else:
-                continue
-        return False if ret is None else True
+        hooked = self.scan_hooked()
+        self.save_cache(hooked)
+        return hooked
+
+    @profiled()
+    def scan_hooked(self):
+        """Look for the interlocking tag in the bytes of ``SlideShow.xml``.
+
+        The file is read in chunks, comments are skipped, and the tag is
+        searched for without building the xml tree.
+
+        Returns:
+            bool:  True if it's hooked, False otherwise.
 
+        """
+        overlap = 512  # longer than any interlocking tag
+        tail = b''
+        with open(self.target, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                data = self._comment.sub(b'', tail + chunk)
+                start = data.find(b'<!--')
+                if start >= 0 and chunk:
+                    # An unterminated comment goes on to the next chunk.
+                    data, tail = data[:start], data[start:]
+                else:
+                    tail = data[-overlap:]
+                if self.pattern.search(data):
+                    return True
+                if not chunk:
+                    return False
+
+    @profiled()
     def insert_tag(self):
         """Insert interlocking tag into `SlideShow.xml` file of the current skin.
 
         The contents of the tag are ``<onload condition="System.HasAddon(script.service.slideshow-bgm) +
         System.AddonIsEnabled(script.service.slideshow-bgm)">RunAddon(script.service.slideshow-bgm)</onload>``
 
+        The tag goes right after the start tag of the root element, indented
+        like the line following it.
+
         Returns:
             bool: True if succeeds, False otherwise.
 
         """
 
-        self.root.insert(0, self.element)
-        self.indent(self.root)
         try:
-            self.tree.write(self.target, encoding="utf-8", xml_declaration=True)
-        except:
+            with open(self.target, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
             return False
 
+        start = self._start_tag.match(data, self._prolog.match(data).end())
+        if not start:
+            return False
+        end = start.end()
+        indent = re.match(rb'[ \t]*\r?\n[ \t]*', data[end:])
+        if indent:
+            indent = indent.group().lstrip(b' \t')
+        else:
+            indent = (b'\r\n' if b'\r\n' in data else b'\n') + b'  '
+        if not self.write(data[:end] + indent + self.tag + data[end:]):
+            return False
+
+        self.save_cache(True)
         return True
 
     def remove_tag(self):
         """Remove the interlocking tag from `SlideShow.xml` file of the current skin.
 
+        The tags in comments are left alone.
+
         """
 
-        for element in self.root.findall('onload'):
-            if element.text.strip() == self.element.text:
-                self.root.remove(element)
+        try:
+            with open(self.target, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return False
+
+        comments = [m.span() for m in self._comment.finditer(data)]
+        pattern = re.compile(rb'(?:\r?\n[ \t]*)?' + self.pattern.pattern)
+        spans = [m.span() for m in pattern.finditer(data)
+                 if not any(begin <= m.start() < end for begin, end in comments)]
+        for begin, end in reversed(spans):
+            data = data[:begin] + data[end:]
+        if spans and not self.write(data):
+            return False
+
+        self.save_cache(False)
+        return True
+
+    def write(self, data):
+        """Replace ``SlideShow.xml`` with ``data`` atomically.
+
+        ``data`` is written to a temp file in the same directory which is
+        then renamed over the target.
+
+        Returns:
+            bool: True if succeeds, False otherwise.
+
+        """
+        # Imported here, as service.py runs on every boot and rarely writes.
+        import shutil, tempfile
+
+        fd, tmp_file = tempfile.mkstemp(prefix='.SlideShow.', suffix='.tmp',
+                                        dir=os.path.dirname(self.target))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            shutil.copymode(self.target, tmp_file)
+            os.replace(tmp_file, self.target)
+        except (IOError, OSError):
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+            return False
+
+        return True
+
+    @profiled()
+    def backup(self):
+        """Save a copy of ``SlideShow.xml`` as ``SlideShow.xml.original``.
+
+        Returns:
+            bool: True if succeeds, False otherwise.
+
+        """
+
+        import shutil
 
-        self.indent(self.root)
         try:
-            self.tree.write(self.target, encoding="utf-8", xml_declaration=True)
-        except:
+            shutil.copy(self.target, self.target + '.original')
+        except (IOError, OSError):
             return False
 
         return True
+
+
+def find_skins():
+    """Locate the directories of all installed skins.
+
+    Returns:
+        list: directories of the skins, in the user's and kodi's addons directory.
+
+    """
+    skins = []
+    for addons_dir in ('special://home/addons', 'special://xbmc/addons'):
+        addons_dir = xbmcvfs.translatePath(addons_dir)
+        try:
+            names = os.listdir(addons_dir)
+        except OSError:
+            continue
+        skins.extend(os.path.join(addons_dir, name) for name in sorted(names)
+                     if name.startswith('skin.'))
+
+    return skins
+
+
+def hook_skin(skin_dir):
+    """Insert the interlocking tag into ``SlideShow.xml`` of ``skin_dir`` unless it is hooked.
+
+    Returns:
+        str: 'inserted', 'hooked'(already), 'readonly'(not writable, e.g., a
+        skin bundled with kodi), 'failed' or 'missing'(no ``SlideShow.xml``).
+
+    """
+    target = SkinConnector.find_SlideShow_xml(skin_dir)
+    if not target:
+        return 'missing'
+    connector = SkinConnector(target)
+    if connector.check_hooked():
+        return 'hooked'
+    if not connector.check_permission():
+        return 'readonly'
+    if connector.backup() and connector.insert_tag():
+        return 'inserted'
+
+    return 'failed'
+
+
+@profiled()
+def hook_all_skins(workers=4):
+    """Hook ``SlideShow.xml`` of every installed skin, in parallel.
+
+    Args:
+        workers (int): maximum number of skins handled concurrently.
+
+    Returns:
+        dict: number of skins by the result of :func:`hook_skin`, the
+        result of the current skin in 'current', ``None`` if there's no
+        current skin, and the time it took in 'seconds'.
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    started = time.perf_counter()
+    skins = find_skins()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(hook_skin, skins))
+    current = os.path.normpath(xbmcvfs.translatePath('special://skin'))
+    result = next((result for skin_dir, result in zip(skins, results)
+                   if os.path.normpath(skin_dir) == current), None)
+    if result is None and os.path.isdir(current):
+        # The current skin is elsewhere, e.g., symlinked.
+        result = hook_skin(current)
+        results.append(result)
+    report = {result: results.count(result)
+              for result in ('inserted', 'hooked', 'readonly', 'failed', 'missing')}
+    report['current'] = result
+    report['seconds'] = time.perf_counter() - started
+
+    return report
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""A snapshot of the state of kodi, read once per tick of the :class:`Scheduler`."""
+
+import xbmc
+from . import jsonrpc
+
+
+class State():
+    """Infobooleans and infolabels of kodi, read in a single JSON-RPC batch request.
+
+    Each call of ``xbmc.getCondVisibility`` or ``xbmc.Player().isPlaying``
+    crosses into kodi, and the player may change state between two of them,
+    e.g., ``Player.HasMedia`` read before a video clip starts and
+    ``Slideshow.IsVideo`` after. Instead, all the :attr:`booleans` and
+    :attr:`labels` are read with ``XBMC.GetInfoBooleans`` and
+    ``XBMC.GetInfoLabels`` in one request, and the readers of the same tick
+    share the snapshot.
+
+    A tick is a wakeup of the :class:`Scheduler` or a notification. A player
+    callback or a call that changes the player starts a new one by
+    :meth:`Scheduler.new_tick`.
+
+    Args:
+        scheduler (:class:`Scheduler`): the scheduler whose ticks the snapshot follows.
+
+    """
+
+    #: Infobooleans in the snapshot. ``Player.HasMedia``, ``Player.HasAudio``
+    #: and ``Player.HasVideo`` are what ``isPlaying``, ``isPlayingAudio`` and
+    #: ``isPlayingVideo`` of :class:`xbmc.Player` return.
+    booleans = ('Player.HasMedia', 'Player.HasAudio', 'Player.HasVideo',
+                'Slideshow.IsActive', 'Slideshow.IsVideo', 'Slideshow.IsPaused')
+    #: Infolabels in the snapshot.
+    labels = ('Playlist.Position(music)', 'Slideshow.Path')
+    #: bool: False to read each value with its own call on each read, as
+    #: without the snapshot, e.g., to measure it.
+    batched = True
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.values = {}
+        #: int: the tick of the snapshot, ``None`` if none has been read.
+        self.tick = None
+        #: int: number of values read.
+        self.reads = 0
+        #: int: number of times kodi was asked for the values.
+        self.fetches = 0
+
+    def get(self, name):
+        """Get the value of an infoboolean or an infolabel.
+
+        Args:
+            name (str): one of :attr:`booleans` or :attr:`labels`.
+
+        Returns:
+            bool for an infoboolean, str for an infolabel.
+
+        """
+        self.reads += 1
+        if not self.batched:
+            self.fetches += 1
+            return self.read(name)
+        if self.tick != self.scheduler.tick:
+            self.fetch()
+        return self.values[name]
+
+    def read(self, name):
+        """Read a single value with its own call."""
+        if name in self.booleans:
+            return bool(self.scheduler.api(xbmc.getCondVisibility, name))
+        return self.scheduler.api(xbmc.getInfoLabel, name)
+
+    def fetch(self):
+        """Read all the values in one request."""
+        self.fetches += 1
+        booleans, labels = self.scheduler.api(
+            jsonrpc.batch, [('XBMC.GetInfoBooleans', {'booleans': list(self.booleans)}),
+                            ('XBMC.GetInfoLabels', {'labels': list(self.labels)})])
+        if isinstance(booleans, dict) and isinstance(labels, dict):
+            values = {name: bool(booleans.get(name)) for name in self.booleans}
+            values.update((name, labels.get(name, '')) for name in self.labels)
+        else:
+            # The failure is logged by jsonrpc.batch.
+            values = {name: self.read(name) for name in self.booleans + self.labels}
+        self.values = values
+        self.tick = self.scheduler.tick
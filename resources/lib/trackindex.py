@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Random access to the entries of an m3u or pls playlist.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi.
+
+"""
+
+import os
+from array import array
+
+
+class TrackIndex():
+    """Byte offsets of the entries of an m3u or pls playlist.
+
+    Only the offset of each entry is kept in memory, 4 bytes a track for
+    files smaller than 4GB, and entries are read from the file when they are
+    needed. So, a playlist of 100k tracks costs 400KB, whatever the length
+    of the paths.
+
+    .. Note: The file is read as bytes and paths are decoded with
+            'surrogateescape', as :func:`utils.create_playlist` writes them.
+            The file is opened by its bytes path too, as kodi's filesystem
+            encoding may be ASCII.
+
+    Args:
+        path (str): path of the playlist file in the local filesystem.
+
+    Raises:
+        OSError: if the file can't be read.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = path.encode('utf-8', 'surrogateescape')
+        self.base_dir = os.path.dirname(path)
+        #: array.array: byte offset of each entry.
+        self.offsets = None
+        #: array.array: duration in seconds of each entry, -1 if unknown, from
+        #: the ``#EXTINF`` lines of an m3u playlist. ``None`` if there are none.
+        self.durations = None
+        self.build()
+
+    def build(self):
+        """Find the entries of the playlist."""
+        pls = self.path.lower().endswith('.pls')
+        offset = 0
+        duration = -1
+        durations = None
+        with open(self._file, 'rb') as f:
+            offsets = array('I' if os.fstat(f.fileno()).st_size < 2 ** 32 else 'q')
+            for line in f:
+                entry = line.strip()
+                if offset == 0:
+                    entry = entry.lstrip(b'\xef\xbb\xbf')  # BOM
+                if pls:
+                    # e.g., File1=/music/track.mp3
+                    key, sep, value = line.partition(b'=')
+                    if sep and key.strip().lower().startswith(b'file') and value.strip():
+                        offsets.append(offset + len(key) + 1)
+                elif entry.startswith(b'#EXTINF:'):
+                    # e.g., #EXTINF:215,Title
+                    try:
+                        duration = int(float(entry[8:].split(b',', 1)[0]))
+                    except ValueError:
+                        duration = -1
+                elif entry and not entry.startswith(b'#'):
+                    if duration >= 0 and durations is None:
+                        durations = array('i', [-1]) * len(offsets)
+                    offsets.append(offset + len(line) - len(line.lstrip()))
+                    if durations is not None:
+                        durations.append(duration)
+                    duration = -1
+                offset += len(line)
+
+        self.offsets = offsets
+        self.durations = durations
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def duration(self, i):
+        """Duration of the ``i``th entry in seconds, ``None`` if unknown."""
+        if self.durations is None or self.durations[i] < 0:
+            return None
+        return self.durations[i]
+
+    def paths(self, indices):
+        """Read the entries at ``indices``.
+
+        Paths relative to the playlist are resolved against its directory.
+
+        Args:
+            indices (iterable): indices of the entries.
+
+        Returns:
+            list: paths(str) of the entries, in the order of ``indices``.
+
+        """
+        paths = []
+        with open(self._file, 'rb') as f:
+            for i in indices:
+                f.seek(self.offsets[i])
+                path = f.readline().strip().lstrip(b'\xef\xbb\xbf').decode('utf-8', 'surrogateescape')
+                if '://' not in path and not os.path.isabs(path):
+                    path = os.path.join(self.base_dir, path)
+                paths.append(path)
+
+        return paths
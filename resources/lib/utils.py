@@ -4,19 +4,32 @@
 import os
 import xbmc, xbmcgui, xbmcvfs
 from . import addon, addonName
+from .logger import Logger
+from .profiler import profiled
+
+#: The logger of the script. Debug messages are written only if kodi's debug
+#: log is on, which is looked up once.
+logger = Logger(xbmc.log,
+                lambda: xbmc.LOGDEBUG if xbmc.getCondVisibility('System.GetBool(debug.showloginfo)')
+                else xbmc.LOGINFO,
+                prefix='[slideshow-bgm] ')
 
 
 def log(msg, level=xbmc.LOGDEBUG):
     """Wrapper function for ``xbmcgui.log()``.
 
+    Messages are level-gated and rate-limited by :data:`logger`.
+
     Args:
-        msg (str): message to log.
+        msg (str or callable): message to log, or a function returning it,
+            which is called only if the message is to be written, e.g.,
+            ``lambda: 'title: %s' % xbmc.getInfoLabel('Player.Title')``.
         level (int): log level to output at. (default=LOGDEBUG)
         Note:
             xbmc.LOGDEBUG, xbmc.LOGINFO, xbmc.LOGWARNING, xbmc.LOGERROR, xbmc.LOGFATAL 
 
     """
-    xbmc.log('[slideshow-bgm] ' + msg, level)
+    logger.log(msg, level, depth=2)
 
 
 def notify(message, heading=addonName, icon=xbmcgui.NOTIFICATION_INFO, time=8000, sound=True):
@@ -33,9 +46,16 @@ def notify(message, heading=addonName, icon=xbmcgui.NOTIFICATION_INFO, time=8000
         time (int): time in milliseconds to show.
         sound (bool): whether to play notification sound. (default True)
 
+    On an error, the recent log messages are written to ``recent.log`` in
+    the addon profile directory.
+
     """
 
     xbmcgui.Dialog().notification(heading, message, icon, time, sound)
+    if icon == xbmcgui.NOTIFICATION_ERROR:
+        logger.log('Error notified: %s' % message, xbmc.LOGERROR)
+        if logger.dump(profile_path('recent.log')):
+            log('Recent messages written to %s' % profile_path('recent.log'), xbmc.LOGINFO)
 
 
 def show_yesno(message, heading=addonName, noLabel='Cancel', yesLabel='OK'):
@@ -74,9 +94,54 @@ def show_ok(message, heading=addonName):
     return xbmcgui.Dialog().ok(heading, message)
 
 
-def create_playlist(bgm_dir, file_name="bgm.m3u"):
+def profile_path(file_name):
+    """Get the path of ``file_name`` in the addon profile directory.
+
+    Args:
+        file_name (str): name of a file.
+
+    Returns:
+        str: the path of the file.
+
+    """
+    return os.path.join(xbmcvfs.translatePath(addon.getAddonInfo('profile')), file_name)
+
+
+#: Property of the home window set while the indexer of ``service.py`` runs.
+indexer_property = 'slideshow-bgm.indexer'
+
+
+def indexer_running():
+    """Whether :class:`indexer.Indexer` keeps ``bgm.m3u`` up to date."""
+    return xbmcgui.Window(10000).getProperty(indexer_property) == 'running'
+
+
+@profiled()
+def create_playlist(bgm_dir, file_name="bgm.m3u", durations=False, keep_unchanged=False,
+                    dedup=False, may_replace=None):
     """Create a playlist file(m3u file) with the songs in ``bgm_dir``.
 
+    The directory tree is scanned in parallel through :class:`scanner.ScanIndex`
+    which is kept in the addon profile directory, so only the directories
+    changed since the last call are listed again. A remote directory, e.g.,
+    'smb://server/music/', is listed through ``xbmcvfs`` by
+    :class:`scanner.RemoteScanIndex` within the time budget of the
+    ``scan_timeout`` setting.
+
+    If ``durations`` is True and ``bgm_dir`` is local, the headers of the music files are read through
+    :class:`metadata.MetadataCache`, also kept in the addon profile directory,
+    and their durations are written as ``#EXTINF`` lines, so kodi need not
+    probe the files for them. ``bgm_dir`` is written as the ``#PLAYLIST``
+    title, see :func:`playlist_source`.
+
+    If ``dedup`` is True and ``bgm_dir`` is local, the same music files
+    under different paths are listed once, found by
+    :class:`dedup.Deduplicator` whose hashes are kept in the addon profile
+    directory too.
+
+    The playlist is replaced atomically, as the indexer of ``service.py`` may
+    write it while ``addon.py`` reads it.
+
     .. Note: If ``filesystemencoding`` is 'askii(which seems to be default 
             since kodi v19.3') and filenames contain any non-ascii character, 
             it raises UnicodeError to read/write filename as str.
@@ -85,40 +150,143 @@ def create_playlist(bgm_dir, file_name="bgm.m3u"):
 
     Args:
         bgm_dir (bytes): Directory where to look for music files.
+        durations (bool): Whether to write the durations of the music files.
+        keep_unchanged (bool): Whether to leave the playlist file untouched if
+            it would be the same.
+        dedup (bool): Whether to leave out the duplicates of music files.
+        may_replace (callable): called right before the playlist file is
+            replaced. If it returns False, the file is left as it was and
+            ``None`` is returned; the caches are saved all the same.
 
     Returns:
         str: The path of the newly created playlist file if successful, 
         ``None`` otherwise
 
     """
+    # Imported here to keep them off the startup of the scripts.
+    import filecmp
+    import threading
+    from .dedup import Deduplicator
+    from .metadata import MetadataCache
+    from .scanner import RemoteScanIndex, ScanIndex
+
     playlist_dir = xbmcvfs.translatePath(addon.getAddonInfo('profile'))
     playlist_file = os.path.join(playlist_dir, file_name)
-    music_file_exts = ('.mp2', '.mp3', '.wav', '.ogg', '.wma')
+    # A directory of the folder map has its own index and caches, as each one
+    # keeps only the files of its last scan.
+    stem = os.path.splitext(file_name)[0]
+    index_file = os.path.join(playlist_dir, 'scan_index.json' if file_name == 'bgm.m3u' else
+                              stem + '.index.json')
+    if b'://' in bgm_dir:
+        index = RemoteScanIndex(index_file, xbmcvfs.listdir,
+                                lambda path: xbmcvfs.Stat(path).st_mtime(),
+                                timeout=addon.getSettingInt('scan_timeout') or None)
+        top = bgm_dir.decode('utf-8')
+        # Files are read from the local filesystem only.
+        durations = dedup = False
+    else:
+        index = ScanIndex(index_file)
+        top = bgm_dir
+    cache = MetadataCache(os.path.join(playlist_dir, 'metadata_cache.json' if file_name == 'bgm.m3u'
+                                       else stem + '.metadata.json')) if durations else None
+    dedup = Deduplicator(os.path.join(playlist_dir, 'dedup_cache.json' if file_name == 'bgm.m3u'
+                                      else stem + '.dedup.json')) if dedup else None
 
     count = 0
+    deferred = False
+    # Unique to the thread, as both scripts run in kodi's process.
+    tmp_file = '%s.%d.tmp' % (playlist_file, threading.get_ident())
     try:
-        with open(playlist_file, mode='w', encoding='utf-8') as f:
-            f.write('#EXTM3U' + os.linesep * 2)
-            # os.walk() returns bytes if the given argument is bytes
-            for root, dirs, files in os.walk(bgm_dir, followlinks=True):
-                root_str = root.decode('utf-8')
-                for file in files:
-                    file_str = file.decode('utf-8')
-                    if file_str.lower().endswith(music_file_exts):
-                        f.write(os.path.join(root_str, file_str) + os.linesep)
-                        count += 1
-    except (IOError,):
+        # 'surrogateescape' writes back undecodable filenames as they are.
+        with open(tmp_file, mode='w', encoding='utf-8', errors='surrogateescape') as f:
+            f.write('#EXTM3U' + os.linesep)
+            f.write('#PLAYLIST:' + bgm_dir.decode('utf-8', 'surrogateescape') + os.linesep * 2)
+            for batch in index.scan(top):
+                if dedup:
+                    batch = dedup.filter(batch)
+                    if not batch:
+                        continue
+                if cache:
+                    batch = [extinf(path, metadata[0]) + path if metadata[0] is not None else path
+                             for path, metadata in zip(batch, cache.lookup(batch))]
+                f.write(os.linesep.join(batch) + os.linesep)
+                count += len(batch)
+        if not count:
+            os.remove(tmp_file)
+        elif keep_unchanged and os.path.exists(playlist_file) and \
+                filecmp.cmp(tmp_file, playlist_file, shallow=False):
+            os.remove(tmp_file)
+            log("The playlist is unchanged, %s" % playlist_file)
+        elif may_replace and not may_replace():
+            os.remove(tmp_file)
+            deferred = True
+        else:
+            os.replace(tmp_file, playlist_file)
+    except (IOError, OSError):
         log("Failed to create a playlist, %s" % playlist_file)
         return None
 
+    if not index.save():
+        log("Failed to save the scan index, %s" % index.index_file)
+    if cache:
+        if not cache.save():
+            log("Failed to save the metadata cache, %s" % cache.cache_file)
+        log("Read the headers of %d music files" % cache.read)
+    if dedup:
+        if not dedup.save():
+            log("Failed to save the hashes of music files, %s" % dedup.cache_file)
+        log("Left out %d duplicate music files, %d KB read to find them" %
+            (dedup.dropped, dedup.bytes_read // 1024))
+
     if not count:
         log('No music file in %s' % bgm_dir)
         return None
+    if deferred:
+        log("The playlist is not replaced for now, %s" % playlist_file)
+        return None
 
-    log("Created a playlist, %s" % playlist_file)
+    if index.missed:
+        log("%d directories were not listed in time, %s" % (index.missed, bgm_dir),
+            xbmc.LOGWARNING)
+    log("Created a playlist, %s (%d directories listed)" % (playlist_file, index.listed))
     return playlist_file
 
 
+def playlist_source(playlist_file):
+    """Get the directory a playlist was created from by :func:`create_playlist`.
+
+    Only the first lines of the playlist are read.
+
+    Args:
+        playlist_file (str): path of the playlist.
+
+    Returns:
+        bytes: the directory, ``None`` if unknown.
+
+    """
+    try:
+        with open(playlist_file, 'rb') as f:
+            for line in (f.readline(), f.readline()):
+                if line.startswith(b'#PLAYLIST:'):
+                    return line[len(b'#PLAYLIST:'):].rstrip(b'\r\n')
+    except (IOError, OSError):
+        pass
+
+    return None
+
+
+def extinf(path, duration):
+    """Make the ``#EXTINF`` line of a music file, titled after its filename.
+
+    Returns:
+        str: e.g., '#EXTINF:215,track 01' followed by a line separator.
+
+    """
+    title = os.path.splitext(os.path.basename(path))[0]
+    return '#EXTINF:%d,%s%s' % (round(duration), title, os.linesep)
+
+
+@profiled()
 def check_config():
     """Check addon settings to see if they are configured properly.
 
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""Find the dead entries of an m3u or pls playlist and write it out without them.
+
+This module does not import any kodi module so that it can be run and
+measured outside kodi.
+
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+#: Protocols of kodi's virtual filesystem whose entries can be checked by
+#: ``exists``. Others, e.g., http streams or plugins, are kept unchecked.
+vfs_protocols = (b'smb://', b'nfs://', b'sftp://', b'ftp://', b'dav://', b'davs://', b'special://')
+
+
+def read_entries(path):
+    """Read the entries of an m3u or pls playlist, one at a time.
+
+    The file is read as bytes, line by line, so a playlist of any length
+    costs the memory of a line. Paths relative to the playlist are resolved
+    against its directory.
+
+    Args:
+        path (str): path of the playlist file in the local filesystem.
+
+    Yields:
+        tuple: (lines, path) where ``lines`` are the bytes to write for the
+        entry, e.g., with its ``#EXTINF`` line, and ``path`` is the resolved
+        path(bytes) of the entry.
+
+    Raises:
+        OSError: if the file can't be read.
+
+    """
+    pls = path.lower().endswith('.pls')
+    # Bytes, as kodi's filesystem encoding may be ASCII.
+    path = path.encode('utf-8', 'surrogateescape')
+    base_dir = os.path.dirname(path)
+    extra = []
+    with open(path, 'rb') as f:
+        for i, line in enumerate(f):
+            entry = line.strip()
+            if i == 0:
+                entry = entry.lstrip(b'\xef\xbb\xbf')  # BOM
+            if pls:
+                # e.g., File1=/music/track.mp3
+                key, sep, value = entry.partition(b'=')
+                if not (sep and key.strip().lower().startswith(b'file') and value.strip()):
+                    continue
+                entry = value.strip()
+            elif not entry or entry.startswith(b'#EXTM3U'):
+                continue
+            elif entry.startswith(b'#'):
+                # e.g., #EXTINF:215,Title goes with the next entry.
+                extra.append(entry)
+                continue
+            if b'://' not in entry and not os.path.isabs(entry):
+                entry = os.path.join(base_dir, entry)
+            yield extra + [entry], entry
+            extra = []
+
+
+class PlaylistValidator():
+    """Dead entries of playlists, checked on a bounded thread pool.
+
+    The entries are read from the playlist in batches of :attr:`batch_size`,
+    checked concurrently, and the live ones written out as an m3u playlist
+    before the next batch is read. Local entries are ``stat``'ed; entries on
+    kodi's virtual filesystem are checked by ``exists``, a round trip to the
+    server each.
+
+    The result of a playlist is cached by its path, size and mtime, so an
+    unchanged playlist is not checked again for :attr:`max_age` seconds.
+
+    Args:
+        cache_file (str): path of the cache file.
+        exists (callable): ``exists(path)`` like ``xbmcvfs.exists``. ``None``
+            to keep the entries on the virtual filesystem unchecked.
+        workers (int): maximum number of entries checked concurrently.
+
+    """
+
+    version = 1
+    #: Number of entries checked by a task of the thread pool.
+    chunk_size = 64
+    #: Number of entries read ahead of the checks.
+    batch_size = 4096
+    #: Seconds an unchanged playlist is taken as checked.
+    max_age = 24 * 3600
+
+    def __init__(self, cache_file, exists=None, workers=8):
+        self.cache_file = cache_file
+        self.exists = exists
+        self.workers = workers
+        #: dict: playlist to [size, mtime_ns, time checked, entries, dead entries].
+        self.playlists = self.load()
+
+    def load(self):
+        """Load the cache file.
+
+        Returns:
+            dict: the cached results, empty if there's no valid cache file.
+
+        """
+        try:
+            with open(self.cache_file, encoding='utf-8', errors='surrogateescape') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            return {}
+
+        return data.get('playlists', {})
+
+    def save(self):
+        """Write the cache file atomically.
+
+        Returns:
+            bool: True if succeeds, False otherwise.
+
+        """
+        # Unique to the thread, as both scripts run in kodi's process.
+        tmp_file = '%s.%d.tmp' % (self.cache_file, threading.get_ident())
+        try:
+            with open(tmp_file, mode='w', encoding='utf-8', errors='surrogateescape') as f:
+                json.dump({'version': self.version, 'playlists': self.playlists}, f,
+                          separators=(',', ':'), ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except (IOError, OSError):
+            return False
+
+        return True
+
+    def state(self, playlist):
+        """Whether the cached result of ``playlist`` can be used.
+
+        Returns:
+            str: 'fresh' if the playlist is unchanged and was checked within
+            :attr:`max_age`, 'expired' if unchanged but checked before,
+            ``None`` if it's changed or has never been checked.
+
+        """
+        entry = self.playlists.get(playlist)
+        try:
+            st = os.stat(playlist.encode('utf-8', 'surrogateescape'))
+        except OSError:
+            return None
+        if not entry or entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+            return None
+
+        return 'fresh' if time.time() - entry[2] < self.max_age else 'expired'
+
+    def _alive(self, path):
+        if b'://' not in path:
+            try:
+                return os.path.isfile(path)
+            except ValueError:  # e.g., an embedded null byte
+                return False
+        if self.exists and path.lower().startswith(vfs_protocols):
+            return bool(self.exists(path.decode('utf-8', 'surrogateescape')))
+        return True
+
+    def _check_all(self, paths):
+        """Check ``paths``. Run on the thread pool."""
+        return [self._alive(path) for path in paths]
+
+    def _check(self, pool, paths):
+        if pool is None or len(paths) <= self.chunk_size:
+            return self._check_all(paths)
+        chunks = [paths[i:i + self.chunk_size] for i in range(0, len(paths), self.chunk_size)]
+        return [alive for chunk in pool.map(self._check_all, chunks) for alive in chunk]
+
+    def validate(self, playlist, pruned, keep_unchanged=True):
+        """Write the live entries of ``playlist`` to ``pruned``.
+
+        Args:
+            playlist (str): path of the m3u or pls playlist.
+            pruned (str): path of the m3u playlist to write.
+            keep_unchanged (bool): Whether to leave ``pruned`` untouched if
+                it would be the same, so that its mtime tells a change.
+
+        Returns:
+            tuple: (entries, dead entries), ``None`` if the playlist can't be
+            read or ``pruned`` can't be written.
+
+        """
+        # Imported here, as it's needed only when the playlist is checked.
+        import filecmp
+
+        try:
+            st = os.stat(playlist.encode('utf-8', 'surrogateescape'))
+        except OSError:
+            return None
+        total = dead = 0
+        # Bytes, as kodi's filesystem encoding may be ASCII.
+        pruned = pruned.encode('utf-8', 'surrogateescape')
+        tmp_file = b'%s.%d.tmp' % (pruned, threading.get_ident())
+        pool = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(b'#EXTM3U\n\n')
+                entries = read_entries(playlist)
+                while True:
+                    batch = [entry for _, entry in zip(range(self.batch_size), entries)]
+                    if not batch:
+                        break
+                    for (lines, path), alive in zip(batch, self._check(pool, [e[1] for e in batch])):
+                        if alive:
+                            f.write(b'\n'.join(lines) + b'\n')
+                        else:
+                            dead += 1
+                    total += len(batch)
+            if keep_unchanged and os.path.exists(pruned) and \
+                    filecmp.cmp(tmp_file, pruned, shallow=False):
+                os.remove(tmp_file)
+            else:
+                os.replace(tmp_file, pruned)
+        except (IOError, OSError):
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+            return None
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.playlists[playlist] = [st.st_size, st.st_mtime_ns, time.time(), total, dead]
+        return total, dead
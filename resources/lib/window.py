@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Feed kodi's music playlist with a rolling window of the bgm playlist."""
+
+from array import array
+from . import jsonrpc
+from .utils import log
+
+
+class Window():
+    """A rolling window over the tracks of a :class:`trackindex.TrackIndex`.
+
+    Instead of having kodi load the whole bgm playlist, only the next
+    ``size`` tracks are added to kodi's music playlist. Once kodi has
+    played half of them, the played ones are removed and as many tracks are
+    appended, in a single JSON-RPC batch request. So kodi never holds more
+    than ``size`` entries, however long the bgm playlist is.
+
+    The tracks are drawn from a :class:`shuffle.Shuffle`, so the addon, not
+    kodi, shuffles them and knows what has been played.
+
+    Args:
+        index (:class:`trackindex.TrackIndex`): the bgm playlist.
+        size (int): number of entries to keep in kodi's music playlist.
+        order (:class:`shuffle.Shuffle`): the order of the tracks.
+        api (callable): :meth:`Scheduler.api` to count the calls to kodi.
+
+    """
+
+    def __init__(self, index, size, order, api):
+        self.index = index
+        self.size = min(size, len(index))
+        self.order = order
+        self.api = api
+        #: array.array: the tracks in kodi's music playlist, in order.
+        #: Drawn on the first use, so that they can be restored before.
+        self.entries = array('i')
+
+    @property
+    def random(self):
+        return self.order.random
+
+    def items(self, tracks):
+        """Make the items of ``tracks``.
+
+        Returns:
+            list: items for 'Playlist.Add'.
+
+        """
+        return [{'file': path} for path in self.index.paths(tracks)]
+
+    def load_calls(self):
+        """Make the JSON-RPC calls to replace the music playlist with the window.
+
+        Returns:
+            list: (method, params) for :func:`jsonrpc.batch`.
+
+        """
+        if not self.entries:
+            self.entries.extend(self.order.take(self.size))
+        return [('Playlist.Clear', {'playlistid': jsonrpc.PLAYLIST_MUSIC}),
+                ('Playlist.Add', {'playlistid': jsonrpc.PLAYLIST_MUSIC,
+                                  'item': self.items(self.entries)})]
+
+    def advance(self, current):
+        """Move the window once half of it has been played.
+
+        Args:
+            current (int): 0-based position of the playing track in the music playlist.
+
+        Returns:
+            bool: True if the window has moved, i.e., the playing track is the
+            first entry of the music playlist now, False otherwise.
+
+        """
+        if current < max(self.size // 2, 1) or current >= len(self.entries):
+            return False
+
+        # Drawn once kodi has them, so that none is lost if the request fails.
+        tracks = self.order.peek(current)
+        # Removing the entries before the playing one leaves it playing.
+        calls = [('Playlist.Remove', {'playlistid': jsonrpc.PLAYLIST_MUSIC, 'position': 0})] * current
+        calls.append(('Playlist.Add', {'playlistid': jsonrpc.PLAYLIST_MUSIC,
+                                       'item': self.items(tracks)}))
+        results = self.api(jsonrpc.batch, calls)
+        if None in results:
+            log('Failed to move the playlist window by %d tracks' % current)
+            return False
+
+        del self.entries[:current]
+        self.entries.extend(self.order.take(current))
+        return True
@@ -7,12 +7,13 @@
 """
 
 import sys
-import shutil
-import xbmcgui
-from resources.lib.skinconnector import SkinConnector
-from resources.lib.utils import log, notify, check_config
-from resources.lib import addonName
+import xbmc, xbmcgui
+from resources.lib.profiler import profiler
+from resources.lib.skinconnector import SkinConnector, hook_all_skins
+from resources.lib.utils import log, notify, check_config, profile_path
+from resources.lib import addon, addonName
 
+profiler.enable(addon.getSettingBool('profiling'))
 msg = ''
 
 # check configuration
@@ -23,21 +24,51 @@ else:
     log('Configuration check, OK!')
 
 # check interconnection to skin
-connector = SkinConnector()
-if connector.check_hooked():
-    log('Skin connection check, OK!')
-else:
-    if connector.check_permission():
-        shutil.copy(connector.target, connector.target + ".original")
-        connector.insert_tag()
-        log('The interconnetion tag has been inserted to %s\n' % connector.target +
-            'The original file was saved as %s' % connector.target + '.original')
-    else:  # installed && enabled && not hooked && not writable
-        log('Failed to write the interconnecting tag into %s' % connector.target)
+if addon.getSettingBool('hook_all_skins'):
+    report = hook_all_skins()
+    log('Skin connection check of all skins: %(inserted)d inserted, %(hooked)d hooked already, '
+        '%(readonly)d read-only, %(failed)d failed, %(missing)d without SlideShow.xml '
+        'in %(seconds).3fs' % report)
+    if report['current'] is None:
+        log('The current skin is not found', xbmc.LOGWARNING)
+    # The other skins are not in use, e.g., read-only ones bundled with kodi.
+    if report['current'] in (None, 'readonly', 'failed', 'missing'):
         if msg:
-             msg = msg + ' & Skin interconnection failed.'
+            msg = msg + ' & Skin interconnection failed.'
         else:
             msg = 'Skin interconnection failed.'
+else:
+    connector = SkinConnector()
+    if connector.check_hooked():
+        log('Skin connection check, OK!')
+    else:
+        if connector.check_permission() and connector.backup() and connector.insert_tag():
+            log('The interconnetion tag has been inserted to %s\n' % connector.target +
+                'The original file was saved as %s' % connector.target + '.original')
+        else:  # installed && enabled && not hooked && not writable
+            log('Failed to write the interconnecting tag into %s' % connector.target)
+            if msg:
+                 msg = msg + ' & Skin interconnection failed.'
+            else:
+                msg = 'Skin interconnection failed.'
         
 if msg:
     notify(msg, heading=addonName+" Error", icon=xbmcgui.NOTIFICATION_ERROR)
+
+if profiler.enabled:
+    profiler.dump(profile_path('profile_service.json'))
+
+# Keep bgm.m3u up to date until kodi exits.
+if addon.getSettingBool('watch_directory') and addon.getSetting('type') == 'Directory':
+    # Imported here, as the indexer is off by default.
+    from resources.lib.indexer import Indexer
+    from resources.lib.scheduler import Scheduler
+    scheduler = Scheduler()
+    indexer = Indexer(scheduler)
+    log('Directory indexer started.')
+    try:
+        scheduler.run()
+    finally:
+        # Or Player would take bgm.m3u as up to date until kodi restarts.
+        indexer.stop()
+    log('Directory indexer ended. %s' % scheduler.stats())